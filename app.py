@@ -5,6 +5,7 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for
 import openai
 from dotenv import load_dotenv
 import discogs_api
+from app.utils.vinyl_processor import compact_vinyl_data
 
 # Configurar logging
 logging.basicConfig(
@@ -60,99 +61,15 @@ def load_vinyl_data(csv_path, use_enriched=True):
         logger.error(f"Error cargando CSV: {e}", exc_info=True)
         return None
 
-# Procesar los datos de vinilos para obtener información relevante
-def process_vinyl_data(vinyl_data):
-    try:
-        # Verificar las columnas disponibles en el CSV
-        available_columns = vinyl_data.columns.tolist()
-        logger.info(f"Columnas disponibles en el CSV: {available_columns}")
-        
-        # Definir columnas relevantes para el análisis musical
-        relevant_columns = [
-            'Artist', 'Title', 'Label', 'Genre', 'Style', 
-            'Released', 'Format', 'Rating', 'CollectionFolder',
-            'Collection Media Condition', 'Collection Sleeve Condition',
-            'Collection Notes', 'original_release_year', 'community_rating',
-            'tracklist', 'image_url', 'release_id'
-        ]
-        
-        # Filtrar para usar solo las columnas disponibles
-        use_columns = [col for col in relevant_columns if col in available_columns]
-        logger.info(f"Usando columnas: {use_columns}")
-        
-        # Crear una copia con las columnas disponibles
-        if use_columns:
-            processed_data = vinyl_data[use_columns].copy()
-        else:
-            processed_data = vinyl_data.copy()
-            logger.warning("No se encontraron columnas esperadas. Usando todas las disponibles.")
-        
-        # Procesar los formatos para categorizarlos mejor
-        if 'Format' in processed_data.columns:
-            processed_data['Format_Clean'] = processed_data['Format'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
-            # Extraer si es LP, Single, etc.
-            processed_data['Format_Type'] = processed_data['Format_Clean'].apply(
-                lambda x: 'LP' if 'LP' in x else 
-                          'Single' if 'Single' in x else
-                          '12"' if '12"' in x else
-                          '7"' if '7"' in x else
-                          'Otro'
-            )
-        
-        # Procesar año de lanzamiento para mejorar recomendaciones por década
-        if 'Released' in processed_data.columns:
-            # Convertir a string y extraer el año (los primeros 4 dígitos)
-            processed_data['Year'] = processed_data['Released'].astype(str).str.extract(r'(\d{4})', expand=False)
-            # Obtener la década
-            processed_data['Decade'] = processed_data['Year'].apply(
-                lambda x: f"{x[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
-            )
-        
-        # Usar el año original de lanzamiento si está disponible
-        if 'original_release_year' in processed_data.columns:
-            # Reemplazar el año con el año original si está disponible
-            processed_data['Original_Year'] = processed_data['original_release_year']
-            # Obtener la década original
-            processed_data['Original_Decade'] = processed_data['Original_Year'].apply(
-                lambda x: f"{str(x)[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
-            )
-        
-        # Procesar géneros para mejor categorización
-        if 'Genre' in processed_data.columns:
-            processed_data['Genre_Clean'] = processed_data['Genre'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
-        
-        # Procesar estilos para mejor categorización
-        if 'Style' in processed_data.columns:
-            processed_data['Style_Clean'] = processed_data['Style'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
-        
-        # Procesar condición del vinilo
-        if 'Collection Media Condition' in processed_data.columns:
-            processed_data['Media_Condition'] = processed_data['Collection Media Condition'].apply(
-                lambda x: str(x).strip() if pd.notna(x) else "Desconocida"
-            )
-        
-        # Convertir a registros para el prompt
-        vinyl_list = processed_data.to_dict('records')
-        logger.info(f"Datos de vinilos procesados. Total: {len(vinyl_list)} registros")
-        
-        return vinyl_list
-    except Exception as e:
-        logger.error(f"Error procesando datos de vinilos: {e}", exc_info=True)
-        return []
-
 # Función para obtener recomendación de OpenAI
 def get_recommendation(vinyl_data, mood, interests):
     try:
         logger.info(f"Generando recomendación para mood: '{mood}', intereses: '{interests}'")
         
-        # Procesar datos para el prompt
-        vinyl_list = process_vinyl_data(vinyl_data)
+        # Procesar datos para el prompt: colección compacta por columnas (VinylRecord al iterar)
+        vinyl_list = compact_vinyl_data(vinyl_data)
+        if vinyl_list is None:
+            vinyl_list = []
         
         # Crear un resumen más detallado y útil para OpenAI
         vinyl_summary = []
@@ -1,19 +1,13 @@
 import logging
 import os
-from flask import Flask
-import openai
-from app.config import OPENAI_API_KEY
+import time
+from flask import Flask, g, request
+from app.config import OPENAI_API_KEY, UPLOAD_MAX_BYTES
+from app.utils.logging_setup import configure_logging
 import secrets
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
+# Configurar logging (cola en memoria + escritura en segundo plano con rotación)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Crear y configurar la aplicación
@@ -26,22 +20,64 @@ def create_app():
     # Configurar clave secreta para sesiones
     app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
     
+    # Tamaño máximo de las peticiones (el CSV más el margen del formulario multipart)
+    app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES + 1024 * 1024
+    
     # Configurar OpenAI API
     if not OPENAI_API_KEY:
         logger.error("No se ha configurado OPENAI_API_KEY en el archivo .env")
     else:
+        # El cliente de OpenAI se importa y configura en el primer uso (openai_service.get_openai)
         logger.info("API Key de OpenAI configurada correctamente")
-        openai.api_key = OPENAI_API_KEY
     
     # Registrar rutas
     from app.routes.main_routes import main_bp
     from app.routes.collection_routes import collection_bp
+    from app.routes.metrics_routes import metrics_bp
+    from app.routes.profile_routes import profiles_bp
+    from app.routes.api_routes import api_bp
+    from app.routes.cover_routes import covers_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(collection_bp, url_prefix='/collection')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(profiles_bp, url_prefix='/profiles')
+    app.register_blueprint(api_bp, url_prefix='/api/collection')
+    app.register_blueprint(covers_bp, url_prefix='/covers')
+    
+    # Medir la duración total de cada petición por endpoint
+    from app.utils.metrics import REGISTRY
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+    
+    @app.after_request
+    def record_request_duration(response):
+        start = g.pop('request_start', None)
+        if start is not None and request.endpoint not in (None, 'static', 'metrics.metrics'):
+            REGISTRY.observe('vinyl_request_duration_seconds', time.perf_counter() - start,
+                             endpoint=request.endpoint, method=request.method)
+        return response
+    
+    # Perfilado bajo demanda (no agrega hooks si está deshabilitado)
+    from app.utils.profiler import init_profiling
+    init_profiling(app)
     
     # Asegurar que el directorio de datos existe
     from app.config import DATA_DIR
     os.makedirs(DATA_DIR, exist_ok=True)
-    
+
+    # Actualización en segundo plano de la valoración y los have/want vencidos (cuota ociosa)
+    from app.config import REFRESH_ENABLED, DISCOGS_TOKEN
+    if REFRESH_ENABLED and DISCOGS_TOKEN:
+        from app.services.enrichment_refresher import start_refresher
+        start_refresher()
+
+    # Límite de disco de DATA_DIR: borra las colecciones inactivas y las entradas de caché más viejas
+    from app.config import STORAGE_MAX_BYTES
+    if STORAGE_MAX_BYTES > 0:
+        from app.services.storage_manager import start_storage_manager
+        start_storage_manager()
+
     return app
@@ -8,16 +8,155 @@ load_dotenv()
 DATA_DIR = 'data'
 COLLECTION_CSV_PATH = os.path.join(DATA_DIR, 'vinyl_collection.csv')
 ENRICHED_COLLECTION_PATH = os.path.join(DATA_DIR, 'enriched_collection.csv')
+# Colecciones por usuario (en subdirectorios repartidos por hash) y su registro SQLite
+COLLECTIONS_DIR = os.path.join(DATA_DIR, 'collections')
+COLLECTION_REGISTRY_PATH = os.path.join(COLLECTIONS_DIR, 'registry.sqlite3')
 
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DISCOGS_TOKEN = os.getenv("DISCOGS_TOKEN")
 
+# Configuración de la API de Discogs
+DISCOGS_API_URL = os.getenv("DISCOGS_API_URL", "https://api.discogs.com").rstrip('/')
+# Pausa base entre peticiones para no exceder los límites de la API (en segundos); solo se usa
+# si el limitador compartido está desactivado
+DISCOGS_REQUEST_DELAY = float(os.getenv("DISCOGS_REQUEST_DELAY", "1.0"))
+# Limitador compartido por todos los procesos (cubo de fichas por token en un archivo con flock)
+DISCOGS_RATE_LIMIT_ENABLED = os.getenv("DISCOGS_RATE_LIMIT_ENABLED", "true").lower() == "true"
+DISCOGS_RATE_LIMIT_PER_MINUTE = int(os.getenv("DISCOGS_RATE_LIMIT_PER_MINUTE", "60"))
+DISCOGS_RATE_LIMIT_BURST = int(os.getenv("DISCOGS_RATE_LIMIT_BURST", "1"))
+# Ventana en la que Discogs cuenta las peticiones (en segundos)
+DISCOGS_RATE_LIMIT_WINDOW = float(os.getenv("DISCOGS_RATE_LIMIT_WINDOW", "60"))
+# Reintentos tras un 429 con el limitador activo (cada uno espera su ficha en el cubo)
+DISCOGS_RATE_LIMIT_RETRIES = int(os.getenv("DISCOGS_RATE_LIMIT_RETRIES", "5"))
+RATE_LIMIT_DIR = os.path.join(DATA_DIR, 'ratelimit')
+
+# Caché HTTP condicional para la API de Discogs
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+# Las respuestas se guardan en la caché 'discogs_responses' (SQLite por defecto, ver CACHE_BACKENDS)
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Caché local de portadas (descargadas una vez al enriquecer, servidas desde /covers)
+COVER_CACHE_ENABLED = os.getenv("COVER_CACHE_ENABLED", "true").lower() == "true"
+COVER_CACHE_DIR = os.path.join(DATA_DIR, 'covers')
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# Lado máximo de las miniaturas en píxeles (requieren Pillow) y hilos que las generan
+COVER_THUMBNAIL_SIZE = int(os.getenv("COVER_THUMBNAIL_SIZE", "150"))
+COVER_THUMBNAIL_WORKERS = int(os.getenv("COVER_THUMBNAIL_WORKERS", "2"))
+# Las portadas se direccionan por contenido: el navegador puede guardarlas sin revalidar
+COVER_MAX_AGE_SECONDS = int(os.getenv("COVER_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+
+# Catálogo offline de años originales construido con los volcados mensuales de Discogs
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() == "true"
+CATALOG_DIR = os.path.join(DATA_DIR, 'catalog')
+# Si es true, los discos encontrados en el catálogo no se consultan en la API (se pierden
+# valoración, portada y tracklist a cambio de no gastar cuota); si no, solo se evita la
+# consulta del master
+CATALOG_OFFLINE_ONLY = os.getenv("CATALOG_OFFLINE_ONLY", "false").lower() == "true"
+
+# Resolución de release_id por búsqueda en Discogs (filas de CSV sin ID)
+RESOLVER_CACHE_PATH = os.path.join(DATA_DIR, 'resolver', 'matches.sqlite3')
+RESOLVER_WORKERS = int(os.getenv("RESOLVER_WORKERS", "4"))
+# Candidatos pedidos por búsqueda y confianza mínima (0-1) para aceptar una coincidencia
+RESOLVER_CANDIDATES = int(os.getenv("RESOLVER_CANDIDATES", "10"))
+RESOLVER_MIN_CONFIDENCE = float(os.getenv("RESOLVER_MIN_CONFIDENCE", "0.75"))
+# Las búsquedas sin resultados se repiten pasado este tiempo (el catálogo de Discogs crece)
+RESOLVER_NEGATIVE_TTL_SECONDS = int(os.getenv("RESOLVER_NEGATIVE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Al enriquecer, las filas sin ID se resuelven por bloques de este tamaño en el orden de prioridad
+RESOLVER_BLOCK_ROWS = int(os.getenv("RESOLVER_BLOCK_ROWS", "20"))
+
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Niveles por logger, p. ej. "app.services.discogs_service=WARNING,werkzeug=INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_JSON = os.getenv("LOG_JSON", "true").lower() == "true"
+# Los logs por elemento (enriquecimiento, páginas) se muestrean: se emite 1 de cada N
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "20"))
+# Registrar el cuerpo completo de los prompts enviados a OpenAI (solo para depuración)
+LOG_PROMPTS = os.getenv("LOG_PROMPTS", "false").lower() == "true"
+
+# Métricas de latencia expuestas en /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Token para leer /metrics (cabecera Authorization: Bearer o parámetro token); sin él, solo
+# responde a peticiones desde la propia máquina
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Perfilado bajo demanda de peticiones (solo para quien envíe PROFILING_TOKEN)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_TRACEMALLOC = os.getenv("PROFILING_TRACEMALLOC", "false").lower() == "true"
+PROFILES_DIR = os.path.join(DATA_DIR, 'profiles')
+PROFILES_MAX_FILES = int(os.getenv("PROFILES_MAX_FILES", "50"))
+
+# Almacén compartido de colecciones procesadas (archivos mapeados en memoria por todos los workers)
+SHARED_STORE_ENABLED = os.getenv("SHARED_STORE_ENABLED", "true").lower() == "true"
+SHARED_STORE_DIR = os.path.join(DATA_DIR, 'shared_store')
+
+# Lectura de CSV: 'auto' usa el motor pyarrow de pandas si está instalado; 'c' o 'pyarrow' para forzar uno
+CSV_ENGINE = os.getenv("CSV_ENGINE", "auto").lower()
+
+# Subidas de CSV: se procesan en streaming por bloques de filas y se rechazan si superan el tamaño máximo
+UPLOADS_DIR = os.path.join(DATA_DIR, 'uploads')
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+
+# Enriquecimiento en segundo plano: primero los discos que más probablemente lleguen al prompt,
+# publicando una versión parcial de la colección enriquecida cada ENRICH_SNAPSHOT_SECONDS
+ENRICH_SNAPSHOT_SECONDS = float(os.getenv("ENRICH_SNAPSHOT_SECONDS", "60"))
+ENRICH_TOP_STYLES = int(os.getenv("ENRICH_TOP_STYLES", "10"))
+# Perfil de enriquecimiento por defecto: 'full' (todo), 'year_only' (año original) o 'ratings' (comunidad)
+ENRICH_DEFAULT_PROFILE = os.getenv("ENRICH_DEFAULT_PROFILE", "full")
+# Vigencia de los datos enriquecidos: la valoración y los have/want de la comunidad cambian
+# (volátiles); el año original, la portada y la tracklist casi nunca (inmutables)
+ENRICH_VOLATILE_TTL_SECONDS = int(os.getenv("ENRICH_VOLATILE_TTL_SECONDS", str(7 * 24 * 3600)))
+ENRICH_IMMUTABLE_TTL_SECONDS = int(os.getenv("ENRICH_IMMUTABLE_TTL_SECONDS", str(180 * 24 * 3600)))
+
+# Actualización en segundo plano de los campos volátiles vencidos (un solo proceso la hace,
+# por lotes y solo con la cuota de Discogs ociosa)
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "true").lower() == "true"
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REFRESH_INTERVAL_SECONDS", "300"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "50"))
+# Segundos sin peticiones de otros trabajos para considerar ociosa la cuota
+REFRESH_IDLE_SECONDS = float(os.getenv("REFRESH_IDLE_SECONDS", "5"))
+REFRESH_LOCK_PATH = os.path.join(DATA_DIR, 'refresh.lock')
+
+# Coalescencia de trabajo duplicado (importaciones y recomendaciones idénticas concurrentes),
+# dentro del proceso y entre workers con candados en archivos
+SINGLE_FLIGHT_DIR = os.path.join(DATA_DIR, 'singleflight')
+SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "300"))
+# Tiempo que se conserva el resultado de una ejecución para los procesos que la esperaban
+SINGLE_FLIGHT_RESULT_TTL_SECONDS = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL_SECONDS", "60"))
+
+# Cachés de clave/valor (app/utils/cache_backends.py): 'memory' (LRU del proceso), 'sqlite'
+# (compartida por los workers) o 'external' (almacén en CACHE_EXTERNAL_URL: redis://... o memory://)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+# Backend por caché, p. ej. "recommendations=sqlite,html=memory"
+CACHE_BACKENDS = os.getenv("CACHE_BACKENDS", "")
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SQLITE_PATH = os.path.join(DATA_DIR, 'cache', 'cache.sqlite3')
+CACHE_SQLITE_MAX_BYTES = int(os.getenv("CACHE_SQLITE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_EXTERNAL_URL = os.getenv("CACHE_EXTERNAL_URL", "")
+
+# Presupuesto de disco de DATA_DIR: un hilo en segundo plano (en un solo proceso) mide el uso y,
+# si supera STORAGE_MAX_BYTES, borra primero lo usado hace más tiempo (colecciones inactivas y
+# entradas de las cachés de disco). 0 desactiva el límite
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+STORAGE_CHECK_INTERVAL_SECONDS = float(os.getenv("STORAGE_CHECK_INTERVAL_SECONDS", "600"))
+# Las colecciones usadas más recientemente que esto no se borran aunque se supere el límite
+STORAGE_MIN_IDLE_SECONDS = float(os.getenv("STORAGE_MIN_IDLE_SECONDS", str(24 * 3600)))
+STORAGE_LOCK_PATH = os.path.join(DATA_DIR, 'storage.lock')
+
 # Configuración de OpenAI
 OPENAI_MODEL = "gpt-3.5-turbo"
+# Vigencia de las recomendaciones guardadas en la caché 'recommendations' (0, el valor por
+# defecto, la desactiva: cada petición pide una recomendación nueva)
+RECOMMENDATION_CACHE_TTL_SECONDS = float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "0"))
 
 # Configuración de sesión
-SESSION_COLLECTION_KEY = 'current_collection_path'
+SESSION_COLLECTION_KEY = 'current_collection_owner'
 SESSION_USERNAME_KEY = 'discogs_username'
 
 # Diccionario de corrección para álbumes conocidos donde Discogs puede no tener el año correcto
@@ -0,0 +1,279 @@
+import os
+import time
+import secrets
+import sqlite3
+import hashlib
+import logging
+import threading
+from app.config import COLLECTIONS_DIR, COLLECTION_REGISTRY_PATH
+
+logger = logging.getLogger(__name__)
+
+# Estados del enriquecimiento de una colección
+ENRICHMENT_NONE = 'none'
+ENRICHMENT_RUNNING = 'running'
+ENRICHMENT_COMPLETE = 'complete'
+ENRICHMENT_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    owner TEXT PRIMARY KEY,
+    username TEXT,
+    source TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    enriched_path TEXT,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    enrichment_status TEXT NOT NULL DEFAULT 'none',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    enriched_at REAL,
+    accessed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_collections_username ON collections(username);
+CREATE INDEX IF NOT EXISTS idx_collections_updated_at ON collections(updated_at);
+CREATE INDEX IF NOT EXISTS idx_collections_enrichment ON collections(enrichment_status);
+"""
+
+# Intervalo mínimo entre dos registros del último acceso a una colección (evita una escritura por petición)
+TOUCH_INTERVAL_SECONDS = 60.0
+
+
+def discogs_owner(username):
+    """Clave de propietario de la colección pública de un usuario de Discogs"""
+    return f"discogs:{username.strip().lower()}"
+
+
+def new_upload_owner():
+    """Clave de propietario aleatoria para una colección subida (solo la conoce su sesión)"""
+    return f"upload:{secrets.token_hex(16)}"
+
+
+class CollectionRegistry:
+    """
+    Registro de colecciones por propietario en SQLite.
+
+    Cada propietario (un usuario de Discogs o una sesión que subió un CSV) tiene
+    una fila con la versión actual, la ubicación de sus archivos, la cantidad de
+    discos y el estado del enriquecimiento. Los archivos viven en
+    COLLECTIONS_DIR/<aa>/<bb>/<hash>/ para no acumular decenas de miles de
+    entradas en un mismo directorio.
+    """
+
+    def __init__(self, db_path=COLLECTION_REGISTRY_PATH, storage_dir=COLLECTIONS_DIR):
+        self.db_path = db_path
+        self.storage_root = storage_dir
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Registros creados antes de que se guardara el último acceso
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(collections)')}
+            if 'accessed_at' not in columns:
+                conn.execute('ALTER TABLE collections ADD COLUMN accessed_at REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_collections_accessed_at ON collections(accessed_at)')
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def storage_dir(self, owner):
+        """
+        Directorio donde se guardan los archivos de un propietario
+
+        Args:
+            owner: Clave de propietario
+
+        Returns:
+            str: Ruta del directorio (se crea si no existe)
+        """
+        digest = hashlib.sha256(owner.encode('utf-8')).hexdigest()[:32]
+        path = os.path.join(self.storage_root, digest[:2], digest[2:4], digest)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def collection_path(self, owner):
+        """Ruta del CSV de la colección de un propietario"""
+        return os.path.join(self.storage_dir(owner), 'collection.csv')
+
+    def enriched_path(self, owner):
+        """Ruta del CSV enriquecido de un propietario"""
+        return os.path.join(self.storage_dir(owner), 'collection_enriched.csv')
+
+    def get(self, owner):
+        """
+        Obtiene la colección registrada de un propietario
+
+        Args:
+            owner: Clave de propietario
+
+        Returns:
+            dict: Fila del registro con 'active_path' (CSV a usar) o None si no existe
+        """
+        if not owner:
+            return None
+        row = self._connect().execute('SELECT * FROM collections WHERE owner = ?', (owner,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        # enriched_path solo se registra para la versión actual: completo o parcial (mientras el
+        # enriquecimiento sigue), ya es mejor que la colección sin enriquecer
+        record['active_path'] = record['enriched_path'] or record['path']
+        return record
+
+    def register(self, owner, path, row_count, source, username=None):
+        """
+        Registra una nueva versión de la colección de un propietario.
+        El enriquecimiento de la versión anterior deja de ser válido.
+
+        Args:
+            owner: Clave de propietario
+            path: Ruta del CSV de la colección
+            row_count: Cantidad de discos
+            source: Origen ('upload', 'discogs', ...)
+            username: Usuario de Discogs asociado, si lo hay
+
+        Returns:
+            dict: Registro actualizado
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            previous = conn.execute('SELECT path, enriched_path FROM collections WHERE owner = ?',
+                                    (owner,)).fetchone()
+            conn.execute(
+                """
+                INSERT INTO collections (owner, username, source, version, path, enriched_path, row_count,
+                                         enrichment_status, created_at, updated_at, enriched_at, accessed_at)
+                VALUES (?, ?, ?, 1, ?, NULL, ?, ?, ?, ?, NULL, ?)
+                ON CONFLICT(owner) DO UPDATE SET
+                    username = excluded.username, source = excluded.source, version = version + 1,
+                    path = excluded.path, enriched_path = NULL, row_count = excluded.row_count,
+                    enrichment_status = excluded.enrichment_status, updated_at = excluded.updated_at,
+                    enriched_at = NULL, accessed_at = excluded.accessed_at
+                """,
+                (owner, username, source, path, int(row_count), ENRICHMENT_NONE, now, now, now)
+            )
+        if previous is not None:
+            stale = [p for p in (previous['path'], previous['enriched_path']) if p and p != path]
+            self._remove_files(stale)
+        record = self.get(owner)
+        logger.info(f"Colección registrada: {owner} v{record['version']} ({row_count} discos)")
+        return record
+
+    def set_enrichment(self, owner, status, version, enriched_path=None):
+        """
+        Actualiza el estado del enriquecimiento si la colección sigue en la misma versión
+
+        Args:
+            owner: Clave de propietario
+            status: Nuevo estado (ENRICHMENT_*)
+            version: Versión de la colección que se enriqueció
+            enriched_path: Ruta del CSV enriquecido (al completar)
+
+        Returns:
+            bool: True si se actualizó (False si la colección cambió mientras tanto)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE collections
+                SET enrichment_status = ?, enriched_path = COALESCE(?, enriched_path), updated_at = ?,
+                    enriched_at = CASE WHEN ? = 'complete' THEN ? ELSE enriched_at END
+                WHERE owner = ? AND version = ?
+                """,
+                (status, enriched_path, now, status, now, owner, version)
+            )
+        return cursor.rowcount == 1
+
+    def touch(self, owner):
+        """
+        Registra que se usó la colección de un propietario (para el desalojo por antigüedad);
+        como mucho una escritura cada TOUCH_INTERVAL_SECONDS
+
+        Args:
+            owner: Clave de propietario
+        """
+        if not owner:
+            return
+        now = time.time()
+        conn = self._connect()
+        # Primero una lectura: la mayoría de los usos caen dentro del intervalo y no deben
+        # abrir una transacción de escritura (compiten por el candado de la base)
+        row = conn.execute('SELECT accessed_at FROM collections WHERE owner = ?', (owner,)).fetchone()
+        if row is None or (row['accessed_at'] is not None and now - row['accessed_at'] < TOUCH_INTERVAL_SECONDS):
+            return
+        with conn:
+            conn.execute('UPDATE collections SET accessed_at = ? WHERE owner = ? AND '
+                         '(accessed_at IS NULL OR accessed_at < ?)', (now, owner, now - TOUCH_INTERVAL_SECONDS))
+
+    def records_by_access(self):
+        """Todos los registros, los usados hace más tiempo primero (sin acceso registrado: su última versión)"""
+        rows = self._connect().execute(
+            'SELECT * FROM collections ORDER BY COALESCE(accessed_at, updated_at)'
+        ).fetchall()
+        return [dict(row, active_path=row['enriched_path'] or row['path']) for row in rows]
+
+    def delete(self, owner):
+        """
+        Elimina la colección de un propietario y sus archivos
+
+        Returns:
+            bool: True si existía
+        """
+        conn = self._connect()
+        with conn:
+            row = conn.execute('SELECT path, enriched_path FROM collections WHERE owner = ?', (owner,)).fetchone()
+            conn.execute('DELETE FROM collections WHERE owner = ?', (owner,))
+        if row is None:
+            return False
+        self._remove_files([row['path'], row['enriched_path']])
+        # El directorio del propietario se borra si quedó vacío
+        directory = os.path.dirname(os.path.abspath(row['path']))
+        if directory.startswith(os.path.abspath(self.storage_root) + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        logger.info(f"Colección eliminada del registro: {owner}")
+        return True
+
+    def enriched_records(self):
+        """Registros con el enriquecimiento completo, los enriquecidos hace más tiempo primero"""
+        rows = self._connect().execute(
+            'SELECT * FROM collections WHERE enrichment_status = ? AND enriched_path IS NOT NULL ORDER BY enriched_at',
+            (ENRICHMENT_COMPLETE,)
+        ).fetchall()
+        return [dict(row, active_path=row['enriched_path']) for row in rows]
+
+    def _remove_files(self, paths):
+        # Solo se borran archivos gestionados por el registro
+        root = os.path.abspath(self.storage_root) + os.sep
+        for path in paths:
+            if path and os.path.abspath(path).startswith(root) and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"No se pudo eliminar {path}: {e}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Devuelve el registro de colecciones del proceso"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CollectionRegistry()
+        return _registry
@@ -0,0 +1,194 @@
+import json
+import time
+import base64
+import logging
+from flask import Blueprint, request, jsonify, session
+from app.config import SESSION_COLLECTION_KEY, COVER_CACHE_ENABLED
+from app.models.collection_registry import get_registry
+from app.routes.cover_routes import cover_urls
+from app.utils.vinyl_processor import load_processed_collection
+
+logger = logging.getLogger(__name__)
+
+# Crear Blueprint
+api_bp = Blueprint('api', __name__)
+
+# Campos de cada disco que se devuelven en las respuestas
+RECORD_FIELDS = ('Artist', 'Title', 'Label', 'Genre', 'Style', 'Format_Type', 'Year', 'Original_Year',
+                 'Decade', 'Original_Decade', 'Rating', 'Media_Condition', 'release_id', 'image_url',
+                 'community_rating', 'community_have', 'community_want')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 100
+MAX_FACET_VALUES = 500
+
+
+def current_collection():
+    """
+    Resuelve la colección de la petición (parámetro collection_owner o la de la sesión)
+
+    Returns:
+        tuple: (registro, colección procesada) o (None, None) si no hay colección
+    """
+    owner = request.args.get('collection_owner') or session.get(SESSION_COLLECTION_KEY)
+    registry = get_registry()
+    record = registry.get(owner)
+    if record is None:
+        return None, None
+    registry.touch(owner)
+    return record, load_processed_collection(record['active_path'])
+
+
+def serialize_record(record, row):
+    """
+    Convierte un disco en un diccionario apto para JSON (los NaN pasan a null).
+    Las portadas se enlazan a la caché local (cover_url / thumbnail_url), no al CDN de Discogs.
+    """
+    data = {'row': row}
+    for field in RECORD_FIELDS:
+        if field in record:
+            value = record[field]
+            data[field] = None if isinstance(value, float) and value != value else value
+    if COVER_CACHE_ENABLED:
+        data.update(cover_urls(data.get('image_url')))
+    return data
+
+
+def _encode_cursor(version, sort, position):
+    raw = json.dumps({'v': version, 's': sort, 'p': position}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    position = int(data['p'])
+    if position < 0:
+        raise ValueError(f"Posición negativa en el cursor: {position}")
+    return data['v'], data['s'], position
+
+
+def _int_arg(name, default, maximum):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
+
+
+@api_bp.route('', methods=['GET'])
+def browse_collection():
+    """
+    Recorre la colección con paginación por cursor
+
+    Parámetros: sort (artist | title | row), limit, cursor (devuelto como next_cursor)
+    """
+    from app.utils.search_index import get_search_index, SORT_KEYS
+
+    record, collection = current_collection()
+    if collection is None:
+        return jsonify({"error": "No hay una colección cargada"}), 404
+
+    index = get_search_index(collection, record['active_path'])
+    limit = _int_arg('limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    sort = request.args.get('sort', 'artist')
+    position = 0
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            version, sort, position = _decode_cursor(cursor)
+        except (ValueError, KeyError, TypeError):
+            return jsonify({"error": "Cursor inválido"}), 400
+        if version != index.version:
+            return jsonify({"error": "La colección cambió desde que se obtuvo el cursor; vuelve a empezar"}), 409
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"Orden no válido; usa uno de: {', '.join(SORT_KEYS)}"}), 400
+
+    rows = index.page(sort, position, limit)
+    next_position = position + len(rows)
+    return jsonify({
+        "items": [serialize_record(collection[row], row) for row in rows],
+        "total": len(collection),
+        "next_cursor": _encode_cursor(index.version, sort, next_position) if next_position < len(collection) else None,
+    })
+
+
+@api_bp.route('/search', methods=['GET'])
+def search_collection():
+    """
+    Busca en la colección por artista, título, sello y nombres de pistas
+
+    Parámetros: q, fields (p. ej. "artist,title"), limit, fuzzy (1 | 0)
+    """
+    from app.utils.search_index import get_search_index
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Falta el parámetro q"}), 400
+
+    record, collection = current_collection()
+    if collection is None:
+        return jsonify({"error": "No hay una colección cargada"}), 404
+
+    index = get_search_index(collection, record['active_path'])
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+    limit = _int_arg('limit', 20, MAX_SEARCH_RESULTS)
+    fuzzy = request.args.get('fuzzy', '1') != '0'
+
+    start = time.perf_counter()
+    hits, total = index.search(query, fields=fields, limit=limit, fuzzy=fuzzy)
+    took_ms = (time.perf_counter() - start) * 1000
+
+    items = []
+    for row, score in hits:
+        item = serialize_record(collection[row], row)
+        item['score'] = score
+        items.append(item)
+    logger.info(f"Búsqueda '{query}': {total} resultados en {took_ms:.2f}ms")
+    return jsonify({"query": query, "total": total, "items": items, "took_ms": round(took_ms, 3)})
+
+
+@api_bp.route('/facets', methods=['GET'])
+def collection_facets():
+    """
+    Cuenta los discos por género, estilo, década, formato, sello y condición,
+    aplicando filtros por faceta
+
+    Parámetros: un parámetro por faceta con el valor elegido (repetible, p. ej.
+    genre=Rock&genre=Jazz&decade=1970s), mode (any: OR entre los valores de una
+    faceta | all: AND), facets (facetas a contar, p. ej. "genre,style"), limit
+    (valores por faceta)
+    """
+    from app.utils.facet_index import get_facet_index, FACETS, MATCH_ANY, MATCH_ALL
+
+    mode = request.args.get('mode', MATCH_ANY)
+    if mode not in (MATCH_ANY, MATCH_ALL):
+        return jsonify({"error": f"Modo no válido; usa {MATCH_ANY} o {MATCH_ALL}"}), 400
+    facets = [f.strip() for f in request.args.get('facets', '').split(',') if f.strip()] or None
+    unknown = [f for f in facets or [] if f not in FACETS]
+    if unknown:
+        return jsonify({"error": f"Facetas desconocidas: {', '.join(unknown)}"}), 400
+
+    record, collection = current_collection()
+    if collection is None:
+        return jsonify({"error": "No hay una colección cargada"}), 404
+
+    index = get_facet_index(collection, record['active_path'])
+    filters = {facet: request.args.getlist(facet) for facet in FACETS if request.args.getlist(facet)}
+    limit = _int_arg('limit', 50, MAX_FACET_VALUES)
+
+    start = time.perf_counter()
+    total, counts = index.counts(filters, mode=mode, facets=facets, limit=limit)
+    took_ms = (time.perf_counter() - start) * 1000
+
+    return jsonify({
+        "total": total,
+        "rows": index.rows,
+        "filters": filters,
+        "mode": mode,
+        "facets": {facet: [{"value": value, "count": count} for value, count in values]
+                   for facet, values in counts.items()},
+        "took_ms": round(took_ms, 3),
+    })
@@ -1,9 +1,16 @@
 import logging
-import os
-import pandas as pd
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from app.config import COLLECTION_CSV_PATH, ENRICHED_COLLECTION_PATH, DATA_DIR, SESSION_COLLECTION_KEY, SESSION_USERNAME_KEY
-from app.services.discogs_service import enrich_collection_from_file, get_user_collection_helper
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.config import (SESSION_COLLECTION_KEY, SESSION_USERNAME_KEY, SHARED_STORE_ENABLED, UPLOAD_MAX_BYTES,
+                        ENRICH_DEFAULT_PROFILE)
+from app.models.collection_registry import (get_registry, discogs_owner, new_upload_owner,
+                                            ENRICHMENT_RUNNING, ENRICHMENT_COMPLETE)
+from app.services.discogs_service import get_user_collection_helper, ENRICHMENT_PROFILES
+from app.services.enrichment_scheduler import start_enrichment, enrichment_job
+from app.services.storage_manager import delete_owner
+from app.utils.ingest import UploadTooLarge
+from app.utils.metrics import timer
+from app.utils.upload_progress import UploadProgress, read_progress, cleanup_progress
 
 logger = logging.getLogger(__name__)
 
@@ -32,20 +39,9 @@ def upload_csv():
                     error = "El archivo debe ser un CSV"
                     logger.warning(f"Intento de subir archivo no CSV: {file.filename}")
                 else:
-                    # Asegurar que el directorio 'data' existe
-                    os.makedirs(os.path.dirname(COLLECTION_CSV_PATH), exist_ok=True)
-                    
-                    # Guardar el archivo
-                    file.save(COLLECTION_CSV_PATH)
-                    
-                    # Guardar la ruta en la sesión
-                    session[SESSION_COLLECTION_KEY] = COLLECTION_CSV_PATH
-                    
-                    # Validar que el archivo es un CSV válido
                     try:
-                        df = pd.read_csv(COLLECTION_CSV_PATH)
-                        logger.info(f"Archivo CSV subido y validado: {len(df)} registros")
-                        success = f"Archivo subido correctamente. Se cargaron {len(df)} registros."
+                        rows = _receive_collection(file.stream, upload_id=request.form.get('upload_id'))
+                        success = f"Archivo subido correctamente. Se cargaron {rows} registros."
                         
                         # Verificar si se quiere enriquecer los datos
                         enrich = request.form.get('enrich') == 'yes'
@@ -57,15 +53,116 @@ def upload_csv():
                             # Redirigir al índice con mensaje de éxito
                             flash(success, 'success')
                             return redirect(url_for('main.index'))
-                    except Exception as e:
-                        os.remove(COLLECTION_CSV_PATH)  # Eliminar archivo inválido
+                    except UploadTooLarge as e:
+                        error = str(e)
+                        logger.warning(f"Subida rechazada por tamaño: {e}")
+                    except ValueError as e:
                         error = f"El archivo no es un CSV válido: {str(e)}"
                         logger.error(f"CSV inválido: {e}")
+        except RequestEntityTooLarge:
+            error = f"El archivo supera el tamaño máximo de {UPLOAD_MAX_BYTES // (1024 * 1024)} MB"
+            logger.warning("Subida rechazada por tamaño")
         except Exception as e:
             error = f"Error al procesar el archivo: {str(e)}"
             logger.error(f"Error en subida de archivo: {e}", exc_info=True)
     
-    return render_template('upload.html', error=error, success=success)
+    return render_template('upload.html', error=error, success=success,
+                           max_upload_mb=UPLOAD_MAX_BYTES // (1024 * 1024))
+
+@collection_bp.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    """
+    Subida en streaming: el cuerpo de la petición es el CSV tal cual (sin multipart), así se
+    procesa a medida que llega. El navegador consulta el avance en /upload/progress/<upload_id>.
+    """
+    upload_id = request.args.get('upload_id')
+    filename = request.args.get('filename', '')
+    if filename and not filename.lower().endswith('.csv'):
+        return jsonify({"error": "El archivo debe ser un CSV"}), 400
+    if request.content_length is not None and request.content_length > UPLOAD_MAX_BYTES:
+        return jsonify({"error": f"El archivo supera el tamaño máximo de {UPLOAD_MAX_BYTES // (1024 * 1024)} MB"}), 413
+    
+    try:
+        rows = _receive_collection(request.stream, upload_id=upload_id, total_bytes=request.content_length)
+    except (UploadTooLarge, RequestEntityTooLarge):
+        logger.warning("Subida en streaming rechazada por tamaño")
+        return jsonify({"error": f"El archivo supera el tamaño máximo de {UPLOAD_MAX_BYTES // (1024 * 1024)} MB"}), 413
+    except ValueError as e:
+        logger.error(f"CSV inválido: {e}")
+        return jsonify({"error": f"El archivo no es un CSV válido: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error en subida en streaming: {e}", exc_info=True)
+        return jsonify({"error": f"Error al procesar el archivo: {str(e)}"}), 500
+    
+    if request.args.get('enrich') == 'yes':
+        flash("Colección cargada. Iniciando enriquecimiento de datos...", 'success')
+        redirect_url = url_for('collection.enrich_data')
+    else:
+        flash(f"Archivo subido correctamente. Se cargaron {rows} registros.", 'success')
+        redirect_url = url_for('main.index')
+    return jsonify({"rows": rows, "redirect": redirect_url})
+
+@collection_bp.route('/upload/progress/<upload_id>')
+def upload_progress(upload_id):
+    """
+    Avance de una subida (bytes recibidos, filas procesadas y etapa)
+    """
+    progress = read_progress(upload_id)
+    if progress is None:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    return jsonify(progress)
+
+def _receive_collection(stream, upload_id=None, total_bytes=None):
+    """
+    Recibe un CSV en streaming y lo publica como nueva versión de la colección de la sesión.
+    Si el archivo no es válido o supera el tamaño máximo, la versión anterior queda intacta.
+    
+    Args:
+        stream: Cuerpo de la subida (objeto con read)
+        upload_id: Identificador con el que el navegador consulta el avance
+        total_bytes: Tamaño anunciado por el cliente, si se conoce
+        
+    Returns:
+        int: Cantidad de registros cargados
+        
+    Raises:
+        UploadTooLarge: Si el archivo supera UPLOAD_MAX_BYTES
+        ValueError: Si el archivo no es una colección válida
+    """
+    from app.utils.ingest import ingest_stream
+    from app.utils.vinyl_processor import publish_processed_collection
+    
+    # Cada sesión sube a su propio espacio en el registro
+    registry = get_registry()
+    owner = session.get(SESSION_COLLECTION_KEY)
+    if not owner or not owner.startswith('upload:'):
+        owner = new_upload_owner()
+    upload_path = registry.collection_path(owner)
+    
+    cleanup_progress()
+    progress = UploadProgress(upload_id, total_bytes)
+    try:
+        # Validar la cabecera con el primer bloque y normalizar por bloques de filas al formato
+        # interno: en memoria solo hay un bloque a la vez
+        with timer('upload_ingest'):
+            rows = ingest_stream(stream, upload_path, UPLOAD_MAX_BYTES, progress=progress.update)
+        logger.info(f"Archivo CSV subido y normalizado: {rows} registros")
+        
+        # Registrar la nueva versión y guardar el propietario en la sesión
+        registry.register(owner, upload_path, rows, source='upload')
+        session[SESSION_COLLECTION_KEY] = owner
+        session.pop(SESSION_USERNAME_KEY, None)
+        
+        # Publicar en el almacén compartido leyendo del CSV solo las columnas de procesamiento
+        if SHARED_STORE_ENABLED:
+            progress.update(stage='publishing', rows=rows)
+            with timer('upload_publish'):
+                publish_processed_collection(upload_path)
+    except Exception as e:
+        progress.finish(error=str(e))
+        raise
+    progress.finish(rows=rows)
+    return rows
 
 @collection_bp.route('/user', methods=['GET', 'POST'])
 def get_user_collection():
@@ -83,6 +180,7 @@ def get_user_collection():
             
             username = request.form.get('username', '').strip()
             token = request.form.get('token', None)
+            refresh = request.form.get('refresh') == 'yes'
             
             if not username:
                 error = "Debes proporcionar un nombre de usuario de Discogs"
@@ -91,14 +189,14 @@ def get_user_collection():
                 logger.info(f"Obteniendo colección para el usuario: {username}")
                 
                 # Obtener colección
-                collection_df, save_path = get_user_collection_helper(username, token)
+                collection_df, save_path = get_user_collection_helper(username, token, refresh=refresh)
                 
                 if collection_df is not None and save_path is not None:
                     # Guardar información en la sesión
-                    session[SESSION_COLLECTION_KEY] = save_path
+                    session[SESSION_COLLECTION_KEY] = discogs_owner(username)
                     session[SESSION_USERNAME_KEY] = username
                     
-                    logger.info(f"Actualizado SESSION_COLLECTION_KEY={save_path}, SESSION_USERNAME_KEY={username}")
+                    logger.info(f"Actualizado SESSION_COLLECTION_KEY={session[SESSION_COLLECTION_KEY]}, SESSION_USERNAME_KEY={username}")
                     
                     success = f"¡Colección obtenida! Se encontraron {len(collection_df)} discos en la colección de {username}."
                     logger.info(f"Colección obtenida para {username}: {len(collection_df)} discos")
@@ -123,94 +221,78 @@ def enrich_data():
     error = None
     success = None
     
-    # Obtener la ruta del archivo CSV de la sesión o usar el predeterminado
-    collection_path = session.get(SESSION_COLLECTION_KEY, COLLECTION_CSV_PATH)
+    # Obtener la colección de la sesión desde el registro
+    registry = get_registry()
+    owner = session.get(SESSION_COLLECTION_KEY)
     
     if request.method == 'POST':
         token = request.form.get('token', None)
-        custom_output = request.form.get('custom_output', None)
-        
-        output_path = ENRICHED_COLLECTION_PATH
-        if custom_output:
-            output_path = os.path.join(DATA_DIR, custom_output)
+        # Perfil: qué datos se obtienen (year_only y ratings gastan menos peticiones por disco)
+        profile = request.form.get('profile') or ENRICH_DEFAULT_PROFILE
             
-        try:
-            if not os.path.exists(collection_path):
-                error = "No se encontró el archivo CSV de la colección. Por favor, sube un archivo primero o proporciona un usuario de Discogs."
-                logger.error(error)
-            else:
-                # Iniciar el proceso de enriquecimiento
-                logger.info(f"Iniciando proceso de enriquecimiento para {collection_path}")
-                
-                # Enriquecer los datos
-                enriched_df = enrich_collection_from_file(
-                    input_csv_path=collection_path, 
-                    output_csv_path=output_path,
-                    token=token
-                )
-                
-                if enriched_df is not None and len(enriched_df) > 0:
-                    success = f"¡Enriquecimiento completado! Se enriquecieron {len(enriched_df)} registros."
-                    logger.info(f"Enriquecimiento completado para {len(enriched_df)} registros")
-                    
-                    # Actualizar el archivo de colección en la sesión
-                    session[SESSION_COLLECTION_KEY] = output_path
-                    
-                    # Redirigir al índice con mensaje de éxito
-                    flash(success, 'success')
-                    return redirect(url_for('main.index'))
+        if profile not in ENRICHMENT_PROFILES:
+            error = f"Perfil de enriquecimiento desconocido: {profile}"
+        else:
+            try:
+                # Iniciar el enriquecimiento en segundo plano: primero los discos con más
+                # probabilidad de llegar al prompt, con versiones parciales cada pocos minutos
+                job = start_enrichment(owner, token=token, profile=profile)
+                if job is None:
+                    error = "No se encontró el archivo CSV de la colección. Por favor, sube un archivo primero o proporciona un usuario de Discogs."
+                    logger.error(error)
                 else:
-                    error = "No se pudo enriquecer la colección. Verifica el log para más detalles."
-                    logger.error("Fallo en el proceso de enriquecimiento")
-        except Exception as e:
-            error = f"Error durante el enriquecimiento: {str(e)}"
-            logger.error(f"Error en proceso de enriquecimiento: {e}", exc_info=True)
+                    flash("Enriquecimiento iniciado. Las recomendaciones usarán los datos enriquecidos "
+                          "a medida que estén disponibles.", 'success')
+                    return redirect(url_for('main.index'))
+            except Exception as e:
+                error = f"Error durante el enriquecimiento: {str(e)}"
+                logger.error(f"Error en proceso de enriquecimiento: {e}", exc_info=True)
     
-    return render_template('enrich.html', error=error, success=success)
+    # Estado del enriquecimiento de la colección de la sesión
+    record = registry.get(owner)
+    job = enrichment_job(owner)
+    status = None
+    if record is not None:
+        status = {'status': record['enrichment_status'], 'total': record['row_count'],
+                  'partial': bool(record['enriched_path']) and record['enrichment_status'] != ENRICHMENT_COMPLETE}
+        if job is not None and job.version == record['version']:
+            status.update(job.to_dict())
+    
+    return render_template('enrich.html', error=error, success=success, status=status,
+                           running=ENRICHMENT_RUNNING, complete=ENRICHMENT_COMPLETE,
+                           default_profile=ENRICH_DEFAULT_PROFILE)
 
 @collection_bp.route('/clear-data', methods=['GET', 'POST'])
 def clear_data():
     """
-    Ruta para eliminar todos los archivos CSV de colecciones en la carpeta data
+    Ruta para olvidar la colección activa de esta sesión. Los archivos solo se borran si
+    la sesión la subió; una colección de Discogs la comparten todas las sesiones que
+    importaron ese usuario y la recupera el límite de disco cuando nadie la usa
     """
     error = None
     success = None
     
     if request.method == 'POST':
         try:
-            # Obtener todos los archivos CSV del directorio de datos
-            import os
-            import glob
+            # Solo se borra la subida propia de esta sesión (la clave aleatoria es de la sesión);
+            # los propietarios discogs:<usuario> son compartidos y solo se olvidan
+            owner = session.get(SESSION_COLLECTION_KEY)
+            deleted = bool(owner) and owner.startswith('upload:') and delete_owner(owner)
             
-            # Patrón para buscar archivos CSV en la carpeta data
-            csv_files = glob.glob(os.path.join(DATA_DIR, '*.csv'))
+            # Limpiar variables de sesión relacionadas con colecciones
+            session.pop(SESSION_COLLECTION_KEY, None)
+            session.pop(SESSION_USERNAME_KEY, None)
             
-            if not csv_files:
-                logger.info("No se encontraron archivos CSV para eliminar")
-                success = "No hay archivos de colección para eliminar."
+            if deleted:
+                logger.info(f"Se eliminó la colección {owner} y se limpió la sesión")
+                success = "Se eliminó tu colección correctamente y se limpió la sesión."
             else:
-                # Eliminar cada archivo CSV
-                deleted_count = 0
-                for file_path in csv_files:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f"Archivo eliminado: {file_path}")
-                        deleted_count += 1
-                    except Exception as e:
-                        logger.error(f"Error eliminando archivo {file_path}: {e}")
-                
-                # Limpiar variables de sesión relacionadas con colecciones
-                if SESSION_COLLECTION_KEY in session:
-                    del session[SESSION_COLLECTION_KEY]
-                if SESSION_USERNAME_KEY in session:
-                    del session[SESSION_USERNAME_KEY]
-                
-                logger.info(f"Se eliminaron {deleted_count} archivos CSV y se limpió la sesión")
-                success = f"Se eliminaron {deleted_count} archivos de colección correctamente y se limpió la sesión."
-                
-                # Redirigir al índice con mensaje de éxito
-                flash(success, 'success')
-                return redirect(url_for('main.index'))
+                logger.info("No había una subida propia para eliminar; se limpió la sesión")
+                success = "No hay archivos propios de colección para eliminar. Se limpió la sesión."
+            
+            # Redirigir al índice con mensaje de éxito
+            flash(success, 'success')
+            return redirect(url_for('main.index'))
                 
         except Exception as e:
             error = f"Error al limpiar datos: {str(e)}"
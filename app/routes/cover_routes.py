@@ -0,0 +1,50 @@
+import os
+import logging
+from flask import Blueprint, abort, request, send_file
+from app.config import COVER_MAX_AGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Crear Blueprint
+covers_bp = Blueprint('covers', __name__)
+
+# Mientras no existe la miniatura se sirve el original con una caché corta
+FALLBACK_MAX_AGE_SECONDS = 60
+
+@covers_bp.route('/<name>', methods=['GET'])
+def cover(name):
+    """
+    Sirve una portada desde la caché local (?size=thumb para la miniatura).
+    El nombre es el hash del contenido, así que la respuesta no cambia nunca.
+    """
+    from app.services.cover_cache import get_cover_cache
+    
+    path, mimetype, exact = get_cover_cache().path_for(name, thumbnail=request.args.get('size') == 'thumb')
+    if path is None:
+        abort(404)
+    max_age = COVER_MAX_AGE_SECONDS if exact else FALLBACK_MAX_AGE_SECONDS
+    # La ETag es el nombre del archivo (hash del contenido), no su fecha: el desalojo LRU la modifica
+    response = send_file(os.path.abspath(path), mimetype=mimetype, max_age=max_age, conditional=True,
+                         etag=os.path.basename(path))
+    response.headers['Cache-Control'] = f"public, max-age={max_age}" + (", immutable" if exact else "")
+    return response
+
+
+def cover_urls(image_url):
+    """
+    URLs locales de la portada y la miniatura de un disco, si la portada está en la caché
+
+    Args:
+        image_url: URL de origen guardada en la colección
+
+    Returns:
+        dict: {'cover_url': ..., 'thumbnail_url': ...} (None si la portada no está en la caché)
+    """
+    from flask import url_for
+    from app.services.cover_cache import get_cover_cache
+    
+    name = get_cover_cache().lookup(image_url)
+    if name is None:
+        return {'cover_url': None, 'thumbnail_url': None}
+    return {'cover_url': url_for('covers.cover', name=name),
+            'thumbnail_url': url_for('covers.cover', name=name, size='thumb')}
@@ -1,15 +1,32 @@
 import logging
-import markdown
 from flask import Blueprint, render_template, request, jsonify, session
-from app.utils.vinyl_processor import load_vinyl_data, process_vinyl_data, prepare_vinyl_summary
+from app.utils.vinyl_processor import load_processed_collection, prepare_vinyl_summary
+from app.utils.collection_filters import parse_filters, filter_collection, filter_options
 from app.services.openai_service import generate_recommendation
-from app.config import SESSION_COLLECTION_KEY, COLLECTION_CSV_PATH
+from app.config import SESSION_COLLECTION_KEY
+from app.models.collection_registry import get_registry
+from app.utils.metrics import timer
 
 logger = logging.getLogger(__name__)
 
 # Crear Blueprint
 main_bp = Blueprint('main', __name__)
 
+def render_markdown(text):
+    """
+    Convierte el markdown de la recomendación a HTML
+    
+    Args:
+        text: Texto en markdown
+        
+    Returns:
+        str: HTML generado
+    """
+    # markdown se importa en el primer uso para no cargarlo al arrancar la app
+    import markdown
+    with timer('markdown_render'):
+        return markdown.markdown(text)
+
 @main_bp.route('/', methods=['GET', 'POST'])
 def index():
     """
@@ -17,14 +34,26 @@ def index():
     """
     recommendation = None
     error = None
+    filters = {}
+    collection = None
     
-    # Obtener información de la colección
-    collection_path = session.get(SESSION_COLLECTION_KEY, COLLECTION_CSV_PATH)
+    # Obtener la colección de la sesión desde el registro (una consulta por clave)
+    registry = get_registry()
+    record = registry.get(session.get(SESSION_COLLECTION_KEY))
+    collection_path = record['active_path'] if record else None
+    if record:
+        registry.touch(record['owner'])
     username = session.get('discogs_username', None)
     
     logger.info(f"Cargando página principal. Colección actual: {collection_path}, Usuario: {username}")
     
     if request.method == 'POST':
+        try:
+            filters = parse_filters(request.form)
+        except ValueError as e:
+            error = f"Filtros no válidos: {e}"
+    
+    if request.method == 'POST' and error is None:
         try:
             # Obtener parámetros del formulario
             mood = request.form.get('mood', '')
@@ -34,15 +63,16 @@ def index():
             logger.info(f"Solicitud de recomendación recibida. Mood: '{mood}', Intereses: '{interests}', API key personalizada: {'Sí' if openai_key else 'No'}")
             logger.info(f"Usando colección en {collection_path} para usuario {username}")
             
-            # Cargar datos de vinilos
-            vinyl_data = load_vinyl_data(collection_path=collection_path)
+            # Cargar la colección ya procesada (compartida entre workers si está en el almacén)
+            vinyl_list = collection = load_processed_collection(collection_path=collection_path)
+            if vinyl_list is not None:
+                logger.info(f"Colección cargada correctamente con {len(vinyl_list)} vinilos")
+                # Los filtros se resuelven aquí para que el prompt solo lleve los discos que los cumplen
+                vinyl_list = filter_collection(vinyl_list, collection_path, filters)
             
-            if vinyl_data is not None:
-                logger.info(f"Colección cargada correctamente con {len(vinyl_data)} vinilos")
-                
-                # Procesar datos para obtener información enriquecida
-                vinyl_list = process_vinyl_data(vinyl_data)
-                
+            if vinyl_list is not None and filters and not vinyl_list:
+                error = "Ningún disco de tu colección cumple los filtros elegidos. Prueba con filtros menos estrictos."
+            elif vinyl_list is not None:
                 # Preparar resumen para el prompt de OpenAI (limitado para evitar exceder límite de tokens)
                 # Limitar a 150 vinilos máximo para colecciones grandes
                 vinyl_summary = prepare_vinyl_summary(vinyl_list, max_items=150)
@@ -55,7 +85,7 @@ def index():
                 markdown_text = generate_recommendation(vinyl_summary, mood, interests, api_key=openai_key)
                 
                 # Convertir el markdown a HTML
-                recommendation = markdown.markdown(markdown_text)
+                recommendation = render_markdown(markdown_text)
             else:
                 error = "No se pudo cargar la colección de vinilos. Por favor, sube un archivo CSV válido o proporciona un usuario de Discogs."
                 logger.error(error)
@@ -63,17 +93,41 @@ def index():
             error = f"Error inesperado: {str(e)}"
             logger.error(f"Error en ruta principal: {e}", exc_info=True)
     
+    # Los valores de los filtros solo se calculan si se usaron (para volver a mostrar la selección);
+    # si no, el formulario los pide a /filters al abrir el panel
+    options = None
+    if filters and collection is not None:
+        try:
+            options = filter_options(collection, collection_path)
+        except Exception as e:
+            logger.warning(f"No se pudieron obtener los valores de los filtros: {e}")
+    
     # Preparar contexto para la plantilla
     context = {
         'recommendation': recommendation,
         'error': error,
-        'collection_loaded': session.get(SESSION_COLLECTION_KEY) is not None,
+        'collection_loaded': record is not None,
         'username': username,
-        'collection_path': collection_path
+        'collection_path': collection_path,
+        'filter_options': options,
+        'filters': filters
     }
     
     return render_template('index.html', **context)
 
+@main_bp.route('/filters', methods=['GET'])
+def filter_panel():
+    """
+    Valores disponibles para los filtros del formulario (fragmento HTML que la página
+    principal pide al abrir el panel de filtros)
+    """
+    record = get_registry().get(session.get(SESSION_COLLECTION_KEY))
+    collection = load_processed_collection(collection_path=record['active_path']) if record else None
+    if collection is None:
+        return "No hay una colección cargada", 404
+    options = filter_options(collection, record['active_path'])
+    return render_template('_filter_options.html', filter_options=options, filters={})
+
 @main_bp.route('/api/recommend', methods=['POST'])
 def api_recommend():
     """
@@ -84,18 +138,30 @@ def api_recommend():
         mood = data.get('mood', '')
         interests = data.get('interests', '')
         openai_key = data.get('openai_key', None)
-        collection_path = data.get('collection_path', session.get(SESSION_COLLECTION_KEY, COLLECTION_CSV_PATH))
+        # La colección se identifica por su propietario, nunca por una ruta de archivo
+        registry = get_registry()
+        record = registry.get(data.get('collection_owner', session.get(SESSION_COLLECTION_KEY)))
+        collection_path = record['active_path'] if record else None
+        if record:
+            registry.touch(record['owner'])
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({"error": f"Filtros no válidos: {e}"}), 400
         
         logger.info(f"API: Solicitud de recomendación. Mood: '{mood}', Intereses: '{interests}', API key personalizada: {'Sí' if openai_key else 'No'}")
         
-        vinyl_data = load_vinyl_data(collection_path=collection_path)
+        # Cargar la colección ya procesada (compartida entre workers si está en el almacén)
+        vinyl_list = load_processed_collection(collection_path=collection_path)
         
-        if vinyl_data is None:
+        if vinyl_list is None:
             logger.error("API: No se pudo cargar la colección de vinilos")
             return jsonify({"error": "No se pudo cargar la colección de vinilos"}), 500
         
-        # Procesar datos para obtener información enriquecida
-        vinyl_list = process_vinyl_data(vinyl_data)
+        # Solo los discos que cumplen los filtros llegan al prompt
+        vinyl_list = filter_collection(vinyl_list, collection_path, filters)
+        if filters and not vinyl_list:
+            return jsonify({"error": "Ningún disco de la colección cumple los filtros", "matched": 0}), 404
         
         # Preparar resumen para el prompt de OpenAI
         vinyl_summary = prepare_vinyl_summary(vinyl_list)
@@ -104,11 +170,12 @@ def api_recommend():
         markdown_text = generate_recommendation(vinyl_summary, mood, interests, api_key=openai_key)
         
         # Convertir el markdown a HTML para clientes que lo necesiten
-        html_recommendation = markdown.markdown(markdown_text)
+        html_recommendation = render_markdown(markdown_text)
         
         return jsonify({
             "recommendation": markdown_text,
-            "recommendation_html": html_recommendation
+            "recommendation_html": html_recommendation,
+            "matched": len(vinyl_list)
         })
     except Exception as e:
         logger.error(f"Error en API: {e}", exc_info=True)
@@ -0,0 +1,40 @@
+import hmac
+import logging
+from flask import Blueprint, Response, abort, request
+from app.config import METRICS_ENABLED, METRICS_TOKEN
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Crear Blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+# Direcciones desde las que se leen las métricas sin token
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def _is_authorized():
+    """
+    Indica si la petición puede leer las métricas: con METRICS_TOKEN configurado hay que
+    enviarlo; si no, solo se aceptan peticiones locales
+    
+    Returns:
+        bool: True si la petición está autorizada
+    """
+    if not METRICS_TOKEN:
+        return request.remote_addr in LOCAL_ADDRESSES
+    header = request.headers.get('Authorization', '')
+    supplied = header[len('Bearer '):] if header.startswith('Bearer ') else request.args.get('token')
+    return bool(supplied) and hmac.compare_digest(supplied, METRICS_TOKEN)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Expone las métricas del proceso en formato de texto de Prometheus
+    """
+    if not METRICS_ENABLED:
+        abort(404)
+    if not _is_authorized():
+        abort(403)
+    return Response(REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
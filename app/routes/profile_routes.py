@@ -0,0 +1,37 @@
+import os
+import logging
+from flask import Blueprint, jsonify, abort, send_from_directory, url_for
+from app.config import PROFILING_ENABLED, PROFILES_DIR
+from app.utils.profiler import is_trusted_request, list_profiles, PROFILE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Crear Blueprint
+profiles_bp = Blueprint('profiles', __name__)
+
+@profiles_bp.before_request
+def require_trusted_caller():
+    """
+    Solo quien presente el token de perfilado puede ver o descargar perfiles
+    """
+    if not PROFILING_ENABLED or not is_trusted_request():
+        abort(404)
+
+@profiles_bp.route('/', methods=['GET'])
+def profile_index():
+    """
+    Lista los perfiles guardados con enlaces de descarga
+    """
+    profiles = list_profiles()
+    for profile in profiles:
+        profile['url'] = url_for('profiles.download_profile', name=profile['name'])
+    return jsonify({'profiles': profiles})
+
+@profiles_bp.route('/<name>', methods=['GET'])
+def download_profile(name):
+    """
+    Descarga un archivo de perfil (.prof para pstats/snakeviz, .txt con el resumen)
+    """
+    if not name.endswith(PROFILE_EXTENSIONS) or os.path.basename(name) != name:
+        abort(404)
+    return send_from_directory(os.path.abspath(PROFILES_DIR), name, as_attachment=name.endswith('.prof'))
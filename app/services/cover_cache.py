@@ -0,0 +1,240 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import importlib.util
+from app.config import (COVER_CACHE_DIR, COVER_CACHE_MAX_BYTES, COVER_THUMBNAIL_SIZE,
+                        COVER_THUMBNAIL_WORKERS)
+from app.utils.fileio import atomic_path, atomic_write_json, read_json
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Tipos de imagen aceptados y su extensión
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+MIMETYPES = {extension: mimetype for mimetype, extension in IMAGE_EXTENSIONS.items()}
+
+# Nombre de una portada guardada: sha256 del contenido más la extensión
+COVER_NAME = re.compile(r'^([0-9a-f]{64})(\.(?:jpg|png|gif|webp))$')
+
+THUMBNAIL_SUFFIX = '.thumb.jpg'
+
+# Precisión de la marca de último acceso (evita escribir en disco en cada petición)
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def thumbnails_available():
+    """Las miniaturas se generan con Pillow si está instalado (dependencia opcional)"""
+    return importlib.util.find_spec('PIL') is not None
+
+
+class CoverCache:
+    """
+    Caché en disco de portadas, direccionada por contenido.
+
+    Cada imagen se guarda una vez con el sha256 de su contenido como nombre
+    (<dir>/<aa>/<sha256>.<ext>), aunque la usen varios lanzamientos, y su
+    miniatura se genera en segundo plano junto a ella. Un archivo pequeño por URL
+    de origen (<dir>/urls/<sha256 de la URL>.json) indica qué imagen le
+    corresponde. El tamaño total se acota con desalojo LRU usando la fecha de
+    modificación de los archivos como marca de último acceso.
+    """
+
+    def __init__(self, cache_dir=COVER_CACHE_DIR, max_bytes=COVER_CACHE_MAX_BYTES,
+                 thumbnail_size=COVER_THUMBNAIL_SIZE, workers=COVER_THUMBNAIL_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'download_errors': 0, 'thumbnails': 0,
+                      'evictions': 0}
+        os.makedirs(os.path.join(self.cache_dir, 'urls'), exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._image_files())
+
+    def _image_files(self):
+        """(mtime, tamaño, ruta) de las imágenes y miniaturas guardadas"""
+        files = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir() or shard.name == 'urls':
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and '.tmp-' not in entry.name:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _url_path(self, url):
+        return os.path.join(self.cache_dir, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _image_path(self, name):
+        return os.path.join(self.cache_dir, name[:2], name)
+
+    def lookup(self, url):
+        """
+        Portada guardada para una URL de origen
+
+        Returns:
+            str: Nombre de la portada o None si no está en la caché
+        """
+        if not url or not isinstance(url, str):
+            return None
+        entry = read_json(self._url_path(url))
+        if not entry or not os.path.exists(self._image_path(entry['name'])):
+            return None
+        return entry['name']
+
+    def fetch(self, url, download):
+        """
+        Devuelve la portada de una URL, descargándola solo si no está en la caché
+
+        Args:
+            url: URL de la imagen
+            download: Función que recibe la URL y devuelve (bytes, tipo de contenido) o None
+
+        Returns:
+            str: Nombre de la portada o None si no se pudo obtener
+        """
+        name = self.lookup(url)
+        if name:
+            self.stats['hits'] += 1
+            return name
+        self.stats['misses'] += 1
+        result = download(url)
+        if not result:
+            self.stats['download_errors'] += 1
+            return None
+        name = self.store(*result)
+        if name:
+            atomic_write_json(self._url_path(url), {'url': url, 'name': name})
+        return name
+
+    def store(self, data, content_type):
+        """
+        Guarda una imagen (si no estaba ya) y encarga su miniatura
+
+        Args:
+            data: Contenido de la imagen
+            content_type: Tipo de contenido de la respuesta
+
+        Returns:
+            str: Nombre de la portada o None si no es una imagen aceptada
+        """
+        extension = IMAGE_EXTENSIONS.get((content_type or '').split(';')[0].strip().lower())
+        if not extension or not data:
+            logger.warning(f"Portada descartada: tipo de contenido no admitido ({content_type})")
+            return None
+        name = hashlib.sha256(data).hexdigest() + extension
+        path = self._image_path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_path(path) as tmp_path:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+            with self._lock:
+                self._total_bytes += len(data)
+            self.stats['stores'] += 1
+            self._schedule_thumbnail(name)
+            self._evict_if_needed()
+        return name
+
+    def _schedule_thumbnail(self, name):
+        if not thumbnails_available():
+            return
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cover-thumbnail')
+        self._pool.submit(self._make_thumbnail, name)
+
+    def _make_thumbnail(self, name):
+        from PIL import Image
+
+        source = self._image_path(name)
+        target = source[:-len(COVER_NAME.match(name).group(2))] + THUMBNAIL_SUFFIX
+        try:
+            with Image.open(source) as image:
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                with atomic_path(target) as tmp_path:
+                    image.convert('RGB').save(tmp_path, format='JPEG', quality=80, optimize=True)
+            with self._lock:
+                self._total_bytes += os.path.getsize(target)
+            self.stats['thumbnails'] += 1
+        except Exception as e:
+            logger.warning(f"No se pudo generar la miniatura de {name}: {e}")
+
+    def path_for(self, name, thumbnail=False):
+        """
+        Archivo a servir para una portada (la miniatura si se pide y ya existe)
+
+        Args:
+            name: Nombre de la portada
+            thumbnail: Preferir la miniatura
+
+        Returns:
+            tuple: (ruta, tipo de contenido, si es exactamente lo pedido) o (None, None, False)
+                   si no está en la caché; la miniatura que aún no existe se sustituye por el original
+        """
+        match = COVER_NAME.match(name or '')
+        if not match:
+            return None, None, False
+        path = self._image_path(name)
+        mimetype = MIMETYPES[match.group(2)]
+        exact = not thumbnail
+        if thumbnail:
+            thumbnail_path = path[:-len(match.group(2))] + THUMBNAIL_SUFFIX
+            if os.path.exists(thumbnail_path):
+                path, mimetype, exact = thumbnail_path, 'image/jpeg', True
+        if not os.path.exists(path):
+            return None, None, False
+        # Marcar como usada recientemente para el desalojo LRU (como mucho una vez por TOUCH_INTERVAL_SECONDS)
+        try:
+            if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL_SECONDS:
+                os.utime(path)
+        except OSError:
+            pass
+        return path, mimetype, exact
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            # Recalcular desde disco: otros procesos pueden haber guardado portadas
+            files = sorted(self._image_files())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.stats['evictions'] += 1
+                except OSError:
+                    continue
+            self._total_bytes = total
+            logger.info(f"Caché de portadas recortada a {total} bytes")
+
+    def size_bytes(self):
+        return self._total_bytes
+
+
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+
+def get_cover_cache():
+    """Devuelve la caché de portadas del proceso"""
+    global _cover_cache
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            _cover_cache = CoverCache()
+            REGISTRY.register_cache('covers', lambda: dict(_cover_cache.stats, size_bytes=_cover_cache.size_bytes()))
+        return _cover_cache
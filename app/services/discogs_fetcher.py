@@ -0,0 +1,40 @@
+import json
+from discogs_client.fetchers import Fetcher
+from app.services.http_cache import record_discogs_call
+
+# Módulo separado de http_cache para que discogs_client solo se cargue al crear un DiscogsConnector
+
+
+class CachingUserTokenFetcher(Fetcher):
+    """
+    Fetcher para discogs_client que autentica con token de usuario y pasa
+    las peticiones GET por la caché HTTP condicional
+    """
+
+    def __init__(self, user_token, http_client=None, send_limited=None):
+        self.user_token = user_token
+        self.http = http_client
+        # Envoltorio que espera turno en el limitador compartido antes de cada petición real
+        self.send_limited = send_limited or (lambda send: send())
+        self.rate_limit = None
+        self.rate_limit_used = None
+        self.rate_limit_remaining = None
+
+    def fetch(self, client, method, url, data=None, headers=None, json_format=True):
+        params = {'token': self.user_token}
+        if method == 'GET' and self.http is not None:
+            # La petición real usa el backoff ante 429 de discogs_client solo si backoff_enabled
+            # (DiscogsConnector lo desactiva con el limitador: reintenta pasando por el cubo)
+            resp = self.http.get(
+                url, headers=headers, params=params, auth=self.user_token,
+                send=lambda h: self.send_limited(
+                    lambda: self.request(method, url, data=None, headers=h, params=params))
+            )
+        else:
+            data = json.dumps(data) if json_format and data else data
+            resp = self.send_limited(lambda: self.request(method, url, data=data, headers=headers, params=params))
+        record_discogs_call(url, resp)
+        self.rate_limit = resp.headers.get('X-Discogs-Ratelimit')
+        self.rate_limit_used = resp.headers.get('X-Discogs-Ratelimit-Used')
+        self.rate_limit_remaining = resp.headers.get('X-Discogs-Ratelimit-Remaining')
+        return resp.content, resp.status_code
@@ -1,34 +1,101 @@
 import os
 import time
 import logging
-import pandas as pd
-import discogs_client
-import requests
-from app.config import DISCOGS_TOKEN, COLLECTION_CSV_PATH, ENRICHED_COLLECTION_PATH, DATA_DIR
+import threading
+from app.config import (DISCOGS_TOKEN, DISCOGS_API_URL, DISCOGS_REQUEST_DELAY, COLLECTION_CSV_PATH,
+                        ENRICHED_COLLECTION_PATH, HTTP_CACHE_ENABLED, COVER_CACHE_ENABLED,
+                        DISCOGS_RATE_LIMIT_ENABLED, DISCOGS_RATE_LIMIT_RETRIES, CATALOG_OFFLINE_ONLY, ENRICH_IMMUTABLE_TTL_SECONDS,
+                        ENRICH_VOLATILE_TTL_SECONDS, ENRICH_DEFAULT_PROFILE, RESOLVER_BLOCK_ROWS)
+from app.models.collection_registry import get_registry, discogs_owner
+from app.services.cover_cache import get_cover_cache
+from app.services.http_cache import CachedHTTPClient, get_http_cache, record_discogs_call
+from app.services.rate_limiter import get_token_bucket
+from app.services.release_resolver import resolve_release_ids
+from app.utils.fileio import atomic_path
+from app.utils.ingest import read_collection
+from app.utils.metrics import REGISTRY, timed
+from app.utils.logging_setup import SAMPLED
+from app.utils.release_catalog import as_release_id, get_release_catalog, parse_year
+from app.utils.single_flight import get_single_flight
 
 logger = logging.getLogger(__name__)
 
+# Perfiles de enriquecimiento: columnas que completa cada uno, endpoints que necesita como mínimo
+# y columna de fecha (con su vigencia) que indica que una fila no hace falta volver a consultarla
+# (sin fecha, se omiten las filas que ya tienen todas las columnas del perfil)
+#   release: /releases/<id> (detalles, comunidad, portada y tracklist; en year_only, solo si la
+#            colección no trae el master_id)
+#   master:  /masters/<id> (año original, si el catálogo offline no lo tiene)
+# Los géneros y estilos ya vienen en la colección (basic_information): ningún perfil los pide.
+ENRICHMENT_PROFILES = {
+    'full': {
+        'columns': ('original_release_year', 'community_rating', 'community_have', 'community_want',
+                    'image_url', 'tracklist'),
+        'endpoints': ('release', 'master'),
+        'fetched_at': ('details_fetched_at', ENRICH_IMMUTABLE_TTL_SECONDS),
+    },
+    'year_only': {
+        'columns': ('original_release_year',),
+        'endpoints': ('master',),
+        'fetched_at': None,
+    },
+    'ratings': {
+        'columns': ('community_rating', 'community_have', 'community_want'),
+        'endpoints': ('release',),
+        'fetched_at': ('community_fetched_at', ENRICH_VOLATILE_TTL_SECONDS),
+    },
+}
+
 class DiscogsConnector:
-    def __init__(self, token=None):
+    def __init__(self, token=None, job=None, background=False):
         """
         Inicializa el cliente de Discogs usando las credenciales del archivo .env
         o un token proporcionado
         
         Args:
             token: Token opcional para sobrescribir el configurado
+            job: Nombre del trabajo para repartir la cuota entre trabajos concurrentes
+                 (por defecto, uno por proceso e hilo)
+            background: Baja prioridad: las peticiones solo usan la cuota que dejan libre los demás trabajos
         """
         self.token = token if token else DISCOGS_TOKEN
+        self.job = job or f"{os.getpid()}-{threading.get_ident()}"
+        self.background = background
+        # Cuota compartida por todos los procesos que usan el mismo token
+        self.limiter = get_token_bucket(self.token) if DISCOGS_RATE_LIMIT_ENABLED and self.token else None
+        # Catálogo offline construido con los volcados de Discogs (años originales sin consultar masters)
+        self.catalog = get_release_catalog()
+        # Año de los masters ya consultados (las ediciones de un mismo master comparten año original)
+        self.master_years = {}
+        # Indica si la última descarga REST reutilizó el CSV porque ninguna página cambió
+        self.last_collection_unchanged = False
+        
+        # Cliente HTTP con caché condicional (ETag / Last-Modified) compartido por ambos métodos
+        self.http = CachedHTTPClient(get_http_cache()) if HTTP_CACHE_ENABLED else None
+        # Las portadas se descargan una vez al enriquecer y se sirven desde la caché local
+        self.covers = get_cover_cache() if COVER_CACHE_ENABLED else None
         
         if not self.token:
             logger.warning("No se encontró el token de Discogs")
             self.client = None
         else:
             try:
+                # discogs_client se importa aquí para no cargarlo al arrancar la app
+                import discogs_client
+                from app.services.discogs_fetcher import CachingUserTokenFetcher
+                
                 # Crear cliente con User-Agent personalizado para evitar bloqueos
                 self.client = discogs_client.Client(
                     'VinylRecommender/1.0',
                     user_token=self.token
                 )
+                self.client._base_url = DISCOGS_API_URL
+                # El fetcher propio registra métricas, usa la caché HTTP si está habilitada
+                # y pasa por el limitador compartido antes de cada petición real. Con el limitador
+                # activo, los reintentos tras un 429 los hace _limited (el backoff de discogs_client
+                # reintentaría sin pasar por el cubo)
+                self.client._fetcher = CachingUserTokenFetcher(self.token, self.http, send_limited=self._limited)
+                self.client._fetcher.backoff_enabled = self.limiter is None
                 logger.info("Cliente de Discogs inicializado correctamente")
             except Exception as e:
                 logger.error(f"Error al inicializar el cliente de Discogs: {e}")
@@ -38,16 +105,103 @@ class DiscogsConnector:
         """Verifica si el cliente de Discogs está listo para usarse"""
         return self.client is not None
 
-    def get_user_collection(self, username):
+    def _http_get(self, url, headers):
+        """
+        Realiza un GET a la API REST, pasando por la caché HTTP si está habilitada
+        
+        Args:
+            url: URL de la petición
+            headers: Cabeceras de la petición (incluyen el token)
+            
+        Returns:
+            Response: Respuesta con status_code, text y json()
+        """
+        if self.http is None:
+            import requests
+            response = self._limited(lambda: requests.get(url, headers=headers))
+        else:
+            response = self.http.get(url, headers=headers, auth=self.token,
+                                     send=lambda h: self._limited(lambda: self.http.session.get(url, headers=h)))
+        record_discogs_call(url, response)
+        return response
+
+    def _limited(self, send):
+        """
+        Realiza una petición real a Discogs (las respuestas de la caché no consumen cuota)
+        esperando antes su turno en el limitador compartido. Tras un 429 la repite hasta
+        DISCOGS_RATE_LIMIT_RETRIES veces, cada vez con una nueva ficha del cubo (que queda
+        en pausa tras el 429)
+        
+        Args:
+            send: Función sin argumentos que hace la petición
+            
+        Returns:
+            Response: Respuesta de la petición
+        """
+        if self.limiter is None:
+            return send()
+        for _ in range(DISCOGS_RATE_LIMIT_RETRIES + 1):
+            self.limiter.acquire(self.job, background=self.background)
+            response = send()
+            self.limiter.observe(response.status_code, response.headers)
+            if response.status_code != 429:
+                break
+        return response
+
+    def download_image(self, url):
+        """
+        Descarga una imagen del CDN de Discogs respetando el límite de peticiones
+        
+        Args:
+            url: URL de la imagen
+            
+        Returns:
+            tuple: (bytes, tipo de contenido) o None si hay error
+        """
+        import requests
+        
+        try:
+            response = self._limited(lambda: requests.get(url, headers={
+                "Authorization": f"Discogs token={self.token}",
+                "User-Agent": "VinylRecommender/1.0"
+            }, timeout=30))
+            # Las URL de imágenes no siguen las plantillas de la API: se agrupan en un solo endpoint
+            REGISTRY.inc('discogs_requests_total', endpoint='/images', status=str(response.status_code),
+                         source='network')
+            self._pace(DISCOGS_REQUEST_DELAY)
+            if response.status_code != 200:
+                logger.warning(f"No se pudo descargar la portada {url}: HTTP {response.status_code}")
+                return None
+            return response.content, response.headers.get('Content-Type')
+        except Exception as e:
+            logger.warning(f"Error descargando la portada {url}: {e}")
+            return None
+
+    def _pace(self, seconds):
+        """
+        Espera para respetar el límite de peticiones de la API, registrando el tiempo de espera.
+        Con el limitador compartido no hace falta: cada petición ya espera su turno.
+        
+        Args:
+            seconds: Segundos a esperar
+        """
+        if self.limiter is None and seconds > 0:
+            REGISTRY.inc('discogs_ratelimit_wait_seconds_total', seconds)
+            time.sleep(seconds)
+
+    def get_user_collection(self, username, save_path=None):
         """
         Obtiene la colección de vinilos de un usuario de Discogs
         
         Args:
             username: Nombre de usuario de Discogs
+            save_path: Ruta del CSV a escribir (por defecto, la del usuario en el registro)
             
         Returns:
             DataFrame: DataFrame con la colección del usuario
         """
+        import pandas as pd
+        
         if not self.is_ready():
             logger.error("El cliente de Discogs no está inicializado")
             return None
@@ -82,7 +236,7 @@ class DiscogsConnector:
                             break
                             
                         # Mostrar progreso
-                        logger.info(f"Obteniendo página {page} de la colección de {username} - {len(items)} elementos")
+                        logger.info(f"Obteniendo página {page} de la colección de {username} - {len(items)} elementos", extra=SAMPLED)
                         
                         # Reiniciar contador de errores ya que obtuvimos una página válida
                         max_page_errors = 0
@@ -121,6 +275,8 @@ class DiscogsConnector:
                                         # Crear diccionario con los datos
                                         release_data = {
                                             'release_id': item.release.id,
+                                            # Del listado de la colección (sin pedir el lanzamiento completo)
+                                            'master_id': getattr(item.release, 'data', {}).get('master_id', ''),
                                             'Artist': artist_name,
                                             'Title': item.release.title,
                                             'Label': label_name,
@@ -142,11 +298,11 @@ class DiscogsConnector:
                             except Exception as inner_e:
                                 logger.error(f"No se pudo obtener la colección completa: {inner_e}")
                                 max_page_errors += 1
-                                time.sleep(1)  # Esperar un poco antes de reintentar
+                                self._pace(DISCOGS_REQUEST_DELAY)  # Esperar un poco antes de reintentar
                                 continue
                         else:
                             # Esperar un poco antes de reintentar si no podemos obtener la colección completa
-                            time.sleep(1)
+                            self._pace(DISCOGS_REQUEST_DELAY)
                             continue
                     
                     # Procesar cada item de la página actual
@@ -168,6 +324,8 @@ class DiscogsConnector:
                             # Crear diccionario con los datos
                             release_data = {
                                 'release_id': item.release.id,
+                                # Del listado de la colección (sin pedir el lanzamiento completo)
+                                'master_id': getattr(item.release, 'data', {}).get('master_id', ''),
                                 'Artist': artist_name,
                                 'Title': item.release.title,
                                 'Label': label_name,
@@ -185,7 +343,7 @@ class DiscogsConnector:
                             continue
                         
                     # Esperar un momento para no exceder límites de API
-                    time.sleep(1.5)
+                    self._pace(DISCOGS_REQUEST_DELAY * 1.5)
                     
                     # Ir a la siguiente página
                     page += 1
@@ -193,7 +351,7 @@ class DiscogsConnector:
                 except Exception as e:
                     logger.warning(f"Error en la página {page}: {e}")
                     max_page_errors += 1
-                    time.sleep(1)
+                    self._pace(DISCOGS_REQUEST_DELAY)
             
             # Crear DataFrame
             if not releases:
@@ -204,8 +362,10 @@ class DiscogsConnector:
             logger.info(f"Se obtuvieron {len(df)} discos de la colección de {username}")
             
             # Guardar a CSV para mantener compatibilidad con el flujo existente
-            save_path = os.path.join(DATA_DIR, f"{username}_collection.csv")
-            df.to_csv(save_path, index=False)
+            # (con reemplazo atómico: puede haber lectores de la versión anterior)
+            save_path = save_path or get_registry().collection_path(discogs_owner(username))
+            with atomic_path(save_path) as tmp_path:
+                df.to_csv(tmp_path, index=False)
             logger.info(f"Colección guardada en {save_path}")
             
             return df, save_path
@@ -238,27 +398,31 @@ class DiscogsConnector:
             release = self.client.release(release_id)
             
             # Esperar un momento para no exceder los límites de la API
-            time.sleep(1)
+            self._pace(DISCOGS_REQUEST_DELAY)
             
-            # Intentar obtener el año original de lanzamiento
-            original_year = None
+            # Intentar obtener el año original de lanzamiento, primero en el catálogo offline
+            original_year = self.catalog.original_year(release_id) if self.catalog is not None else None
             
-            # Primero intentamos obtener el master_id y consultar la versión master para el año original
-            master_id = getattr(release, 'master_id', None)
-            if master_id:
+            # Si no está en el catálogo, obtener el master_id y consultar la versión master para el año original
+            # master_id no es un atributo del modelo Release: se lee de los datos crudos
+            master_id = release.fetch('master_id') if hasattr(release, 'fetch') else getattr(release, 'master_id', None)
+            if master_id and not original_year:
+                original_year = self.master_years.get(master_id)
+            if master_id and not original_year:
                 try:
                     # Obtener la información del master (versión original)
                     master = self.client.master(master_id)
-                    time.sleep(1)  # Esperar para no exceder límites de API
+                    self._pace(DISCOGS_REQUEST_DELAY)  # Esperar para no exceder límites de API
                     original_year = getattr(master, 'year', None)
-                    logger.info(f"Año original obtenido del master para {release_id}: {original_year}")
+                    self.master_years[master_id] = original_year
+                    logger.info(f"Año original obtenido del master para {release_id}: {original_year}", extra=SAMPLED)
                 except Exception as e:
                     logger.warning(f"Error obteniendo master para {release_id}: {e}")
             
             # Si no se pudo obtener del master, intentar con el año del release
             if not original_year:
                 original_year = getattr(release, 'year', None)
-                logger.info(f"Usando año del release para {release_id}: {original_year}")
+                logger.info(f"Usando año del release para {release_id}: {original_year}", extra=SAMPLED)
             
             # Intentar obtener la valoración de la comunidad si está disponible
             community_rating = None
@@ -277,6 +441,7 @@ class DiscogsConnector:
             # Extraer información relevante
             result = {
                 'release_id': release_id,
+                'master_id': master_id or 0,
                 'original_release_year': original_year,
                 'genres': getattr(release, 'genres', []),
                 'styles': getattr(release, 'styles', []),
@@ -295,8 +460,11 @@ class DiscogsConnector:
             
             # Procesar imágenes correctamente
             if hasattr(release, 'images'):
-                for img in release.images:
+                for img in release.images or []:
                     image_data = {}
+                    # discogs_client devuelve las imágenes como diccionarios
+                    if isinstance(img, dict):
+                        image_data = {k: img[k] for k in ('uri', 'type') if img.get(k)}
                     if hasattr(img, 'uri'):
                         image_data['uri'] = img.uri
                     if hasattr(img, 'type'):
@@ -304,31 +472,123 @@ class DiscogsConnector:
                     if image_data:  # Solo añadir si se obtuvo algún dato
                         result['images'].append(image_data)
             
-            logger.info(f"Detalles obtenidos para el lanzamiento {release_id}")
+            logger.info(f"Detalles obtenidos para el lanzamiento {release_id}", extra=SAMPLED)
             return result
             
         except Exception as e:
             logger.error(f"Error obteniendo detalles del lanzamiento {release_id}: {e}")
             return None
 
-    def enrich_collection(self, collection_df):
+    def get_community(self, release_id):
+        """
+        Obtiene solo los datos volátiles de un lanzamiento (valoración y have/want de la comunidad),
+        sin consultar el master ni descargar la portada
+        
+        Args:
+            release_id: ID de lanzamiento de Discogs
+            
+        Returns:
+            dict: {'rating', 'have', 'want'} o None si hay error
+        """
+        release_id = as_release_id(release_id)
+        if not self.token or release_id is None:
+            return None
+        
+        headers = {
+            "Authorization": f"Discogs token={self.token}",
+            "User-Agent": "VinylRecommender/1.0"
+        }
+        try:
+            response = self._http_get(f"{DISCOGS_API_URL}/releases/{release_id}", headers)
+            self._pace(DISCOGS_REQUEST_DELAY)
+            if response.status_code != 200:
+                logger.warning(f"No se pudo actualizar la comunidad de {release_id}: HTTP {response.status_code}")
+                return None
+            community = response.json().get('community') or {}
+            rating = community.get('rating')
+            return {
+                'rating': rating.get('average') if isinstance(rating, dict) else rating,
+                'have': community.get('have'),
+                'want': community.get('want')
+            }
+        except Exception as e:
+            logger.warning(f"Error actualizando la comunidad de {release_id}: {e}")
+            return None
+
+    def get_original_year(self, release_id, master_id=None, release_year=None):
+        """
+        Obtiene solo el año original de un lanzamiento: del catálogo offline si lo tiene y si no,
+        del master (consultando antes el lanzamiento únicamente si no se conoce su master_id)
+        
+        Args:
+            release_id: ID de lanzamiento de Discogs
+            master_id: ID del master según la colección (0 si no tiene, None si se desconoce)
+            release_year: Año de la edición, para los lanzamientos sin master
+            
+        Returns:
+            tuple: (año original o None, master_id o None si no se pudo averiguar)
+        """
+        entry = self.catalog.lookup(release_id) if self.catalog is not None else None
+        if entry and entry['original_release_year']:
+            return entry['original_release_year'], entry['master_id'] or 0
+        
+        headers = {
+            "Authorization": f"Discogs token={self.token}",
+            "User-Agent": "VinylRecommender/1.0"
+        }
+        try:
+            if master_id is None:
+                response = self._http_get(f"{DISCOGS_API_URL}/releases/{release_id}", headers)
+                self._pace(DISCOGS_REQUEST_DELAY)
+                if response.status_code != 200:
+                    logger.warning(f"No se pudo obtener el lanzamiento {release_id}: HTTP {response.status_code}")
+                    return None, None
+                data = response.json()
+                master_id = as_release_id(data.get('master_id')) or 0
+                release_year = data.get('year') or release_year
+            if master_id and self.master_years.get(master_id):
+                return self.master_years[master_id], master_id
+            if master_id:
+                response = self._http_get(f"{DISCOGS_API_URL}/masters/{master_id}", headers)
+                self._pace(DISCOGS_REQUEST_DELAY)
+                if response.status_code == 200 and response.json().get('year'):
+                    self.master_years[master_id] = response.json()['year']
+                    return self.master_years[master_id], master_id
+                logger.warning(f"No se pudo obtener el master {master_id}: HTTP {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Error obteniendo el año original de {release_id}: {e}")
+            return None, master_id
+        # Sin master (o sin año en el master), el año original es el de la edición
+        return release_year or None, master_id
+
+    def enrich_collection(self, collection_df, order=None, checkpoint=None, checkpoint_seconds=None,
+                          profile=ENRICH_DEFAULT_PROFILE):
         """
-        Enriquece la información de toda la colección con datos adicionales de Discogs
+        Enriquece la información de toda la colección con datos adicionales de Discogs.
+        Las filas con datos vigentes para el perfil no se vuelven a consultar (en 'full', las de
+        detalles de menos de ENRICH_IMMUTABLE_TTL_SECONDS; sus campos volátiles los actualiza
+        enrichment_refresher).
         
         Args:
-            collection_df: DataFrame de pandas con la colección (debe tener columna 'release_id')
+            collection_df: DataFrame de pandas con la colección (los release_id que faltan se buscan por
+                           artista, título, sello y año)
+            order: Etiquetas de fila en el orden en que se enriquecen (por defecto, el del archivo)
+            checkpoint: Función opcional que recibe (DataFrame parcial, filas procesadas) cada
+                        checkpoint_seconds, para publicar resultados parciales mientras continúa
+            checkpoint_seconds: Intervalo entre llamadas a checkpoint
+            profile: Perfil de ENRICHMENT_PROFILES ('full', 'year_only' o 'ratings')
             
         Returns:
             DataFrame: DataFrame enriquecido con información adicional
         """
+        import pandas as pd
+        
+        if profile not in ENRICHMENT_PROFILES:
+            raise ValueError(f"Perfil de enriquecimiento desconocido: {profile}")
         if not self.is_ready():
             logger.error("El cliente de Discogs no está inicializado")
             return collection_df
         
-        if 'release_id' not in collection_df.columns:
-            logger.error("El DataFrame no contiene la columna 'release_id'")
-            return collection_df
-        
         # Crear una copia para no modificar el original
         enriched_df = collection_df.copy()
         
@@ -341,32 +601,102 @@ class DiscogsConnector:
             enriched_df['image_url'] = None
         if 'tracklist' not in enriched_df.columns:
             enriched_df['tracklist'] = None
+        for column in ('master_id', 'community_have', 'community_want', 'details_fetched_at', 'community_fetched_at'):
+            if column not in enriched_df.columns:
+                enriched_df[column] = float('nan')
+        
+        # Filas con datos vigentes para el perfil (de un enriquecimiento anterior)
+        settings = ENRICHMENT_PROFILES[profile]
+        if settings['fetched_at']:
+            column, ttl = settings['fetched_at']
+            fresh = pd.to_numeric(enriched_df[column], errors='coerce') > time.time() - ttl
+        else:
+            fresh = enriched_df[list(settings['columns'])].notna().all(axis=1)
+        if fresh.any():
+            logger.info(f"{int(fresh.sum())} lanzamientos con datos vigentes no se vuelven a consultar")
         
         # Procesar cada release
         total_releases = len(enriched_df)
-        logger.info(f"Enriqueciendo {total_releases} lanzamientos")
+        logger.info(f"Enriqueciendo {total_releases} lanzamientos (perfil {profile}: "
+                    f"{', '.join(settings['columns'])} con {', '.join(settings['endpoints'])})")
+        if order is None:
+            order = enriched_df.index
+        order = list(order)
+        last_checkpoint = time.monotonic()
         
-        for idx, row in enriched_df.iterrows():
+        for position, idx in enumerate(order):
             # Mostrar progreso cada 10 elementos
-            if idx % 10 == 0:
-                logger.info(f"Enriqueciendo elemento {idx+1} de {total_releases}")
+            if position % 10 == 0:
+                logger.info(f"Enriqueciendo elemento {position+1} de {total_releases}")
+            
+            # Publicar el resultado parcial (las filas prioritarias ya están enriquecidas); si el
+            # trabajo se canceló o la colección cambió de versión, checkpoint lanza una excepción
+            if checkpoint and position and time.monotonic() - last_checkpoint >= checkpoint_seconds:
+                checkpoint(enriched_df, position)
+                last_checkpoint = time.monotonic()
+            
+            # Las filas sin release_id (CSV de otras herramientas o editados a mano) se buscan en
+            # Discogs por bloques, siguiendo el orden de prioridad: así los resultados parciales y
+            # la cancelación no esperan a que se resuelva toda la colección
+            if position % RESOLVER_BLOCK_ROWS == 0:
+                block = [row for row in order[position:position + RESOLVER_BLOCK_ROWS] if not fresh[row]]
+                resolve_release_ids(enriched_df, self, rows=block)
+            
+            if fresh[idx]:
+                continue
             
             try:
                 # Obtener el ID de lanzamiento, asegurando que sea un valor válido
-                release_id = row['release_id']
+                release_id = enriched_df.at[idx, 'release_id']
                 if pd.isna(release_id) or release_id == '':
                     logger.warning(f"ID de lanzamiento no válido en fila {idx}")
                     continue
                 
-                # Convertir a entero si es string numérico
-                if isinstance(release_id, str) and release_id.isdigit():
-                    release_id = int(release_id)
+                # Convertir a entero (texto numérico, escalares de numpy o float por columnas con faltantes)
+                release_id = as_release_id(release_id)
+                if release_id is None:
+                    logger.warning(f"ID de lanzamiento no válido en fila {idx}")
+                    continue
+                
+                if profile == 'year_only':
+                    # master_id de la colección: 0 si no tiene master, NaN si se desconoce
+                    master_id = enriched_df.at[idx, 'master_id']
+                    master_id = None if pd.isna(master_id) else as_release_id(master_id) or 0
+                    released = enriched_df.at[idx, 'Released'] if 'Released' in enriched_df.columns else None
+                    year, master_id = self.get_original_year(release_id, master_id,
+                                                             parse_year(str(released)) if pd.notna(released) else None)
+                    if master_id is not None:
+                        enriched_df.at[idx, 'master_id'] = master_id
+                    if year:
+                        enriched_df.at[idx, 'original_release_year'] = year
+                    continue
+                
+                if profile == 'ratings':
+                    community = self.get_community(release_id)
+                    if community:
+                        enriched_df.at[idx, 'community_rating'] = community['rating']
+                        enriched_df.at[idx, 'community_have'] = community['have']
+                        enriched_df.at[idx, 'community_want'] = community['want']
+                        enriched_df.at[idx, 'community_fetched_at'] = time.time()
+                    continue
+                
+                # Con CATALOG_OFFLINE_ONLY, los discos del catálogo no gastan cuota de la API
+                entry = self.catalog.lookup(release_id) if self.catalog is not None and CATALOG_OFFLINE_ONLY else None
+                if entry and entry['original_release_year']:
+                    enriched_df.at[idx, 'original_release_year'] = entry['original_release_year']
+                    continue
                 
                 # Obtener detalles y actualizar el DataFrame
                 details = self.get_release_details(release_id)
                 if details:
                     enriched_df.at[idx, 'original_release_year'] = details['original_release_year']
+                    enriched_df.at[idx, 'master_id'] = details['master_id']
                     enriched_df.at[idx, 'community_rating'] = details['community']['rating']
+                    enriched_df.at[idx, 'community_have'] = details['community']['have']
+                    enriched_df.at[idx, 'community_want'] = details['community']['want']
+                    fetched = time.time()
+                    enriched_df.at[idx, 'details_fetched_at'] = fetched
+                    enriched_df.at[idx, 'community_fetched_at'] = fetched
                     
                     # Guardar la primera imagen de tipo 'primary' o 'secondary' si existe
                     images = details.get('images', [])
@@ -374,6 +704,8 @@ class DiscogsConnector:
                     
                     if primary_images:
                         enriched_df.at[idx, 'image_url'] = primary_images[0]['uri']
+                        if self.covers is not None:
+                            self.covers.fetch(primary_images[0]['uri'], self.download_image)
                     
                     # Convertir la tracklist a una cadena resumida
                     tracklist = details.get('tracklist', [])
@@ -389,24 +721,79 @@ class DiscogsConnector:
         logger.info(f"Proceso de enriquecimiento completado para {total_releases} lanzamientos")
         return enriched_df
 
-    def get_user_collection_alternative(self, username):
+    @staticmethod
+    def _parse_collection_page(data):
+        """
+        Convierte una página de la API REST de colección en filas para el DataFrame
+        
+        Args:
+            data: JSON de la página (con la lista 'releases')
+            
+        Returns:
+            list: Lista de diccionarios con los datos de cada disco
+        """
+        releases = []
+        for item in data.get('releases', []):
+            try:
+                basic_info = item.get('basic_information', {})
+                
+                # Obtener datos básicos
+                artist_name = "Unknown"
+                if 'artists' in basic_info and basic_info['artists']:
+                    artist_name = basic_info['artists'][0].get('name', "Unknown")
+                    
+                label_name = ""
+                if 'labels' in basic_info and basic_info['labels']:
+                    label_name = basic_info['labels'][0].get('name', "")
+                    
+                formats = ""
+                if 'formats' in basic_info and basic_info['formats']:
+                    format_names = [f.get('name', "") for f in basic_info['formats']]
+                    formats = ', '.join(filter(None, format_names))
+                    
+                # Crear diccionario con los datos
+                release_data = {
+                    'release_id': basic_info.get('id', ""),
+                    'master_id': basic_info.get('master_id', ""),
+                    'Artist': artist_name,
+                    'Title': basic_info.get('title', "Unknown"),
+                    'Label': label_name,
+                    'Format': formats,
+                    'Released': basic_info.get('year', ""),
+                    'Genre': ', '.join(basic_info.get('genres', [])),
+                    'Style': ', '.join(basic_info.get('styles', [])),
+                    'Rating': item.get('rating', ""),
+                    'Collection Media Condition': item.get('notes', [{}])[0].get('value', "") if 'notes' in item and item['notes'] else "",
+                    'Collection Sleeve Condition': item.get('notes', [{}])[-1].get('value', "") if 'notes' in item and len(item['notes']) > 1 else ""
+                }
+                releases.append(release_data)
+            except Exception as e:
+                logger.warning(f"Error procesando item: {e}")
+                continue
+        return releases
+
+    def get_user_collection_alternative(self, username, save_path=None):
         """
         Método alternativo para obtener la colección usando directamente las API REST de Discogs
         en lugar de la biblioteca cliente.
         
         Args:
             username: Nombre de usuario de Discogs
+            save_path: Ruta del CSV a escribir (por defecto, la del usuario en el registro)
             
         Returns:
             tuple: (DataFrame con la colección, ruta del archivo guardado) o (None, None) si hay error
         """
+        import pandas as pd
+        
+        self.last_collection_unchanged = False
         if not self.token:
             logger.error("Se requiere token para usar la API REST de Discogs")
             return None, None
         
         try:
             # URLs base para la API de Discogs
-            base_url = "https://api.discogs.com"
+            base_url = DISCOGS_API_URL
             headers = {
                 "Authorization": f"Discogs token={self.token}",
                 "User-Agent": "VinylRecommender/1.0"
@@ -416,7 +803,7 @@ class DiscogsConnector:
             folders_url = f"{base_url}/users/{username}/collection/folders"
             logger.info(f"Obteniendo folders para {username}: {folders_url}")
             
-            response = requests.get(folders_url, headers=headers)
+            response = self._http_get(folders_url, headers)
             if response.status_code != 200:
                 logger.error(f"Error obteniendo folders: {response.status_code} - {response.text}")
                 return None, None
@@ -435,15 +822,42 @@ class DiscogsConnector:
             per_page = 100
             releases = []
             error_count = 0  # Contador de errores consecutivos
+            save_path = save_path or get_registry().collection_path(discogs_owner(username))
+            # Páginas servidas por la caché cuyo parseo se pospone mientras ninguna cambie
+            unchanged_pages = []
+            all_pages_unchanged = True
+            total_pages = 0
             
             while error_count < 2:  # Si tenemos 2 errores consecutivos, salimos del bucle
                 releases_url = f"{base_url}/users/{username}/collection/folders/{folder_id}/releases?page={page}&per_page={per_page}"
-                logger.info(f"Obteniendo página {page} para {username}: {releases_url}")
+                logger.info(f"Obteniendo página {page} para {username}: {releases_url}", extra=SAMPLED)
                 
-                response = requests.get(releases_url, headers=headers)
+                response = self._http_get(releases_url, headers)
+                from_cache = getattr(response, 'from_cache', False)
                 
                 # Verificar si la respuesta es exitosa
                 if response.status_code == 200:
+                    if from_cache and all_pages_unchanged and os.path.exists(save_path):
+                        # Página sin cambios (304 o aún fresca): reutilizar el CSV si ninguna cambió
+                        unchanged_pages.append(response)
+                        if page == 1:
+                            total_pages = response.json().get('pagination', {}).get('pages', 0)
+                        if page >= total_pages:
+                            logger.info(f"La colección de {username} no cambió desde la última descarga")
+                            self.last_collection_unchanged = True
+                            return read_collection(save_path), save_path
+                        if getattr(response, 'revalidated', False):
+                            self._pace(DISCOGS_REQUEST_DELAY * 1.5)
+                        page += 1
+                        continue
+                    
+                    if unchanged_pages:
+                        # Alguna página cambió: procesar también las que se habían pospuesto
+                        for cached_response in unchanged_pages:
+                            releases.extend(self._parse_collection_page(cached_response.json()))
+                        unchanged_pages = []
+                    all_pages_unchanged = False
+                    
                     data = response.json()
                     
                     # Verificar si hay releases en esta página
@@ -455,43 +869,8 @@ class DiscogsConnector:
                     error_count = 0
                     
                     # Procesar cada item
-                    logger.info(f"Procesando {len(data['releases'])} releases de la página {page}")
-                    for item in data['releases']:
-                        try:
-                            basic_info = item.get('basic_information', {})
-                            
-                            # Obtener datos básicos
-                            artist_name = "Unknown"
-                            if 'artists' in basic_info and basic_info['artists']:
-                                artist_name = basic_info['artists'][0].get('name', "Unknown")
-                                
-                            label_name = ""
-                            if 'labels' in basic_info and basic_info['labels']:
-                                label_name = basic_info['labels'][0].get('name', "")
-                                
-                            formats = ""
-                            if 'formats' in basic_info and basic_info['formats']:
-                                format_names = [f.get('name', "") for f in basic_info['formats']]
-                                formats = ', '.join(filter(None, format_names))
-                                
-                            # Crear diccionario con los datos
-                            release_data = {
-                                'release_id': basic_info.get('id', ""),
-                                'Artist': artist_name,
-                                'Title': basic_info.get('title', "Unknown"),
-                                'Label': label_name,
-                                'Format': formats,
-                                'Released': basic_info.get('year', ""),
-                                'Genre': ', '.join(basic_info.get('genres', [])),
-                                'Style': ', '.join(basic_info.get('styles', [])),
-                                'Rating': item.get('rating', ""),
-                                'Collection Media Condition': item.get('notes', [{}])[0].get('value', "") if 'notes' in item and item['notes'] else "",
-                                'Collection Sleeve Condition': item.get('notes', [{}])[-1].get('value', "") if 'notes' in item and len(item['notes']) > 1 else ""
-                            }
-                            releases.append(release_data)
-                        except Exception as e:
-                            logger.warning(f"Error procesando item: {e}")
-                            continue
+                    logger.info(f"Procesando {len(data['releases'])} releases de la página {page}", extra=SAMPLED)
+                    releases.extend(self._parse_collection_page(data))
                     
                     # Verificar si hay más páginas
                     pagination = data.get('pagination', {})
@@ -511,11 +890,11 @@ class DiscogsConnector:
                         break
                     
                     # Esperar un poco más tiempo antes de reintentar en caso de error
-                    time.sleep(2)
+                    self._pace(DISCOGS_REQUEST_DELAY * 2)
                     continue
                 
                 # Esperar para no exceder límites de API
-                time.sleep(1.5)
+                self._pace(DISCOGS_REQUEST_DELAY * 1.5)
                 page += 1
             
             # Crear DataFrame
@@ -526,9 +905,9 @@ class DiscogsConnector:
             df = pd.DataFrame(releases)
             logger.info(f"Se obtuvieron {len(df)} discos de la colección de {username}")
             
-            # Guardar a CSV para mantener compatibilidad con el flujo existente
-            save_path = os.path.join(DATA_DIR, f"{username}_collection.csv")
-            df.to_csv(save_path, index=False)
+            # Guardar a CSV para mantener compatibilidad con el flujo existente (con reemplazo atómico)
+            with atomic_path(save_path) as tmp_path:
+                df.to_csv(tmp_path, index=False)
             logger.info(f"Colección guardada en {save_path}")
             
             return df, save_path
@@ -553,8 +932,9 @@ def save_enriched_collection(enriched_df, output_path=ENRICHED_COLLECTION_PATH):
         # Crear directorio si no existe
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # Guardar a CSV
-        enriched_df.to_csv(output_path, index=False)
+        # Guardar a CSV (con reemplazo atómico: puede haber lectores de una versión parcial anterior)
+        with atomic_path(output_path) as tmp_path:
+            enriched_df.to_csv(tmp_path, index=False)
         logger.info(f"Colección enriquecida guardada en {output_path}")
         return True
     except Exception as e:
@@ -562,7 +942,10 @@ def save_enriched_collection(enriched_df, output_path=ENRICHED_COLLECTION_PATH):
         return False
 
 
-def enrich_collection_from_file(input_csv_path=COLLECTION_CSV_PATH, output_csv_path=ENRICHED_COLLECTION_PATH, token=None):
+@timed('enrich_collection_from_file')
+def enrich_collection_from_file(input_csv_path=COLLECTION_CSV_PATH, output_csv_path=ENRICHED_COLLECTION_PATH, token=None,
+                                prioritize=False, on_snapshot=None, snapshot_seconds=None, job=None,
+                                profile=ENRICH_DEFAULT_PROFILE):
     """
     Carga un archivo CSV de colección de Discogs y lo enriquece con datos adicionales
     
@@ -570,28 +953,47 @@ def enrich_collection_from_file(input_csv_path=COLLECTION_CSV_PATH, output_csv_p
         input_csv_path: Ruta al archivo CSV de la colección
         output_csv_path: Ruta para guardar el archivo enriquecido
         token: Token opcional para API de Discogs
+        prioritize: Enriquecer primero los discos que más probablemente lleguen al prompt
+        on_snapshot: Función opcional que recibe (ruta, filas procesadas) cada vez que se
+                     guarda en output_csv_path una versión parcial
+        snapshot_seconds: Intervalo entre versiones parciales (requiere output_csv_path)
+        job: Nombre del trabajo en el limitador compartido (turnos entre enriquecimientos concurrentes)
+        profile: Perfil de ENRICHMENT_PROFILES (qué columnas se completan y con qué endpoints)
         
     Returns:
-        DataFrame: DataFrame con la colección enriquecida
+        DataFrame: DataFrame con la colección enriquecida o None si no se pudo enriquecer
+                   (sin token de Discogs o por un error)
     """
     try:
-        # Cargar el CSV original
-        df = pd.read_csv(input_csv_path)
+        # Cargar el CSV original (columnas del esquema con sus tipos)
+        df = read_collection(input_csv_path)
         logger.info(f"CSV cargado correctamente: {len(df)} registros")
         
         # Inicializar conector de Discogs
-        connector = DiscogsConnector(token=token)
+        connector = DiscogsConnector(token=token, job=job)
         
         if not connector.is_ready():
             logger.error("No se pudo inicializar el conector de Discogs")
-            return df
+            return None
+        
+        order = None
+        if prioritize:
+            from app.services.enrichment_scheduler import enrichment_order
+            order = enrichment_order(df)
+        
+        checkpoint = None
+        if output_csv_path and on_snapshot and snapshot_seconds:
+            def checkpoint(partial_df, done):
+                if save_enriched_collection(partial_df, output_csv_path):
+                    on_snapshot(output_csv_path, done)
             
         # Enriquecer la colección
-        enriched_df = connector.enrich_collection(df)
+        enriched_df = connector.enrich_collection(df, order=order, checkpoint=checkpoint,
+                                                  checkpoint_seconds=snapshot_seconds, profile=profile)
         
         # Guardar a CSV si se especificó una ruta
-        if output_csv_path:
-            save_enriched_collection(enriched_df, output_csv_path)
+        if output_csv_path and not save_enriched_collection(enriched_df, output_csv_path):
+            return None
             
         return enriched_df
     except Exception as e:
@@ -599,58 +1001,84 @@ def enrich_collection_from_file(input_csv_path=COLLECTION_CSV_PATH, output_csv_p
         return None
 
 
-def check_existing_collection(username):
+@timed('get_user_collection_helper')
+def get_user_collection_helper(username, token=None, refresh=False):
     """
-    Verifica si ya existe la colección de un usuario descargada localmente
+    Función auxiliar para obtener la colección de un usuario de Discogs
     
     Args:
         username: Nombre de usuario de Discogs
+        token: Token opcional para API de Discogs
+        refresh: Si es True, vuelve a consultar Discogs aunque exista una copia local
+                 (las páginas sin cambios se revalidan con peticiones condicionales)
         
     Returns:
-        str: Ruta al archivo de colección existente, o None si no existe
+        tuple: (DataFrame con la colección, ruta del archivo guardado)
     """
-    # Verificar posibles rutas donde puede estar la colección
-    expected_path = os.path.join(DATA_DIR, f"{username}_collection.csv")
-    enriched_path = os.path.join(DATA_DIR, f"{username}_collection_enriched.csv")
+    owner = discogs_owner(username)
+    if not refresh:
+        registered = _read_registered_collection(owner)
+        if registered is not None:
+            return registered
+    
+    # Solo la importación desde Discogs se coalesce: las peticiones simultáneas por el mismo
+    # usuario (pestañas, sesiones con tokens distintos o workers) comparten una sola en lugar de
+    # escribir a la vez el mismo CSV. La clave no incluye el token porque el CSV y el registro
+    # son los mismos para todos. Entre procesos solo se comparte la ruta del CSV; quien no
+    # hizo la importación lo lee del disco.
+    imported = {}
     
-    # Verificar si existe la versión enriquecida primero
-    if os.path.exists(enriched_path):
-        logger.info(f"Encontrada colección enriquecida existente para {username}: {enriched_path}")
-        return enriched_path
-    # Verificar si existe la versión normal
-    elif os.path.exists(expected_path):
-        logger.info(f"Encontrada colección existente para {username}: {expected_path}")
-        return expected_path
+    def run():
+        imported['result'] = _get_user_collection(username, token, refresh)
+        return imported['result'][1]
     
-    # No se encontró ninguna colección
-    logger.info(f"No se encontró colección existente para {username}")
-    return None
+    path = get_single_flight().do('user_collection', (owner, bool(refresh)), run)
+    if 'result' in imported:
+        return imported['result']
+    if path is None:
+        return None, None
+    try:
+        return read_collection(path), path
+    except Exception as e:
+        logger.error(f"Error leyendo la colección importada por otra petición: {e}")
+        return None, None
 
 
-def get_user_collection_helper(username, token=None):
+def _read_registered_collection(owner):
     """
-    Función auxiliar para obtener la colección de un usuario de Discogs
+    Lee la colección registrada de un propietario sin consultar Discogs
     
     Args:
-        username: Nombre de usuario de Discogs
-        token: Token opcional para API de Discogs
+        owner: Propietario (discogs:<usuario>)
         
     Returns:
-        tuple: (DataFrame con la colección, ruta del archivo guardado)
+        tuple: (DataFrame, ruta) o None si no está registrada o no se puede leer
     """
+    registry = get_registry()
+    record = registry.get(owner)
+    if not record:
+        return None
+    logger.info(f"Usando colección registrada para {owner}: {record['active_path']} (v{record['version']})")
+    try:
+        df = read_collection(record['active_path'])
+    except Exception as e:
+        logger.error(f"Error leyendo colección existente: {e}. Intentando obtener de nuevo.")
+        return None
+    registry.touch(owner)
+    return df, record['active_path']
+
+
+def _get_user_collection(username, token=None, refresh=False):
+    """Obtiene la colección de un usuario sin coalescencia (ver get_user_collection_helper)"""
     try:
         logger.info(f"Obteniendo colección para el usuario: {username}")
         
-        # Verificar si ya tenemos la colección descargada
-        existing_path = check_existing_collection(username)
-        if existing_path:
-            logger.info(f"Usando colección existente para {username}: {existing_path}")
-            try:
-                df = pd.read_csv(existing_path)
-                return df, existing_path
-            except Exception as e:
-                logger.error(f"Error leyendo colección existente: {e}. Intentando obtener de nuevo.")
-                # Continuar con el proceso normal si hay error al leer la existente
+        # Volver a mirar el registro: otro proceso pudo terminar la importación hace un momento
+        registry = get_registry()
+        owner = discogs_owner(username)
+        registered = None if refresh else _read_registered_collection(owner)
+        if registered is not None:
+            return registered
         
         # Inicializar conector con el token proporcionado o el configurado
         connector = DiscogsConnector(token=token)
@@ -658,21 +1086,33 @@ def get_user_collection_helper(username, token=None):
         if not connector.is_ready():
             logger.error("No se pudo inicializar el conector de Discogs")
             return None, None
-            
-        # Intentar obtener la colección con el método estándar primero
-        result = connector.get_user_collection(username)
         
-        # Si falló, intentar con el método alternativo
-        if not result:
-            logger.info("Método estándar falló, intentando método alternativo...")
+        if refresh:
+            # En una actualización, la API REST permite detectar páginas sin cambios
             result = connector.get_user_collection_alternative(username)
+            if not result or result[0] is None:
+                logger.info("Método alternativo falló, intentando método estándar...")
+                result = connector.get_user_collection(username)
+        else:
+            # Intentar obtener la colección con el método estándar primero
+            result = connector.get_user_collection(username)
+            
+            # Si falló, intentar con el método alternativo
+            if not result:
+                logger.info("Método estándar falló, intentando método alternativo...")
+                result = connector.get_user_collection_alternative(username)
         
-        if not result:
+        if not result or result[0] is None:
             logger.error(f"No se pudo obtener la colección de {username} con ningún método")
             return None, None
             
         collection_df, save_path = result
-            
+        
+        # Registrar la nueva versión (si no cambió en Discogs, se conserva el enriquecimiento)
+        previous = registry.get(owner)
+        if previous is not None and connector.last_collection_unchanged:
+            return collection_df, previous['active_path']
+        registry.register(owner, save_path, len(collection_df), source='discogs', username=username)
         return collection_df, save_path
     except Exception as e:
         logger.error(f"Error obteniendo colección del usuario {username}: {e}")
@@ -0,0 +1,183 @@
+import time
+import logging
+import threading
+from app.config import (ENRICH_VOLATILE_TTL_SECONDS, REFRESH_INTERVAL_SECONDS, REFRESH_BATCH_SIZE,
+                        REFRESH_LOCK_PATH)
+from app.models.collection_registry import get_registry, ENRICHMENT_COMPLETE
+from app.utils.background import LeaderThread
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Columnas volátiles del CSV enriquecido -> campo de get_community
+VOLATILE_COLUMNS = {'community_rating': 'rating', 'community_have': 'have', 'community_want': 'want'}
+
+
+def _fetched_at(df):
+    """
+    Fecha de los campos volátiles de las filas ya enriquecidas (0 si no se registró).
+    Las filas sin enriquecer o sin release_id no se incluyen: son trabajo del enriquecimiento completo.
+    """
+    import pandas as pd
+    from app.utils.release_catalog import as_release_id
+
+    def column(name):
+        return pd.to_numeric(df[name], errors='coerce') if name in df.columns else pd.Series(float('nan'), index=df.index)
+
+    # Los discos enriquecidos antes de que existieran las fechas cuentan como vencidos; los que
+    # solo tienen el año (perfil year_only) no se actualizan
+    enriched = (column('details_fetched_at').notna() | column('community_fetched_at').notna()
+                | column('community_rating').notna())
+    if 'release_id' in df.columns:
+        enriched &= df['release_id'].map(as_release_id).notna()
+    else:
+        enriched[:] = False
+    return column('community_fetched_at')[enriched].fillna(0.0)
+
+
+def expired_rows(df, now=None, ttl=ENRICH_VOLATILE_TTL_SECONDS):
+    """
+    Filas enriquecidas cuyos campos volátiles vencieron
+
+    Args:
+        df: DataFrame de la colección enriquecida
+        now: Momento de referencia (por defecto, ahora)
+        ttl: Vigencia de los campos volátiles en segundos
+
+    Returns:
+        list: Etiquetas de fila, las actualizadas hace más tiempo primero
+    """
+    now = time.time() if now is None else now
+    fetched_at = _fetched_at(df)
+    return fetched_at[fetched_at <= now - ttl].sort_values(kind='stable').index.tolist()
+
+
+def refresh_collection(record, connector, batch_size=REFRESH_BATCH_SIZE, ttl=ENRICH_VOLATILE_TTL_SECONDS):
+    """
+    Actualiza un lote de campos volátiles vencidos de una colección enriquecida y la guarda
+    si nadie la reemplazó mientras tanto (nueva versión o enriquecimiento en curso)
+
+    Args:
+        record: Registro de la colección (con enriched_path)
+        connector: DiscogsConnector (de baja prioridad)
+        batch_size: Filas a consultar como máximo
+        ttl: Vigencia de los campos volátiles en segundos
+
+    Returns:
+        tuple: (filas actualizadas, filas que siguen vencidas, momento en que vence la próxima fila)
+    """
+    from app.services.discogs_service import save_enriched_collection
+    from app.utils.ingest import read_collection
+
+    path = record['enriched_path']
+    df = read_collection(path)
+    due = expired_rows(df, ttl=ttl)
+    if not due:
+        fetched_at = _fetched_at(df)
+        return 0, 0, (fetched_at.min() + ttl) if len(fetched_at) else float('inf')
+
+    for column in VOLATILE_COLUMNS:
+        if column not in df.columns:
+            df[column] = float('nan')
+    if 'community_fetched_at' not in df.columns:
+        df['community_fetched_at'] = float('nan')
+
+    refreshed = 0
+    for idx in due[:batch_size]:
+        community = connector.get_community(df.at[idx, 'release_id'])
+        if community is None:
+            continue
+        for column, field in VOLATILE_COLUMNS.items():
+            df.at[idx, column] = community[field]
+        df.at[idx, 'community_fetched_at'] = time.time()
+        refreshed += 1
+
+    current = get_registry().get(record['owner'])
+    if (current is None or current['version'] != record['version'] or current['enriched_path'] != path
+            or current['enrichment_status'] != ENRICHMENT_COMPLETE):
+        logger.info(f"La colección {record['owner']} cambió mientras se actualizaba; se descarta el lote")
+        return 0, 0, float('inf')
+    if refreshed:
+        save_enriched_collection(df, path)
+        REGISTRY.inc('discogs_refresh_rows_total', refreshed)
+        logger.info(f"Campos volátiles actualizados en {record['owner']}: {refreshed} discos "
+                    f"({len(due) - refreshed} siguen vencidos)")
+    return refreshed, len(due) - refreshed, time.time()
+
+
+class CommunityRefresher(LeaderThread):
+    """
+    Mantiene al día la valoración y los have/want de las colecciones enriquecidas.
+
+    Las lecturas siempre usan el CSV enriquecido tal como está; este hilo recorre las
+    colecciones con el enriquecimiento completo y vuelve a consultar solo los campos
+    volátiles vencidos (ENRICH_VOLATILE_TTL_SECONDS), por lotes y con un conector de
+    baja prioridad que solo usa la cuota ociosa. Lo hace un único proceso: el que
+    obtiene el flock de REFRESH_LOCK_PATH (si termina, lo toma otro).
+    """
+
+    description = 'la actualización de campos volátiles de las colecciones enriquecidas'
+
+    def __init__(self, interval=REFRESH_INTERVAL_SECONDS, batch_size=REFRESH_BATCH_SIZE, lock_path=REFRESH_LOCK_PATH):
+        super().__init__('community-refresher', interval, lock_path)
+        self.batch_size = batch_size
+        self._connector = None
+        # (propietario, versión, fin del último enriquecimiento) -> momento en que vence su próxima fila
+        self._next_due = {}
+
+    def run_once(self, connector):
+        """
+        Actualiza un lote de cada colección con campos vencidos
+
+        Args:
+            connector: DiscogsConnector de baja prioridad
+
+        Returns:
+            bool: True si quedan filas vencidas en colecciones que avanzaron (conviene seguir sin esperar)
+        """
+        now = time.time()
+        more = False
+        live = set()
+        for record in get_registry().enriched_records():
+            key = (record['owner'], record['version'], record['enriched_at'])
+            live.add(key)
+            if self._next_due.get(key, 0.0) > now:
+                continue
+            try:
+                refreshed, remaining, next_due = refresh_collection(record, connector, self.batch_size)
+            except Exception as e:
+                logger.warning(f"Error actualizando los campos volátiles de {record['owner']}: {e}")
+                next_due, refreshed, remaining = now + self.interval, 0, 0
+            if remaining and not refreshed:
+                # Ninguna consulta funcionó: se reintenta en el próximo ciclo
+                next_due = now + self.interval
+            self._next_due[key] = next_due
+            more = more or bool(remaining and refreshed)
+        self._next_due = {key: due for key, due in self._next_due.items() if key in live}
+        return more
+
+    def tick(self):
+        from app.services.discogs_service import DiscogsConnector
+
+        if self._connector is None:
+            self._connector = DiscogsConnector(job='refresh', background=True)
+        return self.run_once(self._connector)
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresher():
+    """
+    Inicia el hilo de actualización de campos volátiles del proceso (si no está en marcha)
+
+    Returns:
+        CommunityRefresher: Hilo en ejecución
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = CommunityRefresher()
+            _refresher.start()
+        return _refresher
@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+import threading
+from app.config import ENRICH_SNAPSHOT_SECONDS, ENRICH_TOP_STYLES, ENRICH_DEFAULT_PROFILE
+from app.models.collection_registry import (get_registry, ENRICHMENT_RUNNING, ENRICHMENT_COMPLETE,
+                                            ENRICHMENT_FAILED)
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentCancelled(Exception):
+    """La colección cambió de versión mientras se enriquecía"""
+
+
+def enrichment_order(df, top_styles=ENRICH_TOP_STYLES):
+    """
+    Orden en que conviene enriquecer una colección para que los resultados parciales sirvan cuanto antes:
+      1. Discos calificados, de mayor a menor calificación (son los que prepare_vinyl_summary lleva al prompt)
+      2. El resto: primero los que no tienen año (el enriquecimiento aporta el año original) y luego
+         los de los estilos más frecuentes de la colección
+      3. Al final, los que ya tienen datos de un enriquecimiento anterior
+
+    Args:
+        df: DataFrame de la colección
+        top_styles: Cantidad de estilos más frecuentes que suben de prioridad
+
+    Returns:
+        list: Etiquetas de fila en orden de prioridad
+    """
+    import numpy as np
+    import pandas as pd
+    from app.utils.facet_index import split_values
+
+    rows = len(df)
+
+    def column(name):
+        return df[name].reset_index(drop=True) if name in df.columns else pd.Series([None] * rows, dtype=object)
+
+    rating = pd.to_numeric(column('Rating'), errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    enriched = column('original_release_year').notna().to_numpy()
+    has_year = column('Released').astype(str).str.contains(r'\d{4}', regex=True).to_numpy()
+    no_year = ~(has_year | enriched)
+
+    # Peso de cada disco según el estilo más frecuente que tenga (entre los top_styles de la colección)
+    styles = column('Style').map(lambda value: split_values(value, True)).explode()
+    counts = styles.value_counts().head(top_styles)
+    style_weight = np.zeros(rows)
+    if len(counts):
+        weights = styles.map(counts / counts.iloc[0]).fillna(0)
+        style_weight = weights.groupby(level=0).max().reindex(range(rows), fill_value=0).to_numpy()
+
+    tier = np.where(enriched, 2, np.where(rating > 0, 0, 1))
+    # np.lexsort ordena por la última clave primero
+    order = np.lexsort((np.arange(rows), -style_weight, -no_year.astype(np.int8), -rating, tier))
+    logger.info(f"Orden de enriquecimiento: {int((tier == 0).sum())} calificados, {int((no_year & (tier == 1)).sum())} "
+                f"sin año, {int((tier == 2).sum())} ya enriquecidos al final")
+    return df.index[order].tolist()
+
+
+class EnrichmentJob(threading.Thread):
+    """
+    Enriquecimiento de la colección de un propietario en segundo plano. Cada
+    ENRICH_SNAPSHOT_SECONDS guarda la colección enriquecida hasta ese momento y la
+    registra como activa, de modo que las recomendaciones usan los datos parciales
+    mientras el trabajo continúa.
+    """
+
+    def __init__(self, owner, record, token=None, snapshot_seconds=ENRICH_SNAPSHOT_SECONDS,
+                 profile=ENRICH_DEFAULT_PROFILE):
+        super().__init__(name=f"enrich-{owner}", daemon=True)
+        self.owner = owner
+        self.profile = profile
+        self.version = record['version']
+        self.total = record['row_count']
+        self.token = token
+        self.snapshot_seconds = snapshot_seconds
+        # Si hay una versión enriquecida (parcial o de otro perfil) se parte de ella: sus filas
+        # van al final y las que tienen datos vigentes para el perfil no se consultan
+        self.input_path = record['enriched_path'] or record['path']
+        self.done = 0
+        self.snapshots = 0
+        self.status = ENRICHMENT_RUNNING
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def _on_snapshot(self, path, done):
+        self.done = done
+        self.snapshots += 1
+        if not get_registry().set_enrichment(self.owner, ENRICHMENT_RUNNING, self.version, enriched_path=path):
+            raise EnrichmentCancelled(f"La colección {self.owner} cambió de versión; se detiene el enriquecimiento")
+        logger.info(f"Versión parcial del enriquecimiento de {self.owner}: {done} de {self.total} discos")
+
+    def run(self):
+        from app.services.discogs_service import enrich_collection_from_file
+
+        registry = get_registry()
+        output_path = registry.enriched_path(self.owner)
+        try:
+            enriched_df = enrich_collection_from_file(
+                input_csv_path=self.input_path,
+                output_csv_path=output_path,
+                token=self.token,
+                prioritize=True,
+                on_snapshot=self._on_snapshot,
+                snapshot_seconds=self.snapshot_seconds,
+                job=f"enrich:{self.owner}",
+                profile=self.profile,
+            )
+            # Solo se registra como activa una versión enriquecida que realmente se guardó
+            if enriched_df is not None and len(enriched_df) > 0 and os.path.exists(output_path):
+                self.done = len(enriched_df)
+                self.status = ENRICHMENT_COMPLETE
+                registry.set_enrichment(self.owner, ENRICHMENT_COMPLETE, self.version, enriched_path=output_path)
+                logger.info(f"Enriquecimiento completado para {self.owner}: {len(enriched_df)} registros")
+            else:
+                self.status = ENRICHMENT_FAILED
+                registry.set_enrichment(self.owner, ENRICHMENT_FAILED, self.version)
+                logger.error(f"Fallo en el proceso de enriquecimiento de {self.owner}")
+        except Exception as e:
+            self.status = ENRICHMENT_FAILED
+            registry.set_enrichment(self.owner, ENRICHMENT_FAILED, self.version)
+            logger.error(f"Error en el enriquecimiento de {self.owner}: {e}", exc_info=True)
+        finally:
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        return {'status': self.status, 'profile': self.profile, 'done': self.done, 'total': self.total, 'snapshots': self.snapshots,
+                'started_at': self.started_at, 'finished_at': self.finished_at}
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_enrichment(owner, token=None, profile=ENRICH_DEFAULT_PROFILE):
+    """
+    Inicia el enriquecimiento en segundo plano de la colección de un propietario
+    (si ya hay uno en curso para la misma versión, lo devuelve)
+
+    Args:
+        owner: Clave de propietario
+        token: Token opcional para la API de Discogs
+        profile: Perfil de enriquecimiento ('full', 'year_only' o 'ratings')
+
+    Returns:
+        EnrichmentJob: Trabajo en curso o None si el propietario no tiene colección
+    """
+    registry = get_registry()
+    record = registry.get(owner)
+    if record is None:
+        return None
+    with _jobs_lock:
+        job = _jobs.get(owner)
+        if job and job.is_alive() and job.version == record['version']:
+            return job
+        registry.set_enrichment(owner, ENRICHMENT_RUNNING, record['version'])
+        job = EnrichmentJob(owner, record, token=token, profile=profile)
+        _jobs[owner] = job
+        job.start()
+    logger.info(f"Enriquecimiento en segundo plano iniciado para {owner} v{record['version']} (perfil {profile})")
+    return job
+
+
+def enrichment_job(owner):
+    """Último trabajo de enriquecimiento de un propietario en este proceso (o None)"""
+    with _jobs_lock:
+        return _jobs.get(owner)
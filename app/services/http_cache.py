@@ -0,0 +1,274 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit
+from app.config import HTTP_CACHE_MAX_BYTES
+from app.utils.cache_backends import get_cache
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Cabeceras que se guardan junto al cuerpo de la respuesta
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Content-Type')
+
+# Segmentos numéricos o de usuario que se normalizan para acotar la cardinalidad de las métricas
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_USER_SEGMENT = re.compile(r'^/users/[^/]+')
+
+
+def endpoint_label(url):
+    """
+    Convierte una URL de la API en una plantilla de endpoint para las métricas
+    
+    Ejemplo: https://api.discogs.com/releases/123 -> /releases/{id}
+    """
+    path = urlsplit(url).path
+    path = _USER_SEGMENT.sub('/users/{username}', path)
+    return _ID_SEGMENT.sub('/{id}', path) or '/'
+
+
+def record_discogs_call(url, response):
+    """
+    Registra una petición a Discogs en las métricas según su origen
+
+    Args:
+        url: URL solicitada
+        response: Respuesta (requests.Response o CachedResponse)
+    """
+    if getattr(response, 'revalidated', False):
+        source = 'revalidated'
+    elif getattr(response, 'from_cache', False):
+        source = 'cache'
+    else:
+        source = 'network'
+    REGISTRY.inc('discogs_requests_total', endpoint=endpoint_label(url),
+                 status=str(response.status_code), source=source)
+
+
+def _parse_cache_control(value):
+    """
+    Interpreta una cabecera Cache-Control
+
+    Args:
+        value: Valor de la cabecera (puede ser None)
+
+    Returns:
+        dict: Directivas en minúsculas (las que tienen valor lo conservan como str)
+    """
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if '=' in part:
+            name, _, arg = part.partition('=')
+            directives[name.strip()] = arg.strip().strip('"')
+        else:
+            directives[part] = True
+    return directives
+
+
+class CachedResponse:
+    """Respuesta mínima compatible con el uso que hacemos de requests.Response"""
+
+    def __init__(self, status_code, content, headers=None, from_cache=False, revalidated=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPResponseCache:
+    """
+    Caché de respuestas HTTP con validadores (ETag / Last-Modified).
+
+    Las entradas (metadatos y cuerpo) se guardan en la caché 'discogs_responses' de
+    get_cache: por defecto en SQLite, compartida por los workers y limitada a max_bytes
+    con desalojo LRU; CACHE_BACKENDS puede moverla a memoria o a un almacén externo.
+    """
+
+    def __init__(self, backend=None, max_bytes=HTTP_CACHE_MAX_BYTES):
+        if backend is None:
+            backend = get_cache('discogs_responses', default_backend='sqlite', max_bytes=max_bytes)
+        self.backend = backend
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0}
+
+    @staticmethod
+    def make_key(url, params=None, auth=None):
+        """
+        Genera la clave de caché para una petición GET
+
+        Args:
+            url: URL de la petición
+            params: Parámetros de query adicionales (sin credenciales)
+            auth: Credencial asociada (se incluye hasheada para no mezclar usuarios)
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        digest = hashlib.sha256()
+        digest.update(url.encode('utf-8'))
+        for name, value in sorted((params or {}).items()):
+            digest.update(f"&{name}={value}".encode('utf-8'))
+        if auth:
+            digest.update(b'|' + hashlib.sha256(auth.encode('utf-8')).digest())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Devuelve la entrada guardada (metadatos y cuerpo) o None si no existe
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        # El backend en memoria guarda el valor sin copiar: no modificarlo
+        return dict(entry, headers=dict(entry['headers']))
+
+    def touch(self, key, headers=None):
+        """
+        Marca una entrada como usada recientemente y renueva su frescura tras un 304
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        entry['stored_at'] = time.time()
+        for name in STORED_HEADERS:
+            if headers and headers.get(name):
+                entry['headers'][name] = headers[name]
+        self.backend.set(key, entry)
+        return entry
+
+    def set(self, key, url, status_code, headers, body):
+        """
+        Guarda una respuesta si sus directivas de caché lo permiten
+
+        Returns:
+            bool: True si se guardó
+        """
+        directives = _parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return False
+        entry = {
+            'url': url,
+            'status_code': status_code,
+            'stored_at': time.time(),
+            'headers': {name: headers[name] for name in STORED_HEADERS if headers.get(name)},
+            'body': body,
+        }
+        self.backend.set(key, entry)
+        self.stats['stores'] += 1
+        return True
+
+    def is_fresh(self, entry):
+        """
+        Indica si una entrada puede usarse sin revalidar según Cache-Control max-age
+        """
+        directives = _parse_cache_control(entry['headers'].get('Cache-Control'))
+        if 'no-cache' in directives:
+            return False
+        max_age = directives.get('s-maxage', directives.get('max-age'))
+        if max_age is None or not re.match(r'^\d+$', str(max_age)):
+            return False
+        return time.time() - entry['stored_at'] < int(max_age)
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        Construye las cabeceras If-None-Match / If-Modified-Since para una entrada
+        """
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def hit_ratio(self):
+        """Proporción de peticiones resueltas desde caché (incluye revalidaciones 304)"""
+        served = self.stats['hits'] + self.stats['revalidated']
+        total = served + self.stats['misses']
+        return served / total if total else 0.0
+
+
+class CachedHTTPClient:
+    """
+    Cliente HTTP para GETs que consulta la caché y envía peticiones condicionales
+    """
+
+    def __init__(self, cache=None, session=None):
+        self.cache = cache if cache is not None else HTTPResponseCache()
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+
+    def get(self, url, headers=None, params=None, auth=None, send=None):
+        """
+        Realiza un GET usando la caché
+
+        Args:
+            url: URL de la petición
+            headers: Cabeceras de la petición
+            params: Parámetros de query (pueden incluir el token)
+            auth: Credencial usada para separar entradas entre usuarios
+            send: Función opcional send(headers) que realiza la petición real
+
+        Returns:
+            CachedResponse: Respuesta (desde caché, revalidada o nueva)
+        """
+        headers = dict(headers or {})
+        key_params = {k: v for k, v in (params or {}).items() if k != 'token'}
+        key = self.cache.make_key(url, key_params, auth)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                self.cache.stats['hits'] += 1
+                return CachedResponse(entry['status_code'], entry['body'], entry['headers'], from_cache=True)
+            headers.update(self.cache.conditional_headers(entry))
+
+        if send is not None:
+            response = send(headers)
+        else:
+            response = self.session.get(url, headers=headers, params=params)
+
+        if response.status_code == 304 and entry is not None:
+            # Validadores vigentes: el cuerpo guardado sigue siendo correcto
+            self.cache.stats['revalidated'] += 1
+            self.cache.touch(key, response.headers)
+            return CachedResponse(entry['status_code'], entry['body'], entry['headers'],
+                                  from_cache=True, revalidated=True)
+
+        self.cache.stats['misses'] += 1
+        if response.status_code == 200:
+            self.cache.set(key, url, response.status_code, response.headers, response.content)
+        return CachedResponse(response.status_code, response.content, response.headers)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """Devuelve la caché HTTP compartida del proceso"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = HTTPResponseCache()
+            REGISTRY.register_cache(
+                'discogs_http', lambda: dict(_shared_cache.stats, hit_ratio=_shared_cache.hit_ratio())
+            )
+        return _shared_cache
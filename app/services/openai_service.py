@@ -1,9 +1,28 @@
 import logging
-import openai
-from app.config import OPENAI_MODEL, OPENAI_API_KEY
+from app.config import OPENAI_MODEL, OPENAI_API_KEY, LOG_PROMPTS, RECOMMENDATION_CACHE_TTL_SECONDS
+from app.utils.cache_backends import get_cache
+from app.utils.metrics import timed, timer
+from app.utils.single_flight import flight_key, get_single_flight
 
 logger = logging.getLogger(__name__)
 
+# Prefijo de las respuestas de error (no se guardan en la caché)
+ERROR_PREFIX = "Error obteniendo recomendación"
+
+def get_openai():
+    """
+    Importa y configura el módulo de OpenAI en el primer uso
+    (cargarlo al arrancar la app cuesta cientos de milisegundos)
+    
+    Returns:
+        module: Módulo openai con la API key configurada
+    """
+    import openai
+    if not openai.api_key and OPENAI_API_KEY:
+        openai.api_key = OPENAI_API_KEY
+    return openai
+
+@timed('generate_recommendation')
 def generate_recommendation(vinyl_summary, mood, interests, api_key=None):
     """
     Genera recomendaciones de vinilos usando OpenAI
@@ -17,6 +36,26 @@ def generate_recommendation(vinyl_summary, mood, interests, api_key=None):
     Returns:
         str: Recomendación formateada en markdown
     """
+    # Las peticiones idénticas simultáneas (misma colección, mood, intereses y clave) comparten
+    # una sola llamada a OpenAI; con RECOMMENDATION_CACHE_TTL_SECONDS > 0 además reutilizan la
+    # respuesta guardada. La clave solo se usa dentro del hash de la operación
+    cache = get_cache('recommendations') if RECOMMENDATION_CACHE_TTL_SECONDS > 0 else None
+    key = flight_key('recommendation', OPENAI_MODEL, vinyl_summary, mood, interests, api_key)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info("Recomendación servida desde la caché")
+            return cached
+
+    recommendation = get_single_flight().do('recommendation', (vinyl_summary, mood, interests, api_key),
+                                            lambda: _generate_recommendation(vinyl_summary, mood, interests, api_key))
+    if cache is not None and recommendation and not recommendation.startswith(ERROR_PREFIX):
+        cache.set(key, recommendation, ttl=RECOMMENDATION_CACHE_TTL_SECONDS)
+    return recommendation
+
+def _generate_recommendation(vinyl_summary, mood, interests, api_key=None):
+    """Genera la recomendación sin coalescencia (ver generate_recommendation)"""
+    openai = get_openai()
     try:
         logger.info(f"Generando recomendación para mood: '{mood}', intereses: '{interests}'")
         
@@ -27,9 +66,6 @@ def generate_recommendation(vinyl_summary, mood, interests, api_key=None):
             # Guardar la API key anterior para restaurarla después
             previous_key = openai.api_key
             openai.api_key = api_key
-        elif not openai.api_key:
-            # Si no se ha configurado, usar la del archivo de configuración
-            openai.api_key = OPENAI_API_KEY
         
         # Crear prompt para OpenAI con información enriquecida
         prompt = f"""
@@ -75,17 +111,20 @@ def generate_recommendation(vinyl_summary, mood, interests, api_key=None):
         Asegúrate de que cada recomendación esté bien estructurada y justificada con información específica de la colección.
         """
         
-        logger.debug(f"Prompt enviado a OpenAI (primeros 500 caracteres): {prompt[:500]}...")
+        # El cuerpo del prompt solo se registra si se habilita explícitamente
+        if LOG_PROMPTS:
+            logger.debug(f"Prompt enviado a OpenAI: {prompt}")
         logger.debug(f"Longitud total del prompt: {len(prompt)} caracteres")
         
         # Usar el cliente de OpenAI
-        response = openai.ChatCompletion.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "Eres un experto en música con amplio conocimiento de géneros, artistas, sellos discográficos y épocas musicales. Tus recomendaciones están bien fundamentadas y formateadas con markdown. IMPORTANTE: Siempre usas el año ORIGINAL de lanzamiento de los discos, no el año de la edición particular."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with timer('chat_completion', metric='openai_request_duration_seconds', model=OPENAI_MODEL):
+            response = openai.ChatCompletion.create(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": "Eres un experto en música con amplio conocimiento de géneros, artistas, sellos discográficos y épocas musicales. Tus recomendaciones están bien fundamentadas y formateadas con markdown. IMPORTANTE: Siempre usas el año ORIGINAL de lanzamiento de los discos, no el año de la edición particular."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         
         recommendation = response.choices[0].message.content
         logger.info("Recomendación generada exitosamente")
@@ -101,4 +140,4 @@ def generate_recommendation(vinyl_summary, mood, interests, api_key=None):
             openai.api_key = previous_key
             
         logger.error(f"Error obteniendo recomendación: {e}", exc_info=True)
-        return f"Error obteniendo recomendación: {str(e)}"
+        return f"{ERROR_PREFIX}: {str(e)}"
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from app.config import (RATE_LIMIT_DIR, DISCOGS_RATE_LIMIT_PER_MINUTE, DISCOGS_RATE_LIMIT_BURST,
+                        DISCOGS_RATE_LIMIT_WINDOW, REFRESH_IDLE_SECONDS)
+from app.utils.metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows: el límite solo se coordina dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Intervalo máximo entre comprobaciones mientras se espera turno
+POLL_SECONDS = 0.02
+
+# Un trabajo que no consulta el limitador en este tiempo deja de contar como en espera
+WAITER_TTL_SECONDS = 5.0
+
+# Los registros de último servicio más antiguos se olvidan (equivale a no haber sido servido)
+SERVED_TTL_SECONDS = 600.0
+
+# Intervalo entre comprobaciones de los trabajos de baja prioridad (no necesitan reaccionar rápido)
+BACKGROUND_POLL_SECONDS = 0.25
+
+
+class TokenBucket:
+    """
+    Cubo de fichas compartido por todos los procesos que usan un mismo token de Discogs.
+
+    El estado (fichas, última recarga, bloqueo tras un 429 y trabajos en espera) vive
+    en un archivo JSON pequeño protegido con flock, así que lo respetan todos los
+    workers de gunicorn y todos los DiscogsConnector. La recarga es
+    (limit - burst) / window fichas por segundo: en cualquier ventana de window
+    segundos se hacen como mucho limit peticiones, que es como cuenta Discogs.
+
+    Reparto entre trabajos: cuando hay una ficha, la toma el trabajo en espera que
+    hace más tiempo que no fue servido (turnos rotativos), de modo que una colección
+    enorme no deja sin cuota a las pequeñas que se enriquecen al mismo tiempo.
+
+    Los trabajos de baja prioridad (background) no entran en los turnos: solo toman una
+    ficha cuando nadie espera, ningún otro trabajo fue servido en los últimos
+    idle_seconds y el cubo tiene al menos la mitad de la ráfaga, que queda para el
+    próximo trabajo normal.
+    """
+
+    def __init__(self, path, limit=DISCOGS_RATE_LIMIT_PER_MINUTE, burst=DISCOGS_RATE_LIMIT_BURST,
+                 window=DISCOGS_RATE_LIMIT_WINDOW, idle_seconds=REFRESH_IDLE_SECONDS):
+        self.path = path
+        self.limit = limit
+        self.burst = max(1, min(burst, limit - 1)) if limit > 1 else 1
+        self.window = window
+        self.rate = max(limit - self.burst, 1) / window
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        """Estado compartido bloqueado (entre hilos y entre procesos) mientras dura el bloque"""
+        with self._lock:
+            with open(self.path, 'a+') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    state.setdefault('tokens', float(self.burst))
+                    state.setdefault('updated', time.time())
+                    state.setdefault('blocked_until', 0.0)
+                    state.setdefault('waiting', {})
+                    state.setdefault('served', {})
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state['updated'])
+        state['tokens'] = min(float(self.burst), state['tokens'] + elapsed * self.rate)
+        state['updated'] = now
+        state['waiting'] = {job: seen for job, seen in state['waiting'].items() if now - seen < WAITER_TTL_SECONDS}
+        state['served'] = {job: at for job, at in state['served'].items() if now - at < SERVED_TTL_SECONDS}
+
+    def _idle(self, state, now):
+        """La cuota está ociosa: nadie espera ni fue servido hace poco y sobra media ráfaga"""
+        last_served = max(state['served'].values(), default=0.0)
+        return (not state['waiting'] and now - last_served >= self.idle_seconds
+                and state['blocked_until'] <= now and state['tokens'] >= max(1.0, self.burst / 2))
+
+    def acquire(self, job, background=False):
+        """
+        Espera hasta que haya cuota y sea el turno de este trabajo, y consume una ficha
+
+        Args:
+            job: Identificador del trabajo (p. ej. el propietario de la colección que se enriquece)
+            background: Baja prioridad: esperar a que la cuota esté ociosa (sin turno ni registro de servicio)
+
+        Returns:
+            float: Segundos esperados
+        """
+        if background:
+            return self._acquire_idle()
+        start = time.monotonic()
+        while True:
+            with self._state() as state:
+                now = time.time()
+                self._refill(state, now)
+                state['waiting'][job] = now
+                wait = state['blocked_until'] - now
+                if wait <= 0 and state['tokens'] >= 1:
+                    turn = min(state['waiting'], key=lambda name: (state['served'].get(name, 0.0), name))
+                    if turn == job:
+                        state['tokens'] -= 1
+                        state['served'][job] = now
+                        del state['waiting'][job]
+                        break
+                    wait = POLL_SECONDS
+                else:
+                    wait = max(wait, (1 - state['tokens']) / self.rate)
+            time.sleep(min(max(wait, 0.001), POLL_SECONDS * 10))
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            REGISTRY.inc('discogs_ratelimit_wait_seconds_total', waited)
+        return waited
+
+    def _acquire_idle(self):
+        # La espera de baja prioridad no se suma a discogs_ratelimit_wait_seconds_total (no retrasa a nadie)
+        start = time.monotonic()
+        while True:
+            with self._state() as state:
+                now = time.time()
+                self._refill(state, now)
+                if self._idle(state, now):
+                    state['tokens'] -= 1
+                    break
+            time.sleep(BACKGROUND_POLL_SECONDS)
+        return time.monotonic() - start
+
+    def observe(self, status_code, headers):
+        """
+        Ajusta el cubo con la respuesta de Discogs: tras un 429 se detienen todas las
+        peticiones un momento, y si el servidor informa que no queda cuota (otro cliente
+        usa el mismo token) se vacía el cubo
+
+        Args:
+            status_code: Código de la respuesta
+            headers: Cabeceras de la respuesta
+        """
+        remaining = (headers or {}).get('X-Discogs-Ratelimit-Remaining')
+        if status_code != 429 and remaining not in (None, '0'):
+            return
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state['tokens'] = 0.0
+            if status_code == 429:
+                pause = self.window / 6
+                REGISTRY.inc('discogs_ratelimit_throttled_total')
+                logger.warning(f"Discogs respondió 429: se pausan las peticiones con este token {pause:.1f}s")
+            else:
+                pause = 1 / self.rate
+            state['blocked_until'] = max(state['blocked_until'], now + pause)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(token):
+    """
+    Devuelve el cubo de fichas compartido de un token de Discogs
+
+    Args:
+        token: Token de la API (se guarda solo su hash)
+
+    Returns:
+        TokenBucket: Limitador del token
+    """
+    key = hashlib.sha256((token or 'anonymous').encode('utf-8')).hexdigest()[:16]
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(os.path.join(RATE_LIMIT_DIR, f'{key}.json'))
+            _buckets[key] = bucket
+        return bucket
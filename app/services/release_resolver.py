@@ -0,0 +1,341 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from urllib.parse import urlencode
+from app.config import (DISCOGS_API_URL, RESOLVER_CACHE_PATH, RESOLVER_WORKERS, RESOLVER_CANDIDATES,
+                        RESOLVER_MIN_CONFIDENCE, RESOLVER_NEGATIVE_TTL_SECONDS)
+from app.utils.metrics import REGISTRY
+from app.utils.release_catalog import as_release_id, parse_year
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    query TEXT PRIMARY KEY,
+    release_id INTEGER,
+    master_id INTEGER,
+    confidence REAL NOT NULL,
+    title TEXT,
+    resolved_at REAL NOT NULL
+);
+"""
+
+# Peso de cada campo en la confianza (se reparte entre los campos que tiene la fila)
+WEIGHTS = {'title': 0.45, 'artist': 0.35, 'label': 0.1, 'year': 0.1}
+
+# Sufijo con que Discogs distingue artistas homónimos: "Nirvana (2)"
+_DISAMBIGUATION = re.compile(r'\s*\(\d+\)$')
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+# Consultas por sentencia al leer la caché
+_SQL_BATCH = 500
+
+# Resultados de búsqueda que se acumulan antes de guardarlos en la caché
+_PUT_BATCH = 20
+
+
+def _text(value):
+    """Valor de una celda como texto ('' si falta: None, NaN o pd.NA)"""
+    try:
+        if value is None or value != value:
+            return ''
+    except TypeError:
+        return ''
+    return str(value).strip()
+
+
+def normalize(text):
+    """Texto comparable: sin acentos, mayúsculas, puntuación, sufijo de desambiguación ni 'the' inicial"""
+    text = _DISAMBIGUATION.sub('', _text(text))
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    text = ' '.join(_NON_WORD.sub(' ', text.lower()).split())
+    return text[4:] if text.startswith('the ') else text
+
+
+def _similarity(a, b):
+    """Similitud entre 0 y 1 de dos textos normalizados (sin importar el orden de las palabras)"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return max(SequenceMatcher(None, a, b).ratio(),
+               SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split()))).ratio())
+
+
+class ReleaseQuery:
+    """Datos de una fila del CSV con los que se busca su lanzamiento"""
+
+    __slots__ = ('artist', 'title', 'label', 'year', 'key', '_search')
+
+    def __init__(self, artist, title, label=None, year=None):
+        # La exportación de Discogs separa varios sellos con comas: se busca por el primero
+        label = _text(label).split(',')[0].strip()
+        self.artist = normalize(artist)
+        self.title = normalize(title)
+        self.label = normalize(label)
+        self.year = parse_year(_text(year))
+        self.key = f"{self.artist}|{self.title}|{self.label}|{self.year or ''}"
+        # La búsqueda usa el texto original (sin desambiguación); la clave y la comparación, el normalizado
+        self._search = (_DISAMBIGUATION.sub('', _text(artist)), _text(title), label)
+
+    def params(self, strict=True):
+        """
+        Parámetros de /database/search: la búsqueda estricta usa el texto de la fila con sello
+        y año; la relajada, solo artista y título normalizados (sin artículo ni puntuación)
+        """
+        if not strict:
+            return {'type': 'release', 'artist': self.artist, 'release_title': self.title,
+                    'per_page': RESOLVER_CANDIDATES}
+        artist, title, label = self._search
+        params = {'type': 'release', 'artist': artist, 'release_title': title, 'per_page': RESOLVER_CANDIDATES}
+        if label:
+            params['label'] = label
+        if self.year:
+            params['year'] = self.year
+        return params
+
+    def score(self, candidate):
+        """
+        Confianza (0-1) de que un resultado de la búsqueda sea el lanzamiento de la fila
+
+        Args:
+            candidate: Resultado de /database/search ('title' es "Artista - Título")
+
+        Returns:
+            float: Promedio ponderado de las similitudes de los campos que tiene la fila
+        """
+        artist, _, title = (candidate.get('title') or '').partition(' - ')
+        scores = {'title': _similarity(self.title, normalize(title)),
+                  'artist': _similarity(self.artist, normalize(artist))}
+        if self.label:
+            labels = {normalize(label) for label in candidate.get('label') or []}
+            scores['label'] = 1.0 if self.label in labels else 0.0
+        if self.year:
+            difference = abs(parse_year(str(candidate.get('year') or '')) - self.year)
+            scores['year'] = 1.0 if difference == 0 else 0.5 if difference == 1 else 0.0
+        return sum(WEIGHTS[field] * value for field, value in scores.items()) / sum(WEIGHTS[field] for field in scores)
+
+
+class ResolverCache:
+    """
+    Resultados de búsqueda por consulta normalizada en SQLite: el mejor candidato y su
+    confianza. Se guardan también las coincidencias dudosas, así cambiar
+    RESOLVER_MIN_CONFIDENCE no obliga a repetir búsquedas; las consultas sin ningún
+    resultado caducan tras RESOLVER_NEGATIVE_TTL_SECONDS.
+    """
+
+    def __init__(self, db_path=RESOLVER_CACHE_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.stats = {'hits': 0, 'misses': 0}
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, keys):
+        """
+        Resultados guardados de varias consultas
+
+        Returns:
+            dict: Clave de consulta -> fila (las búsquedas sin resultados vencidas no se devuelven)
+        """
+        keys = list(keys)
+        found = {}
+        expired = time.time() - RESOLVER_NEGATIVE_TTL_SECONDS
+        conn = self._connect()
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            rows = conn.execute(f"SELECT * FROM matches WHERE query IN ({','.join('?' * len(batch))})", batch)
+            for row in rows:
+                if row['release_id'] is not None or row['resolved_at'] > expired:
+                    found[row['query']] = dict(row)
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(keys) - len(found)
+        return found
+
+    def put_many(self, matches):
+        """Guarda resultados de búsqueda (dicts con las columnas de la tabla)"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO matches (query, release_id, master_id, confidence, title, resolved_at) '
+                'VALUES (:query, :release_id, :master_id, :confidence, :title, :resolved_at)',
+                matches
+            )
+
+    def entries(self):
+        """
+        Resultados guardados para el límite de disco, con su tamaño aproximado en bytes
+
+        Returns:
+            list: Tuplas (momento de la búsqueda, bytes, consulta)
+        """
+        rows = self._connect().execute(
+            'SELECT resolved_at, length(query) + coalesce(length(title), 0) + 48, query FROM matches')
+        return [tuple(row) for row in rows]
+
+    def delete_many(self, entries):
+        """
+        Borra resultados que no se volvieron a buscar desde que se midieron y compacta la base
+
+        Args:
+            entries: Pares (consulta, momento de la búsqueda)
+
+        Returns:
+            int: Resultados borrados
+        """
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany('DELETE FROM matches WHERE query = ? AND resolved_at = ?', entries)
+            deleted = conn.total_changes - before
+        if deleted:
+            # Sin VACUUM el archivo no se achica (las páginas libres solo se reutilizan) y, con WAL,
+            # la copia compactada queda en el -wal hasta el checkpoint
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return deleted
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_resolver_cache():
+    """Devuelve la caché de resoluciones del proceso"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResolverCache()
+            REGISTRY.register_cache('release_resolver', lambda: dict(_cache.stats))
+        return _cache
+
+
+def _search(connector, query):
+    """Mejor candidato de la búsqueda de Discogs para una consulta (sin resultados, repite la búsqueda relajada)"""
+    headers = {
+        "Authorization": f"Discogs token={connector.token}",
+        "User-Agent": "VinylRecommender/1.0"
+    }
+    results = []
+    for strict in (True, False):
+        url = f"{DISCOGS_API_URL}/database/search?{urlencode(query.params(strict))}"
+        response = connector._http_get(url, headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"La búsqueda respondió {response.status_code}")
+        results = [result for result in response.json().get('results', []) if result.get('type', 'release') == 'release']
+        if results:
+            break
+    match = {'query': query.key, 'release_id': None, 'master_id': None, 'confidence': 0.0, 'title': None,
+             'resolved_at': time.time()}
+    if results:
+        best = max(results, key=query.score)
+        match.update(release_id=as_release_id(best.get('id')), master_id=as_release_id(best.get('master_id')),
+                     confidence=round(query.score(best), 4), title=best.get('title'))
+    return match
+
+
+def resolve_release_ids(df, connector, rows=None, workers=RESOLVER_WORKERS, min_confidence=RESOLVER_MIN_CONFIDENCE):
+    """
+    Completa los release_id que faltan buscando (Artista, Título, Sello, Año) en la base de Discogs.
+
+    Las filas con los mismos datos comparten una sola búsqueda, los resultados se guardan en
+    una caché persistente a medida que llegan y las búsquedas pendientes se hacen en paralelo
+    (el limitador compartido del conector mantiene el ritmo). Las coincidencias con confianza
+    menor que min_confidence no se usan. Modifica df: agrega release_id si no existe y la
+    columna match_confidence con la confianza de cada fila resuelta.
+
+    Args:
+        df: DataFrame de la colección (con Artist y Title)
+        connector: DiscogsConnector con token
+        rows: Etiquetas de las filas a resolver (por defecto, todas)
+        workers: Búsquedas simultáneas
+        min_confidence: Confianza mínima para aceptar una coincidencia
+
+    Returns:
+        dict: Filas sin ID, búsquedas distintas, búsquedas hechas en la API y filas resueltas
+    """
+    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if 'release_id' not in df.columns:
+        df['release_id'] = pd.NA
+    if 'match_confidence' not in df.columns:
+        df['match_confidence'] = float('nan')
+    if str(df['release_id'].dtype) != 'Int64':
+        # release_id como entero con faltantes (sin convertir los IDs a float); los no válidos quedan vacíos
+        df['release_id'] = pd.array([as_release_id(value) for value in df['release_id']], dtype='Int64')
+    if rows is None:
+        missing = df.index[df['release_id'].isna()].tolist()
+    else:
+        missing = [idx for idx in rows if pd.isna(df.at[idx, 'release_id'])]
+    stats = {'rows': len(missing), 'queries': 0, 'searched': 0, 'resolved': 0}
+    if not missing or 'Artist' not in df.columns or 'Title' not in df.columns:
+        return stats
+
+    def column(idx, name):
+        return df.at[idx, name] if name in df.columns else None
+
+    row_queries = {}
+    queries = {}
+    for idx in missing:
+        query = ReleaseQuery(column(idx, 'Artist'), column(idx, 'Title'), column(idx, 'Label'), column(idx, 'Released'))
+        if query.artist or query.title:
+            row_queries[idx] = query.key
+            queries.setdefault(query.key, query)
+    stats['queries'] = len(queries)
+
+    cache = get_resolver_cache()
+    matches = cache.get_many(queries)
+    pending = [query for key, query in queries.items() if key not in matches]
+    stats['searched'] = len(pending)
+    if pending:
+        logger.info(f"Resolviendo {len(pending)} búsquedas en Discogs ({len(queries) - len(pending)} en caché) "
+                    f"para {len(missing)} filas sin release_id")
+        found = []
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='release-resolver') as pool:
+            futures = {pool.submit(_search, connector, query): query for query in pending}
+            try:
+                for future in as_completed(futures):
+                    try:
+                        match = future.result()
+                    except Exception as e:
+                        # Un error de red no se guarda: la búsqueda se repite la próxima vez
+                        logger.warning(f"Error buscando '{futures[future].artist} - {futures[future].title}': {e}")
+                        continue
+                    matches[match['query']] = match
+                    found.append(match)
+                    # Guardar por lotes: si el trabajo se interrumpe no se pierden las búsquedas hechas
+                    if len(found) >= _PUT_BATCH:
+                        cache.put_many(found)
+                        found = []
+            finally:
+                cache.put_many(found)
+        REGISTRY.inc('discogs_resolver_searches_total', len(pending))
+
+    for idx, key in row_queries.items():
+        match = matches.get(key)
+        if match and match['release_id'] and match['confidence'] >= min_confidence:
+            df.at[idx, 'release_id'] = match['release_id']
+            df.at[idx, 'match_confidence'] = match['confidence']
+            stats['resolved'] += 1
+    logger.info(f"release_id resuelto para {stats['resolved']} de {stats['rows']} filas "
+                f"({stats['searched']} búsquedas en la API)")
+    return stats
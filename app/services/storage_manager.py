@@ -0,0 +1,266 @@
+import os
+import time
+import logging
+import threading
+from app.config import (DATA_DIR, COVER_CACHE_DIR, SINGLE_FLIGHT_DIR, RESOLVER_CACHE_PATH,
+                        STORAGE_MAX_BYTES, STORAGE_CHECK_INTERVAL_SECONDS, STORAGE_MIN_IDLE_SECONDS,
+                        STORAGE_LOCK_PATH)
+from app.models.collection_registry import get_registry, ENRICHMENT_RUNNING
+from app.utils.background import LeaderThread
+from app.utils.metrics import REGISTRY
+from app.utils.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+# Fracción del límite a la que se baja al desalojar (evita desalojar en cada revisión)
+EVICT_TARGET = 0.9
+
+# Tipos de archivo que se pueden desalojar
+KIND_COLLECTION = 'collection'
+KIND_LEGACY = 'legacy_csv'
+KIND_COVER = 'cover'
+KIND_SINGLE_FLIGHT = 'single_flight'
+KIND_RESOLVER = 'resolver'
+
+
+def disk_usage(root=DATA_DIR):
+    """
+    Uso de disco de DATA_DIR por subdirectorio
+
+    Args:
+        root: Directorio a medir
+
+    Returns:
+        dict: Subdirectorio ('.' para los archivos de la raíz) -> bytes
+    """
+    usage = {}
+    for directory, _, files in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        top = relative.split(os.sep, 1)[0]
+        for name in files:
+            try:
+                usage[top] = usage.get(top, 0) + os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                continue  # borrado mientras se recorría
+    return usage
+
+
+def _directory_size(path):
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+                elif entry.is_dir():
+                    total += _directory_size(entry.path)
+    except OSError:
+        pass
+    return total
+
+
+def delete_owner(owner):
+    """
+    Borra la colección de un propietario con todo lo derivado de ella: los CSV del registro
+    y sus versiones del almacén compartido, que incluyen los índices de búsqueda y facetas
+
+    Args:
+        owner: Propietario de la colección
+
+    Returns:
+        bool: True si existía
+    """
+    registry = get_registry()
+    record = registry.get(owner)
+    if record is None or not registry.delete(owner):
+        return False
+    store = get_shared_store()
+    for path in (record['path'], record['enriched_path']):
+        if path:
+            store.remove_source(path)
+    return True
+
+
+def _collection_artifacts(registry, now, min_idle):
+    """Colecciones registradas sin usar hace más de min_idle y sin enriquecimiento en curso"""
+    store = get_shared_store()
+    artifacts = []
+    for record in registry.records_by_access():
+        last_access = record['accessed_at'] or record['updated_at']
+        if now - last_access < min_idle:
+            break  # ordenadas por último acceso: las siguientes son más recientes
+        if record['enrichment_status'] == ENRICHMENT_RUNNING:
+            continue
+        size = _directory_size(os.path.dirname(record['path']))
+        for path in (record['path'], record['enriched_path']):
+            if path:
+                size += _directory_size(store.collection_dir(path))
+        artifacts.append((last_access, size, KIND_COLLECTION, record['owner']))
+    return artifacts
+
+
+def _resolver_artifacts():
+    """Resultados de la caché de resoluciones: se vuelven a buscar si hacen falta"""
+    if not os.path.exists(RESOLVER_CACHE_PATH):
+        return []
+    from app.services.release_resolver import get_resolver_cache
+
+    return [(resolved_at, size, KIND_RESOLVER, query) for resolved_at, size, query in get_resolver_cache().entries()]
+
+
+def _file_artifacts(directory, kind, recursive=False, suffix=None, skip=()):
+    """Archivos de una caché de disco: la fecha de modificación es su último uso"""
+    artifacts = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name in skip or '.tmp-' in entry.name:
+                    continue
+                if recursive and entry.is_dir():
+                    artifacts.extend(_file_artifacts(entry.path, kind, suffix=suffix))
+                elif entry.is_file() and (suffix is None or entry.name.endswith(suffix)):
+                    stat = entry.stat()
+                    artifacts.append((stat.st_mtime, stat.st_size, kind, entry.path))
+    except OSError:
+        pass
+    return artifacts
+
+
+def evictable_artifacts(now=None, min_idle=STORAGE_MIN_IDLE_SECONDS):
+    """
+    Todo lo que se puede borrar para liberar espacio, lo usado hace más tiempo primero:
+    colecciones inactivas (con sus versiones del almacén compartido), CSV sueltos en la raíz
+    de DATA_DIR (anteriores al registro), portadas, resultados de single-flight y de la
+    caché de resoluciones (las cachés de get_cache, como la de respuestas HTTP, tienen su límite)
+
+    Args:
+        now: Momento de referencia (por defecto, ahora)
+        min_idle: Las colecciones usadas hace menos segundos no se incluyen
+
+    Returns:
+        list: Tuplas (último acceso, bytes, tipo, clave) donde clave es el propietario o la ruta
+    """
+    now = time.time() if now is None else now
+    artifacts = _collection_artifacts(get_registry(), now, min_idle)
+    artifacts += [artifact for artifact in _file_artifacts(DATA_DIR, KIND_LEGACY, suffix='.csv')
+                  if now - artifact[0] >= min_idle]
+    artifacts += _file_artifacts(COVER_CACHE_DIR, KIND_COVER, recursive=True, skip=('urls',))
+    artifacts += _file_artifacts(SINGLE_FLIGHT_DIR, KIND_SINGLE_FLIGHT, suffix='.result')
+    artifacts += _resolver_artifacts()
+    artifacts.sort(key=lambda artifact: artifact[0])
+    return artifacts
+
+
+def _evict(kind, key, last_access):
+    """Borra un elemento; False si ya no existe o se volvió a usar desde que se midió"""
+    if kind == KIND_COLLECTION:
+        registry = get_registry()
+        record = registry.get(key)
+        if (record is None or (record['accessed_at'] or record['updated_at']) != last_access
+                or record['enrichment_status'] == ENRICHMENT_RUNNING):
+            return False
+        return delete_owner(key)
+    try:
+        if os.path.getmtime(key) != last_access:
+            return False
+        os.remove(key)
+        return True
+    except OSError:
+        return False
+
+
+def enforce_budget(max_bytes=STORAGE_MAX_BYTES, min_idle=STORAGE_MIN_IDLE_SECONDS):
+    """
+    Si DATA_DIR supera max_bytes, borra lo usado hace más tiempo hasta bajar a EVICT_TARGET del límite
+
+    Args:
+        max_bytes: Presupuesto de disco en bytes
+        min_idle: Antigüedad mínima (en segundos desde el último uso) de las colecciones que se borran
+
+    Returns:
+        dict: Uso antes y después, bytes liberados y elementos borrados por tipo
+    """
+    # Versiones del almacén compartido de CSV que ya no existen (o reemplazados y sin uso)
+    get_shared_store().cleanup()
+    usage = sum(disk_usage().values())
+    summary = {'usage_before': usage, 'usage_after': usage, 'freed': 0, 'evicted': {}}
+    if usage <= max_bytes:
+        return summary
+
+    def count(kind, evicted, size):
+        summary['evicted'][kind] = summary['evicted'].get(kind, 0) + evicted
+        REGISTRY.inc('storage_evictions_total', evicted, kind=kind)
+        REGISTRY.inc('storage_evicted_bytes_total', size, kind=kind)
+
+    target = int(max_bytes * EVICT_TARGET)
+    # Los resultados de la caché de resoluciones se borran juntos al final (una sola compactación)
+    resolver_victims, resolver_bytes = [], 0
+    for last_access, size, kind, key in evictable_artifacts(min_idle=min_idle):
+        if usage <= target:
+            break
+        if kind == KIND_RESOLVER:
+            resolver_victims.append((key, last_access))
+            resolver_bytes += size
+        elif _evict(kind, key, last_access):
+            count(kind, 1, size)
+        else:
+            continue
+        usage -= size
+    if resolver_victims:
+        from app.services.release_resolver import get_resolver_cache
+
+        count(KIND_RESOLVER, get_resolver_cache().delete_many(resolver_victims), resolver_bytes)
+
+    # Los tamaños de la lista son aproximados (filas de SQLite): medir de nuevo
+    usage = sum(disk_usage().values())
+    summary['freed'] = max(summary['usage_before'] - usage, 0)
+    summary['usage_after'] = usage
+
+    logger.info(f"Límite de disco: {summary['usage_before']} -> {usage} bytes "
+                f"(límite {max_bytes}); borrados: {summary['evicted']}")
+    if usage > max_bytes:
+        logger.warning(f"DATA_DIR sigue ocupando {usage} bytes (límite {max_bytes}): no queda nada inactivo "
+                       "que borrar; revisa los límites de las cachés o STORAGE_MIN_IDLE_SECONDS")
+    return summary
+
+
+class StorageManager(LeaderThread):
+    """
+    Mantiene DATA_DIR dentro de STORAGE_MAX_BYTES.
+
+    Cada STORAGE_CHECK_INTERVAL_SECONDS mide el uso de disco y, si supera el límite, borra
+    lo usado hace más tiempo: colecciones sin usar desde hace STORAGE_MIN_IDLE_SECONDS (se
+    vuelven a importar o subir si alguien las pide) y entradas de las cachés de disco. Lo
+    hace un único proceso: el que obtiene el flock de STORAGE_LOCK_PATH (si termina, lo toma otro).
+    """
+
+    description = 'el límite de disco de DATA_DIR'
+
+    def __init__(self, max_bytes=STORAGE_MAX_BYTES, interval=STORAGE_CHECK_INTERVAL_SECONDS,
+                 min_idle=STORAGE_MIN_IDLE_SECONDS, lock_path=STORAGE_LOCK_PATH):
+        super().__init__('storage-manager', interval, lock_path, initial_delay=0)
+        self.max_bytes = max_bytes
+        self.min_idle = min_idle
+
+    def tick(self):
+        enforce_budget(self.max_bytes, self.min_idle)
+        return False
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def start_storage_manager():
+    """
+    Inicia el hilo que aplica el límite de disco del proceso (si no está en marcha)
+
+    Returns:
+        StorageManager: Hilo en ejecución
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None or not _manager.is_alive():
+            _manager = StorageManager()
+            _manager.start()
+        return _manager
@@ -0,0 +1,60 @@
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin coordinación entre procesos, cada uno hace el trabajo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderThread(threading.Thread):
+    """
+    Hilo en segundo plano que hace un trabajo periódico en un único proceso: el que obtiene
+    el flock de lock_path (si termina, lo toma otro en su próxima vuelta).
+
+    Las subclases implementan tick(), que devuelve True si conviene repetir sin esperar
+    el intervalo, y definen description para los logs.
+    """
+
+    description = 'el trabajo en segundo plano'
+
+    def __init__(self, name, interval, lock_path, initial_delay=None):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.lock_path = lock_path
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self._stop_event = threading.Event()
+        self._lock_file = None
+
+    def _is_leader(self):
+        if self._lock_file is not None or fcntl is None:
+            return True
+        f = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        logger.info(f"Este proceso se encarga de {self.description}")
+        return True
+
+    def tick(self):
+        raise NotImplementedError
+
+    def run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            delay = self.interval
+            if not self._is_leader():
+                continue
+            try:
+                if self.tick():
+                    delay = 0
+            except Exception as e:
+                logger.error(f"Error en {self.description}: {e}", exc_info=True)
+
+    def stop(self):
+        self._stop_event.set()
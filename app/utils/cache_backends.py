@@ -0,0 +1,495 @@
+import os
+import re
+import math
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from app.config import (CACHE_BACKEND, CACHE_BACKENDS, CACHE_MEMORY_MAX_BYTES, CACHE_SQLITE_PATH,
+                        CACHE_SQLITE_MAX_BYTES, CACHE_EXTERNAL_URL)
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed_at);
+-- Tamaño total por caché, mantenido con triggers para no sumar la tabla en cada escritura
+CREATE TABLE IF NOT EXISTS totals (
+    namespace TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO totals (namespace, size) VALUES (new.namespace, new.size)
+        ON CONFLICT (namespace) DO UPDATE SET size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size + new.size - old.size WHERE namespace = new.namespace;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET size = size - old.size WHERE namespace = old.namespace;
+END;
+"""
+
+# Mayor carácter posible: las claves con un prefijo están en [prefijo, prefijo + _MAX_CHAR)
+_MAX_CHAR = chr(0x10FFFF)
+
+# Precisión del orden LRU en SQLite: una lectura solo escribe accessed_at si pasó este tiempo
+# desde la anterior (así las lecturas frecuentes no compiten por el candado de escritura)
+_TOUCH_SECONDS = 60.0
+
+# Fracción del límite a la que se baja al desalojar (evita desalojar en cada escritura)
+_EVICT_TARGET = 0.9
+
+
+def _glob_to_regex(pattern):
+    """Traduce un patrón MATCH de Redis (*, ?, [...] y \\ para escapar) a una expresión regular"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        end = pattern.find(']', i + 2) if char == '[' else -1
+        if char == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 1
+        elif char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        elif end != -1:
+            body = pattern[i + 1:end]
+            negate = body.startswith('^')
+            # Los rangos (a-z) conservan el guion sin escapar
+            body = re.escape(body[1:] if negate else body).replace('\\-', '-')
+            parts.append(('[^' if negate else '[') + body + ']')
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return ''.join(parts)
+
+
+def _expires_at(ttl):
+    """Momento de vencimiento de una entrada (None: no vence)"""
+    return time.time() + ttl if ttl else None
+
+
+class CacheBackend:
+    """
+    Interfaz común de las cachés de clave/valor.
+
+    Las claves son str y los valores cualquier objeto serializable con pickle. ttl es la
+    vigencia en segundos (None o 0: sin vencimiento). Cada backend lleva sus estadísticas
+    en stats (hits, misses, sets, evictions) y get_stats() las devuelve junto con el
+    tamaño actual para /metrics.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+        self._stats_lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Valor vigente de key, o default si no está o venció"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Guarda value en key durante ttl segundos"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Borra key (no falla si no existe)"""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix):
+        """
+        Borra todas las claves que empiezan con prefix
+
+        Returns:
+            int: Entradas borradas
+        """
+        raise NotImplementedError
+
+    def get_stats(self):
+        """Estadísticas para /metrics (al menos 'hits' y 'misses')"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _count(self, stat, value=1):
+        with self._stats_lock:
+            self.stats[stat] += value
+
+
+class MemoryLRUCache(CacheBackend):
+    """
+    Caché en memoria del proceso, limitada por tamaño: desaloja las entradas usadas hace más
+    tiempo cuando la suma de tamaños supera max_bytes. El tamaño de un valor es el de su
+    pickle (o el indicado en set). Los valores se guardan sin copiar: no deben modificarse.
+    """
+
+    def __init__(self, name, max_bytes=CACHE_MEMORY_MAX_BYTES):
+        super().__init__(name)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count('hits' if entry is not None else 'misses')
+        return entry[0] if entry is not None else default
+
+    def set(self, key, value, ttl=None, size=None):
+        """
+        Guarda value en key durante ttl segundos
+
+        Args:
+            key: Clave
+            value: Valor
+            ttl: Vigencia en segundos (None o 0: sin vencimiento)
+            size: Tamaño en bytes del valor (por defecto, el de su pickle)
+        """
+        if size is None:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        evicted = 0
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                # Nunca cabría: guardarlo solo desalojaría todo lo demás
+                return
+            self._entries[key] = (value, size, _expires_at(ttl))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+        self._count('sets')
+        if evicted:
+            self._count('evictions', evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def get_stats(self):
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        return dict(super().get_stats(), entries=entries, size_bytes=size)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Caché en una base SQLite compartida por todos los workers (una tabla para todas las
+    cachés, separadas por namespace). Cada caché se limita a max_bytes: al superarlo se
+    borran las entradas leídas hace más tiempo (con precisión de _TOUCH_SECONDS).
+    """
+
+    def __init__(self, name, db_path=CACHE_SQLITE_PATH, max_bytes=CACHE_SQLITE_MAX_BYTES):
+        super().__init__(name)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute('SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?',
+                           (self.name, key)).fetchone()
+        if row is not None and row[1] is not None and row[1] <= now:
+            with conn:
+                conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ? AND expires_at <= ?',
+                             (self.name, key, now))
+            row = None
+        if row is not None:
+            try:
+                value = pickle.loads(row[0])
+            except Exception as e:
+                logger.warning(f"Entrada ilegible en la caché {self.name} ({key}): {e}")
+                row = None
+        if row is None:
+            self._count('misses')
+            return default
+        if now - row[2] > _TOUCH_SECONDS:
+            with conn:
+                conn.execute('UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                             (now, self.name, key))
+        self._count('hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT INTO entries (namespace, key, value, size, expires_at, accessed_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, key) DO UPDATE SET '
+                         'value = excluded.value, size = excluded.size, expires_at = excluded.expires_at, '
+                         'accessed_at = excluded.accessed_at',
+                         (self.name, key, sqlite3.Binary(blob), len(blob), _expires_at(ttl), time.time()))
+        self._count('sets')
+        self._evict(conn)
+
+    def _evict(self, conn):
+        """Borra las entradas vencidas y, si la caché supera max_bytes, las leídas hace más tiempo"""
+        row = conn.execute('SELECT size FROM totals WHERE namespace = ?', (self.name,)).fetchone()
+        total = row[0] if row is not None else 0
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        with conn:
+            evicted += conn.execute('DELETE FROM entries WHERE namespace = ? AND expires_at <= ?',
+                                    (self.name, time.time())).rowcount
+            excess = total - int(self.max_bytes * _EVICT_TARGET)
+            rows = conn.execute('SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at',
+                                (self.name,))
+            victims = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                victims.append((self.name, key))
+                excess -= size
+            conn.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?', victims)
+            evicted += len(victims)
+        self._count('evictions', evicted)
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ?', (self.name, key))
+
+    def delete_prefix(self, prefix):
+        conn = self._connect()
+        with conn:
+            return conn.execute('DELETE FROM entries WHERE namespace = ? AND key >= ? AND key < ?',
+                                (self.name, prefix, prefix + _MAX_CHAR)).rowcount
+
+    def get_stats(self):
+        try:
+            conn = self._connect()
+            entries = conn.execute('SELECT COUNT(*) FROM entries WHERE namespace = ?', (self.name,)).fetchone()[0]
+            row = conn.execute('SELECT size FROM totals WHERE namespace = ?', (self.name,)).fetchone()
+            size = row[0] if row is not None else 0
+        except sqlite3.Error:
+            entries, size = 0, 0
+        return dict(super().get_stats(), entries=entries, size_bytes=size)
+
+
+class FakeExternalStore:
+    """
+    Almacén externo en memoria con la misma interfaz mínima que un cliente de Redis
+    (get, set con ex, delete, scan_iter). Sirve para desarrollo y pruebas sin un servidor:
+    se selecciona con CACHE_EXTERNAL_URL=memory://
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                del self._data[key]
+                entry = None
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (bytes(value), _expires_at(ex))
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def scan_iter(self, match=None):
+        # Patrón glob de Redis, como MATCH en SCAN
+        pattern = re.compile(_glob_to_regex(match)) if match else None
+        with self._lock:
+            keys = [key for key in self._data if pattern is None or pattern.fullmatch(key)]
+        return iter(keys)
+
+
+class ExternalCache(CacheBackend):
+    """
+    Adaptador a un almacén externo compartido (p. ej. Redis). El cliente solo necesita
+    get(key) -> bytes o None, set(key, bytes, ex=segundos), delete(*keys) y
+    scan_iter(match='prefijo*'). Las claves se guardan como "vinyl:<caché>:<clave>"; el
+    tamaño y el desalojo los gestiona el almacén.
+    """
+
+    def __init__(self, name, client):
+        super().__init__(name)
+        self.client = client
+        self._prefix = f'vinyl:{name}:'
+
+    def get(self, key, default=None):
+        try:
+            blob = self.client.get(self._prefix + key)
+            value = pickle.loads(blob) if blob is not None else None
+        except Exception as e:
+            # Un almacén caído se comporta como una caché vacía
+            logger.warning(f"Error leyendo la caché externa {self.name}: {e}")
+            blob = None
+        if blob is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            # El almacén cuenta la vigencia en segundos enteros
+            self.client.set(self._prefix + key, blob, ex=math.ceil(ttl) if ttl else None)
+        except Exception as e:
+            logger.warning(f"Error escribiendo la caché externa {self.name}: {e}")
+            return
+        self._count('sets')
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._prefix + key)
+        except Exception as e:
+            logger.warning(f"Error borrando de la caché externa {self.name}: {e}")
+
+    def delete_prefix(self, prefix):
+        pattern = self._prefix + prefix.replace('\\', '\\\\').replace('*', '\\*').replace('?', '\\?') + '*'
+        try:
+            keys = list(self.client.scan_iter(match=pattern))
+            return self.client.delete(*keys) if keys else 0
+        except Exception as e:
+            logger.warning(f"Error borrando de la caché externa {self.name}: {e}")
+            return 0
+
+
+def backend_names():
+    """
+    Backend de cada caché configurado en CACHE_BACKENDS ("recommendations=sqlite,html=memory")
+
+    Returns:
+        dict: Nombre de la caché -> backend ('memory', 'sqlite' o 'external')
+    """
+    names = {}
+    for item in CACHE_BACKENDS.split(','):
+        name, _, backend = item.partition('=')
+        if name.strip() and backend.strip():
+            names[name.strip()] = backend.strip().lower()
+    return names
+
+
+_external_client = None
+
+
+def _get_external_client():
+    """Cliente del almacén externo según CACHE_EXTERNAL_URL (None si no se puede usar)"""
+    global _external_client
+    if _external_client is None:
+        if CACHE_EXTERNAL_URL.startswith('memory://'):
+            _external_client = FakeExternalStore()
+        elif CACHE_EXTERNAL_URL.startswith(('redis://', 'rediss://', 'unix://')):
+            # Dependencia opcional: solo hace falta si se usa una caché externa
+            if importlib.util.find_spec('redis') is None:
+                logger.error("CACHE_EXTERNAL_URL apunta a Redis pero el paquete redis no está instalado")
+                return None
+            import redis
+            _external_client = redis.Redis.from_url(CACHE_EXTERNAL_URL)
+        else:
+            logger.error(f"CACHE_EXTERNAL_URL no configurada o no soportada: '{CACHE_EXTERNAL_URL}'")
+    return _external_client
+
+
+def create_cache(name, backend, max_bytes=None):
+    """
+    Crea una caché con el backend indicado
+
+    Args:
+        name: Nombre de la caché (namespace de sus claves y etiqueta en /metrics)
+        backend: 'memory', 'sqlite' o 'external'
+        max_bytes: Límite de tamaño (por defecto, el del backend; el almacén externo gestiona el suyo)
+
+    Returns:
+        CacheBackend: Caché creada (en memoria si el backend no existe o no está disponible)
+    """
+    limit = {'max_bytes': max_bytes} if max_bytes else {}
+    if backend == 'sqlite':
+        return SQLiteCache(name, **limit)
+    if backend == 'external':
+        client = _get_external_client()
+        if client is not None:
+            return ExternalCache(name, client)
+        logger.warning(f"La caché {name} usa memoria del proceso: el almacén externo no está disponible")
+    elif backend != 'memory':
+        logger.warning(f"Backend de caché desconocido para {name}: '{backend}'; se usa memoria del proceso")
+    return MemoryLRUCache(name, **limit)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, default_backend=None, max_bytes=None):
+    """
+    Devuelve la caché del proceso con ese nombre, con el backend configurado para ella
+    (CACHE_BACKENDS) o, si no figura, default_backend o el de por defecto (CACHE_BACKEND).
+    Sus estadísticas se exportan en /metrics con la etiqueta cache="<nombre>".
+
+    Args:
+        name: Nombre de la caché (p. ej. 'recommendations')
+        default_backend: Backend si CACHE_BACKENDS no indica uno (p. ej. 'sqlite' para que persista)
+        max_bytes: Límite de tamaño propio de esta caché
+
+    Returns:
+        CacheBackend: Caché compartida por todos los usos del proceso
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            backend = backend_names().get(name, default_backend or CACHE_BACKEND.lower())
+            cache = _caches[name] = create_cache(name, backend, max_bytes)
+            REGISTRY.register_cache(name, cache.get_stats)
+        return cache
@@ -0,0 +1,187 @@
+import re
+import logging
+from app.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Filtros de lista (parámetro del formulario o de la API -> faceta del índice)
+LIST_FILTERS = {
+    'genre': 'genre',
+    'style': 'style',
+    'format': 'format',
+    'label': 'label',
+    'condition': 'condition',
+}
+
+# Valor de década que usa el procesamiento cuando no se conoce el año
+UNKNOWN_DECADE = 'Desconocida'
+
+_DECADE = re.compile(r'^\s*(\d{3})\d\s*s?\s*$')
+
+
+def _decade_start(value):
+    """'1970s', '1970' o 1975 -> 1970; None si no es una década válida"""
+    if value is None or value == '':
+        return None
+    match = _DECADE.match(str(value))
+    return int(match.group(1)) * 10 if match else None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def parse_filters(source):
+    """
+    Lee los filtros estructurados de un formulario o de un JSON
+
+    Args:
+        source: request.form (valores repetibles) o diccionario del JSON (listas o cadenas)
+
+    Returns:
+        dict: Filtros normalizados (vacío si no se indicó ninguno)
+
+    Raises:
+        ValueError: Si el rango de décadas no es válido
+    """
+    getlist = getattr(source, 'getlist', None)
+    filters = {}
+    for name in LIST_FILTERS:
+        values = getlist(name) if getlist else source.get(name)
+        values = _as_list(values)
+        if values:
+            filters[name] = values
+
+    for bound in ('decade_from', 'decade_to'):
+        raw = source.get(bound)
+        decade = _decade_start(raw)
+        if raw not in (None, '') and decade is None:
+            raise ValueError(f"Década no válida en {bound}: {raw}")
+        if decade is not None:
+            filters[bound] = decade
+    if filters.get('decade_from') and filters.get('decade_to') and filters['decade_from'] > filters['decade_to']:
+        raise ValueError("El rango de décadas está invertido")
+
+    rated = source.get('rated_only')
+    if rated is True or str(rated).lower() in ('1', 'true', 'on', 'yes'):
+        filters['rated_only'] = True
+    return filters
+
+
+def describe_filters(filters):
+    """Descripción breve de los filtros para los logs"""
+    parts = [f"{name}={'|'.join(filters[name])}" for name in LIST_FILTERS if name in filters]
+    if 'decade_from' in filters or 'decade_to' in filters:
+        parts.append(f"décadas={filters.get('decade_from', '')}-{filters.get('decade_to', '')}")
+    if filters.get('rated_only'):
+        parts.append('solo calificados')
+    return ', '.join(parts)
+
+
+def _decades_in_range(values, start, end):
+    selected = []
+    for value in values:
+        decade = _decade_start(value)
+        if decade is not None and (start is None or decade >= start) and (end is None or decade <= end):
+            selected.append(value)
+    return selected
+
+
+def _rating_values(collection):
+    """Calificaciones como array float (NaN si faltan), sin decodificar registros"""
+    import numpy as np
+    import pandas as pd
+
+    array = collection.array('Rating') if hasattr(collection, 'array') else None
+    if array is not None:
+        return np.asarray(array, dtype=np.float64)
+    if hasattr(collection, 'column'):
+        values = collection.column('Rating')
+    else:
+        values = [record.get('Rating') for record in collection]
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def matching_rows(collection, collection_path, filters):
+    """
+    Filas de la colección que cumplen los filtros, evaluadas con el índice de facetas.
+    Entre filtros se aplica AND y entre los valores de un mismo filtro, OR. La década
+    es la original si se conoce y, si no, la de la edición.
+
+    Args:
+        collection: Colección procesada (resultado de load_processed_collection)
+        collection_path: Ruta del CSV de origen
+        filters: Filtros de parse_filters
+
+    Returns:
+        numpy.ndarray: Índices de las filas que cumplen los filtros
+    """
+    import numpy as np
+    from app.utils.facet_index import get_facet_index
+
+    index = get_facet_index(collection, collection_path)
+    facet_filters = {LIST_FILTERS[name]: filters[name] for name in LIST_FILTERS if name in filters}
+    mask = index.mask(facet_filters)
+
+    # Una selección vacía no es "sin filtro" para la década: ningún disco está en el rango
+    none = np.zeros_like(mask)
+
+    def rows_with(facet, values):
+        return index.mask({facet: values}) if values else none
+
+    start, end = filters.get('decade_from'), filters.get('decade_to')
+    if start is not None or end is not None:
+        decades = _decades_in_range(index.values.get('decade', []), start, end)
+        if 'original_decade' in index.values:
+            original = _decades_in_range(index.values['original_decade'], start, end)
+            mask &= rows_with('original_decade', original) | (
+                rows_with('original_decade', [UNKNOWN_DECADE]) & rows_with('decade', decades))
+        else:
+            mask &= rows_with('decade', decades)
+
+    if filters.get('rated_only'):
+        mask &= _rating_values(collection) > 0
+    return np.nonzero(mask)[0]
+
+
+@timed('filter_collection')
+def filter_collection(collection, collection_path, filters):
+    """
+    Aplica los filtros estructurados a la colección antes de preparar el prompt
+
+    Args:
+        collection: Colección procesada
+        collection_path: Ruta del CSV de origen
+        filters: Filtros de parse_filters
+
+    Returns:
+        Sequence: Registros que cumplen los filtros (la colección tal cual si no hay filtros)
+    """
+    if not filters:
+        return collection
+    rows = matching_rows(collection, collection_path, filters)
+    logger.info(f"Filtros ({describe_filters(filters)}): {len(rows)} de {len(collection)} discos")
+    if hasattr(collection, 'take'):
+        return collection.take(rows)
+    return [collection[int(row)] for row in rows]
+
+
+def filter_options(collection, collection_path, limit=200):
+    """
+    Valores disponibles para los filtros del formulario, de más a menos frecuentes
+
+    Returns:
+        dict: Filtro -> lista de valores, y 'decades' con las décadas conocidas ordenadas
+    """
+    from app.utils.facet_index import get_facet_index
+
+    index = get_facet_index(collection, collection_path)
+    _, counts = index.counts(limit=limit)
+    options = {name: [value for value, _ in counts.get(facet, [])] for name, facet in LIST_FILTERS.items()}
+    decades = set(index.values.get('decade', [])) | set(index.values.get('original_decade', []))
+    options['decades'] = sorted(d for d in decades if _decade_start(d) is not None)
+    return options
@@ -0,0 +1,209 @@
+from collections.abc import Mapping, Sequence
+
+_MISSING = float('nan')
+
+
+def _code_dtype(categories):
+    """Tipo entero más chico que admite los códigos de una columna (con -1 para faltantes)"""
+    import numpy as np
+
+    for dtype in (np.int8, np.int16, np.int32):
+        if categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class _CategoricalColumn:
+    """Columna de texto codificada: un código entero por fila y cada valor distinto una sola vez"""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def value(self, row):
+        code = int(self.codes[row])
+        return _MISSING if code < 0 else self.categories[code]
+
+    def values(self, start, stop):
+        categories = self.categories
+        return [_MISSING if code < 0 else categories[code] for code in self.codes[start:stop].tolist()]
+
+    def take(self, rows):
+        return _CategoricalColumn(self.codes[rows], self.categories)
+
+
+class _NumericColumn:
+    """Columna numérica como array (NaN para valores faltantes)"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def value(self, row):
+        return self.array[row].item()
+
+    def values(self, start, stop):
+        return self.array[start:stop].tolist()
+
+    def take(self, rows):
+        return _NumericColumn(self.array[rows])
+
+
+class VinylRecord(Mapping):
+    """
+    Vista de solo lectura de un disco de una CompactCollection.
+
+    Se comporta como un diccionario (v['Artist'], v.get('Genre'), 'Rating' in v)
+    pero solo guarda la colección y el número de fila: los valores se leen de
+    las columnas al pedirlos.
+    """
+
+    __slots__ = ('_collection', '_row')
+
+    def __init__(self, collection, row):
+        self._collection = collection
+        self._row = row
+
+    @property
+    def row(self):
+        return self._row
+
+    def __getitem__(self, name):
+        return self._collection._by_name[name].value(self._row)
+
+    def __iter__(self):
+        return iter(self._collection.columns)
+
+    def __len__(self):
+        return len(self._collection.columns)
+
+    def get(self, name, default=None):
+        column = self._collection._by_name.get(name)
+        return default if column is None else column.value(self._row)
+
+    def __contains__(self, name):
+        return name in self._collection._by_name
+
+    def to_dict(self):
+        return {name: column.value(self._row) for name, column in self._collection._by_name.items()}
+
+    def __repr__(self):
+        return f"VinylRecord({self.to_dict()!r})"
+
+
+class CompactCollection(Sequence):
+    """
+    Colección procesada en memoria como estructura de arrays.
+
+    Cada columna de texto se guarda como códigos enteros (int8/int16/int32
+    según la cantidad de valores distintos) más la lista de valores distintos,
+    de modo que géneros, estilos, sellos o décadas repetidos ocupan un solo
+    objeto. Las columnas numéricas quedan como arrays de NumPy. Al indexar o
+    iterar se obtienen vistas VinylRecord en lugar de diccionarios.
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = [name for name, _ in columns]
+        self._by_name = dict(columns)
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        Codifica un DataFrame procesado
+
+        Args:
+            frame: DataFrame de pandas (resultado de build_processed_frame)
+
+        Returns:
+            CompactCollection: Colección compacta
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = []
+        for name in frame.columns:
+            series = frame[name]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                columns.append((name, _NumericColumn(series.to_numpy())))
+                continue
+            codes, uniques = pd.factorize(series)
+            categories = [str(value) for value in uniques]
+            columns.append((name, _CategoricalColumn(codes.astype(_code_dtype(len(categories))), categories)))
+        return cls(columns, len(frame))
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return VinylRecord(self, index)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield VinylRecord(self, row)
+
+    def records(self):
+        """Convierte la colección en una lista de diccionarios (para código que los necesite)"""
+        chunk = [self._by_name[name].values(0, self.rows) for name in self.columns]
+        return [dict(zip(self.columns, values)) for values in zip(*chunk)]
+
+    def column(self, name):
+        """
+        Devuelve todos los valores de una columna decodificados
+
+        Returns:
+            list: Valores de la columna (NaN para los faltantes)
+        """
+        return self._by_name[name].values(0, self.rows)
+
+    def codes(self, name):
+        """
+        Devuelve los códigos (-1 = faltante) y las categorías de una columna de texto
+
+        Returns:
+            tuple: (array de códigos, lista de categorías)
+        """
+        column = self._by_name[name]
+        return column.codes, column.categories
+
+    def array(self, name):
+        """
+        Devuelve el array de una columna numérica
+
+        Returns:
+            numpy.ndarray: Valores de la columna o None si la columna es de texto
+        """
+        column = self._by_name[name]
+        return column.array if isinstance(column, _NumericColumn) else None
+
+    def take(self, rows):
+        """
+        Subconjunto de filas que comparte las categorías con la colección original
+
+        Args:
+            rows: Índices de las filas (array o lista de enteros)
+
+        Returns:
+            CompactCollection: Colección con solo esas filas, en ese orden
+        """
+        import numpy as np
+
+        rows = np.asarray(rows, dtype=np.int64)
+        return CompactCollection([(name, self._by_name[name].take(rows)) for name in self.columns], len(rows))
+
+    def nbytes(self):
+        """Bytes aproximados de los arrays y las categorías de la colección"""
+        import sys
+
+        total = 0
+        for column in self._by_name.values():
+            if isinstance(column, _NumericColumn):
+                total += column.array.nbytes
+            else:
+                total += column.codes.nbytes + sum(sys.getsizeof(value) for value in column.categories)
+        return total
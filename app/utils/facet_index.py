@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import logging
+from app.utils.shared_store import CollectionArtifactCache
+from app.utils.search_index import _csr, _encode_strings, _decode_strings
+
+logger = logging.getLogger(__name__)
+
+# Faceta -> (columna de la colección procesada, si admite varios valores separados por comas)
+FACETS = {
+    'genre': ('Genre', True),
+    'style': ('Style', True),
+    'decade': ('Decade', False),
+    'original_decade': ('Original_Decade', False),
+    'format': ('Format_Type', False),
+    'label': ('Label', True),
+    'condition': ('Media_Condition', False),
+}
+
+# Modos de combinar los valores elegidos dentro de una misma faceta (entre facetas siempre es AND)
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+# Valores de Discogs que contienen comas y no deben partirse
+COMPOUND_VALUES = ('Folk, World, & Country',)
+
+# Un valor se guarda como bitset si aparece en al menos 1/DENSE_FRACTION de las filas
+# (a partir de ahí el bitset ocupa menos que la lista de filas en int32)
+DENSE_FRACTION = 32
+
+# Índices cargados por proceso
+MAX_LOADED_INDEXES = 8
+
+
+def split_values(value, multi):
+    """
+    Valores de faceta de un campo ("Rock, Jazz" -> ['Rock', 'Jazz'])
+
+    Args:
+        value: Valor del campo (los faltantes no generan valores)
+        multi: Si el campo admite varios valores separados por comas
+
+    Returns:
+        list: Valores sin duplicados, en orden de aparición
+    """
+    if not isinstance(value, str):
+        return []
+    value = value.replace('"', '').strip()
+    if not multi:
+        return [value] if value else []
+    values = []
+    for compound in COMPOUND_VALUES:
+        if compound in value:
+            values.append(compound)
+            value = value.replace(compound, '')
+    values.extend(part.strip() for part in value.split(','))
+    return [v for v in dict.fromkeys(values) if v]
+
+
+def _popcount_rows(matrix):
+    """Cantidad de bits a 1 por fila de una matriz de bitsets empaquetados (uint8)"""
+    import numpy as np
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(matrix).sum(axis=1, dtype=np.int64)
+    table = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+    return table[matrix].sum(axis=1, dtype=np.int64)
+
+
+def _column_codes(collection, column):
+    """
+    Códigos por fila (-1 = faltante) y categorías de una columna de texto
+
+    Returns:
+        tuple: (array de códigos, lista de categorías) o None si la columna no existe
+    """
+    import numpy as np
+
+    if hasattr(collection, 'codes'):
+        return collection.codes(column) if column in collection.columns else None
+    if not collection or column not in collection[0]:
+        return None
+    categories = {}
+    codes = np.fromiter((categories.setdefault(record.get(column), len(categories))
+                         if isinstance(record.get(column), str) else -1 for record in collection),
+                        dtype=np.int64, count=len(collection))
+    return codes, list(categories)
+
+
+class FacetIndex:
+    """
+    Índice de facetas de una versión de la colección.
+
+    Por cada faceta, los valores distintos ordenados alfabéticamente y sus
+    filas: los valores frecuentes como bitsets empaquetados (una fila de bits
+    por valor, 1 bit por disco) y los poco frecuentes como listas de filas en
+    formato CSR. Los filtros se evalúan con OR/AND sobre bitsets y los conteos
+    con popcount, sin recorrer los registros.
+    """
+
+    def __init__(self, version, rows, values, arrays):
+        self.version = version
+        self.rows = rows
+        self.values = values
+        self.arrays = arrays
+        self._lookup = {facet: {value: i for i, value in enumerate(names)} for facet, names in values.items()}
+
+    @classmethod
+    def build(cls, collection, version):
+        """
+        Construye el índice a partir de la colección procesada
+
+        Args:
+            collection: Secuencia de registros (SharedCollection o lista de diccionarios)
+            version: Identificador de la versión de la colección
+
+        Returns:
+            FacetIndex: Índice en memoria
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        rows = len(collection)
+        nbytes = (rows + 7) // 8
+        values, arrays = {}, {}
+        for facet, (column, multi) in FACETS.items():
+            encoded = _column_codes(collection, column)
+            if encoded is None:
+                continue
+            codes, categories = encoded
+            codes = np.asarray(codes, dtype=np.int64)
+
+            # Cada categoría se parte en valores una sola vez; luego se expande por fila
+            names = {}
+            category_values = [[names.setdefault(v, len(names)) for v in split_values(category, multi)]
+                               for category in categories]
+            sorted_names = sorted(names)
+            remap = np.empty(len(names), dtype=np.int64)
+            for new_id, name in enumerate(sorted_names):
+                remap[names[name]] = new_id
+            lengths = np.array([len(ids) for ids in category_values] + [0], dtype=np.int64)
+            flat = remap[np.array([i for ids in category_values for i in ids], dtype=np.int64)]
+            starts = np.concatenate(([0], np.cumsum(lengths)))
+
+            present = np.nonzero(codes >= 0)[0]
+            per_row = lengths[codes[present]]
+            pair_rows = np.repeat(present, per_row)
+            within = np.arange(len(pair_rows)) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+            pair_values = flat[starts[codes[pair_rows]] + within] if len(pair_rows) else pair_rows
+            postings, offsets = _csr(pair_values, pair_rows, len(sorted_names))
+
+            # Los valores frecuentes pasan a bitset y salen de la lista CSR
+            counts = np.diff(offsets)
+            dense_ids = np.nonzero(counts >= max(1, rows // DENSE_FRACTION))[0]
+            dense_slot = np.full(len(sorted_names), -1, dtype=np.int32)
+            dense_slot[dense_ids] = np.arange(len(dense_ids), dtype=np.int32)
+            bits = np.zeros((len(dense_ids), nbytes), dtype=np.uint8)
+            mask = np.zeros(rows, dtype=bool)
+            for slot, value_id in enumerate(dense_ids):
+                mask[:] = False
+                mask[postings[offsets[value_id]:offsets[value_id + 1]]] = True
+                bits[slot] = np.packbits(mask)
+            keep = dense_slot[np.repeat(np.arange(len(sorted_names)), counts)] < 0
+            sparse_counts = np.where(dense_slot < 0, counts, 0)
+            sparse_offsets = np.zeros(len(sorted_names) + 1, dtype=np.int64)
+            sparse_offsets[1:] = np.cumsum(sparse_counts)
+
+            values[facet] = sorted_names
+            arrays[f'postings_{facet}'] = postings[keep]
+            arrays[f'offsets_{facet}'] = sparse_offsets
+            arrays[f'counts_{facet}'] = counts.astype(np.int32)
+            arrays[f'dense_{facet}'] = dense_slot
+            arrays[f'bits_{facet}'] = bits
+
+        logger.info(f"Índice de facetas construido: {rows} filas, "
+                    f"{sum(len(v) for v in values.values())} valores en {time.perf_counter() - start:.2f}s")
+        return cls(version, rows, values, arrays)
+
+    def save(self, directory):
+        """Guarda el índice en un directorio (un .npy por array y meta.json)"""
+        import numpy as np
+
+        for name, array in self.arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+        for facet, names in self.values.items():
+            offsets, blob = _encode_strings(names)
+            np.save(os.path.join(directory, f'value_offsets_{facet}.npy'), offsets)
+            np.save(os.path.join(directory, f'value_blob_{facet}.npy'), blob)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': self.version, 'rows': self.rows, 'facets': sorted(self.values),
+                       'arrays': sorted(self.arrays)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Carga un índice guardado, mapeando sus arrays en memoria"""
+        import numpy as np
+
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        load = lambda name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')  # noqa: E731
+        values = {facet: _decode_strings(load(f'value_offsets_{facet}'), load(f'value_blob_{facet}'))
+                  for facet in meta['facets']}
+        arrays = {name: load(name) for name in meta['arrays']}
+        return cls(meta['version'], meta['rows'], values, arrays)
+
+    def _empty(self):
+        import numpy as np
+        return np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+
+    def _all(self):
+        import numpy as np
+        return np.packbits(np.ones(self.rows, dtype=bool))
+
+    def _value_bits(self, facet, value_id):
+        """Bitset empaquetado de las filas que tienen un valor"""
+        import numpy as np
+
+        slot = self.arrays[f'dense_{facet}'][value_id]
+        if slot >= 0:
+            return self.arrays[f'bits_{facet}'][slot]
+        offsets = self.arrays[f'offsets_{facet}']
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self.arrays[f'postings_{facet}'][offsets[value_id]:offsets[value_id + 1]]] = True
+        return np.packbits(mask)
+
+    def _facet_bits(self, facet, selected, mode):
+        """Bitset de las filas que cumplen los valores elegidos de una faceta (OR o AND)"""
+        import numpy as np
+
+        lookup = self._lookup[facet]
+        ids = [lookup.get(value) for value in dict.fromkeys(selected)]
+        if mode == MATCH_ALL:
+            if None in ids:
+                return self._empty()
+            result = self._all()
+            for value_id in ids:
+                result &= self._value_bits(facet, value_id)
+            return result
+        result = self._empty()
+        for value_id in ids:
+            if value_id is not None:
+                result |= self._value_bits(facet, value_id)
+        return result
+
+    def _selections(self, filters, mode):
+        selections = {}
+        for facet, selected in filters.items():
+            if facet not in FACETS:
+                raise ValueError(f"Faceta desconocida: {facet}")
+            if not selected:
+                continue
+            # Una faceta que no existe en esta colección no deja pasar ninguna fila
+            selections[facet] = self._facet_bits(facet, selected, mode) if facet in self.values else self._empty()
+        return selections
+
+    def _combine(self, selections, skip=None):
+        result = self._all()
+        for facet, bits in selections.items():
+            if facet != skip:
+                result &= bits
+        return result
+
+    def mask(self, filters, mode=MATCH_ANY):
+        """
+        Evalúa los filtros: AND entre facetas y OR (any) o AND (all) entre los valores de cada faceta
+
+        Args:
+            filters: Diccionario faceta -> lista de valores elegidos
+            mode: MATCH_ANY o MATCH_ALL
+
+        Returns:
+            numpy.ndarray: Máscara booleana con una posición por fila
+        """
+        import numpy as np
+
+        bits = self._combine(self._selections(filters, mode))
+        return np.unpackbits(bits, count=self.rows).view(bool)
+
+    def match(self, filters, mode=MATCH_ANY):
+        """Índices de las filas que cumplen los filtros (ver mask)"""
+        import numpy as np
+        return np.nonzero(self.mask(filters, mode))[0]
+
+    def counts(self, filters=None, mode=MATCH_ANY, facets=None, limit=None):
+        """
+        Cuenta cuántas filas tiene cada valor de faceta entre las que cumplen los filtros.
+        En modo any, los conteos de una faceta ignoran los filtros de esa misma faceta
+        para que se puedan seguir sumando valores.
+
+        Args:
+            filters: Diccionario faceta -> lista de valores elegidos
+            mode: MATCH_ANY o MATCH_ALL
+            facets: Facetas a contar (por defecto, todas las disponibles)
+            limit: Cantidad máxima de valores por faceta (los más frecuentes)
+
+        Returns:
+            tuple: (filas que cumplen los filtros, {faceta: [(valor, conteo), ...]})
+        """
+        import numpy as np
+
+        selections = self._selections(filters or {}, mode)
+        matched = self._combine(selections)
+        total = int(_popcount_rows(matched[None, :])[0])
+        results = {}
+        for facet in (facets or FACETS):
+            if facet not in self.values:
+                continue
+            base = matched if mode == MATCH_ALL else self._combine(selections, skip=facet)
+            counts = np.zeros(len(self.values[facet]), dtype=np.int64)
+
+            dense_slot = self.arrays[f'dense_{facet}']
+            dense_ids = np.nonzero(dense_slot >= 0)[0]
+            if len(dense_ids):
+                counts[dense_ids] = _popcount_rows(self.arrays[f'bits_{facet}'] & base)
+
+            # Valores poco frecuentes: suma acumulada del filtro sobre sus listas de filas
+            postings = self.arrays[f'postings_{facet}']
+            if len(postings):
+                offsets = self.arrays[f'offsets_{facet}']
+                included = np.unpackbits(base, count=self.rows)[postings]
+                cumulative = np.concatenate(([0], np.cumsum(included, dtype=np.int64)))
+                sparse = dense_slot < 0
+                counts[sparse] = (cumulative[offsets[1:]] - cumulative[offsets[:-1]])[sparse]
+
+            nonzero = np.nonzero(counts)[0]
+            order = nonzero[np.argsort(-counts[nonzero], kind='stable')][:limit]
+            results[facet] = [(self.values[facet][i], int(counts[i])) for i in order]
+        return total, results
+
+
+_indexes = CollectionArtifactCache('facet_index', FacetIndex, MAX_LOADED_INDEXES)
+
+
+def get_facet_index(collection, collection_path):
+    """
+    Devuelve el índice de facetas de una colección, construyéndolo una vez por versión.
+    Con el almacén compartido, el índice se guarda junto a la versión y lo mapean todos los workers.
+
+    Args:
+        collection: Colección procesada (resultado de load_processed_collection)
+        collection_path: Ruta del CSV de origen
+
+    Returns:
+        FacetIndex: Índice de la versión actual
+    """
+    return _indexes.get(collection, collection_path)
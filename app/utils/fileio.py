@@ -0,0 +1,41 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Ruta temporal junto a path que reemplaza a path con un rename atómico al salir sin errores.
+    Si hay una excepción, el archivo temporal se borra y path queda como estaba.
+
+    Args:
+        path: Ruta final del archivo
+
+    Yields:
+        str: Ruta temporal donde escribir
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def atomic_write_json(path, data):
+    """Escribe un JSON de forma atómica (los lectores ven el contenido anterior o el nuevo, nunca uno a medias)"""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+
+
+def read_json(path, default=None):
+    """Lee un JSON; devuelve default si no existe o no se puede leer"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
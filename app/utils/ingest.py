@@ -0,0 +1,298 @@
+import io
+import csv
+import time
+import logging
+import importlib.util
+from app.config import CSV_ENGINE, UPLOAD_CHUNK_ROWS
+from app.utils.fileio import atomic_path
+from app.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Tipos de columna del esquema
+TEXT = 'text'          # texto tal cual (str, NaN si falta)
+CATEGORY = 'category'  # texto con pocos valores distintos: categórico de pandas si se pide
+NUMBER = 'number'      # numérico (los valores no numéricos pasan a NaN)
+INFER = 'infer'        # se deja que pandas infiera el tipo (ids y años enteros)
+
+# Esquema de la exportación CSV de Discogs y de las columnas que agrega el enriquecimiento,
+# en el orden en que se guardan
+DISCOGS_EXPORT_SCHEMA = {
+    'Catalog#': TEXT,
+    'Artist': TEXT,
+    'Title': TEXT,
+    'Label': CATEGORY,
+    'Format': TEXT,
+    'Rating': NUMBER,
+    'Released': TEXT,
+    'release_id': INFER,
+    'master_id': INFER,
+    'CollectionFolder': CATEGORY,
+    'Date Added': TEXT,
+    'Collection Media Condition': TEXT,
+    'Collection Sleeve Condition': CATEGORY,
+    'Collection Notes': TEXT,
+    'Genre': TEXT,
+    'Style': TEXT,
+    'original_release_year': INFER,
+    'community_rating': NUMBER,
+    'community_have': NUMBER,
+    'community_want': NUMBER,
+    'image_url': TEXT,
+    'tracklist': TEXT,
+    'match_confidence': NUMBER,
+    # Momento (epoch) en que se obtuvieron los campos inmutables y los volátiles de cada fila
+    'details_fetched_at': NUMBER,
+    'community_fetched_at': NUMBER,
+}
+
+# Columnas sin las cuales el archivo no es una colección utilizable
+REQUIRED_COLUMNS = ('Artist', 'Title')
+
+# Nombre normalizado (minúsculas, sin espacios extra) -> nombre del esquema
+_CANONICAL = {' '.join(name.lower().split()): name for name in DISCOGS_EXPORT_SCHEMA}
+
+# Tamaño de los bloques leídos del flujo de una subida y máximo admitido para la línea de cabecera
+STREAM_BLOCK_BYTES = 1024 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """El archivo subido supera el tamaño máximo permitido"""
+
+
+def _usecols(mapping, columns=None):
+    """Columnas del archivo a leer: las del esquema, o solo las pedidas"""
+    wanted = set(columns) if columns is not None else None
+    return [column for column, canonical in mapping.items() if wanted is None or canonical in wanted]
+
+
+def _schema_order(df):
+    return df[[column for column in DISCOGS_EXPORT_SCHEMA if column in df.columns]]
+
+
+def _pyarrow_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def csv_engine():
+    """Motor de pandas a usar para leer CSV según CSV_ENGINE"""
+    if CSV_ENGINE == 'auto':
+        return 'pyarrow' if _pyarrow_available() else 'c'
+    return CSV_ENGINE
+
+
+def read_header(path):
+    """
+    Lee solo la cabecera de un CSV (sin cargar el archivo)
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        list: Nombres de columna tal como aparecen en el archivo
+
+    Raises:
+        ValueError: Si el archivo está vacío o no es texto CSV
+    """
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), None)
+    except UnicodeDecodeError:
+        raise ValueError("El archivo no es un CSV de texto en UTF-8")
+    if not header or not any(column.strip() for column in header):
+        raise ValueError("El archivo está vacío o no tiene cabecera")
+    return header
+
+
+def validate_header(header):
+    """
+    Comprueba la cabecera contra el esquema y resuelve el nombre de cada columna
+
+    Args:
+        header: Nombres de columna del archivo
+
+    Returns:
+        dict: Nombre en el archivo -> nombre del esquema (solo columnas del esquema)
+
+    Raises:
+        ValueError: Si faltan columnas obligatorias
+    """
+    mapping = {}
+    for column in header:
+        canonical = _CANONICAL.get(' '.join(column.lower().split()))
+        if canonical and canonical not in mapping.values():
+            mapping[column] = canonical
+    missing = [column for column in REQUIRED_COLUMNS if column not in mapping.values()]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias de la exportación de Discogs: {', '.join(missing)}")
+    return mapping
+
+
+@timed('read_collection')
+def read_collection(path, columns=None, categoricals=False):
+    """
+    Lee un CSV de colección según el esquema: solo las columnas conocidas, con
+    tipos explícitos y nombres normalizados
+
+    Args:
+        path: Ruta del CSV
+        columns: Columnas del esquema a leer (por defecto, todas las que tenga el archivo)
+        categoricals: Si es True, las columnas CATEGORY se leen como categóricas
+                      (para datos de solo lectura; no admiten valores nuevos)
+
+    Returns:
+        DataFrame: Colección con las columnas en el orden del esquema
+
+    Raises:
+        ValueError: Si la cabecera no es válida
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    mapping = validate_header(read_header(path))
+    usecols = _usecols(mapping, columns)
+    dtype = {}
+    for column in usecols:
+        kind = DISCOGS_EXPORT_SCHEMA[mapping[column]]
+        if kind == CATEGORY and categoricals:
+            dtype[column] = 'category'
+        elif kind in (TEXT, CATEGORY):
+            dtype[column] = str
+
+    options = dict(usecols=usecols, dtype=dtype, encoding='utf-8-sig')
+    engine = csv_engine()
+    try:
+        df = pd.read_csv(path, engine=engine, **options)
+    except (ValueError, ImportError) as e:
+        if engine == 'c':
+            raise
+        logger.warning(f"El motor {engine} no pudo leer {path} ({e}); se usa el motor C")
+        engine = 'c'
+        df = pd.read_csv(path, engine=engine, **options)
+
+    df = df.rename(columns=mapping)
+    for column in df.columns:
+        if DISCOGS_EXPORT_SCHEMA[column] == NUMBER and not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    df = _schema_order(df)
+    logger.info(f"CSV leído con el esquema ({engine}): {len(df)} filas, {len(df.columns)} columnas "
+                f"en {time.perf_counter() - start:.2f}s")
+    return df
+
+
+class _BoundedStream(io.RawIOBase):
+    """
+    Flujo de solo lectura sobre el cuerpo de una subida: entrega primero los bytes ya
+    leídos para validar la cabecera, cuenta lo leído y corta en cuanto se supera el máximo
+    (también cuando el cliente no envía Content-Length)
+    """
+
+    def __init__(self, stream, head, max_bytes, on_read=None):
+        self._stream = stream
+        self._head = head
+        self._max_bytes = max_bytes
+        self._on_read = on_read
+        self.bytes_read = len(head)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._head:
+            size = min(len(buffer), len(self._head))
+            buffer[:size] = self._head[:size]
+            self._head = self._head[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        if not data:
+            return 0
+        self.bytes_read += len(data)
+        if self.bytes_read > self._max_bytes:
+            raise UploadTooLarge(f"El archivo supera el tamaño máximo de {self._max_bytes // (1024 * 1024)} MB")
+        buffer[:len(data)] = data
+        if self._on_read:
+            self._on_read(self.bytes_read)
+        return len(data)
+
+
+def _read_stream_header(stream, max_bytes):
+    """
+    Lee del flujo lo justo para tener la primera línea y la valida contra el esquema
+
+    Returns:
+        tuple: (bytes leídos, correspondencia de columnas de validate_header)
+    """
+    head = b''
+    while b'\n' not in head:
+        block = stream.read(STREAM_BLOCK_BYTES)
+        if not block:
+            break
+        head += block
+        if b'\n' not in head and len(head) > MAX_HEADER_BYTES:
+            raise ValueError("La cabecera del CSV es demasiado larga")
+    if len(head) > max_bytes:
+        raise UploadTooLarge(f"El archivo supera el tamaño máximo de {max_bytes // (1024 * 1024)} MB")
+    try:
+        line = head.split(b'\n', 1)[0].decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("El archivo no es un CSV de texto en UTF-8")
+    header = next(csv.reader([line]), None)
+    if not header or not any(column.strip() for column in header):
+        raise ValueError("El archivo está vacío o no tiene cabecera")
+    return head, validate_header(header)
+
+
+@timed('ingest_stream')
+def ingest_stream(stream, target_path, max_bytes, chunk_rows=UPLOAD_CHUNK_ROWS, progress=None):
+    """
+    Convierte al formato interno un CSV que llega como flujo (el cuerpo de la subida), sin
+    guardarlo antes entero: la cabecera se valida con el primer bloque y las filas se leen
+    y se escriben por bloques de chunk_rows, así la memoria depende del bloque y no del
+    archivo. El resultado se publica en target_path con un reemplazo atómico solo si todo
+    el archivo es válido y tiene al menos una fila; si no, target_path queda como estaba.
+
+    Args:
+        stream: Objeto con read(n) que devuelve bytes
+        target_path: Ruta final del CSV normalizado
+        max_bytes: Tamaño máximo del archivo
+        chunk_rows: Filas por bloque
+        progress: Función que recibe el avance como argumentos con nombre (stage, bytes, rows)
+
+    Returns:
+        int: Número de filas
+
+    Raises:
+        UploadTooLarge: Si el archivo supera max_bytes
+        ValueError: Si la cabecera o el contenido no son válidos, o si no hay filas
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    report = progress or (lambda **fields: None)
+    head, mapping = _read_stream_header(stream, max_bytes)
+    body = _BoundedStream(stream, head, max_bytes, on_read=lambda read: report(stage='processing', bytes=read))
+    usecols = _usecols(mapping)
+
+    rows = 0
+    with atomic_path(target_path) as tmp_path:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as out:
+            # Todo se lee como texto: el CSV normalizado conserva los valores tal como llegaron
+            # y los tipos se infieren al final sobre todas las filas, igual que al leer el archivo
+            try:
+                with pd.read_csv(io.BufferedReader(body, STREAM_BLOCK_BYTES), usecols=usecols, dtype=str,
+                                 encoding='utf-8-sig', chunksize=chunk_rows) as reader:
+                    for chunk in reader:
+                        chunk = _schema_order(chunk.rename(columns=mapping))
+                        chunk.to_csv(out, header=(rows == 0), index=False)
+                        rows += len(chunk)
+                        report(stage='processing', bytes=body.bytes_read, rows=rows)
+            except UnicodeDecodeError:
+                raise ValueError("El archivo no es un CSV de texto en UTF-8")
+            # Una cabecera sin filas no reemplaza la colección anterior
+            if rows == 0:
+                raise ValueError("El archivo no tiene registros")
+
+    logger.info(f"CSV recibido en streaming: {rows} filas, {body.bytes_read} bytes "
+                f"en {time.perf_counter() - start:.2f}s")
+    return rows
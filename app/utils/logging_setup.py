@@ -0,0 +1,190 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import itertools
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app.config import (LOG_LEVEL, LOG_LEVELS, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+                        LOG_JSON, LOG_SAMPLE_EVERY)
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin coordinación entre procesos (un solo proceso escribe el log)
+    fcntl = None
+
+# Pasar como extra=SAMPLED en logs por elemento (se emite 1 de cada LOG_SAMPLE_EVERY)
+SAMPLED = {'sampled': True}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos estándar de LogRecord que no se repiten como campos extra en JSON
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sampled'}
+
+_listener = None
+_queue_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON"""
+
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                data[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar solo 1 de cada N registros marcados con extra=SAMPLED (los WARNING o más graves pasan siempre)"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    Archivo rotativo compartido por varios procesos (workers de gunicorn).
+
+    Cada escritura y la rotación se hacen con un flock sobre "<archivo>.lock": el tamaño se
+    mide sobre el archivo real (lo que escribieron todos los procesos), un solo proceso rota
+    y los demás, al ver que el archivo ya no es el que tienen abierto, lo reabren en lugar de
+    seguir escribiendo en el rotado.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_file = open(self.baseFilename + '.lock', 'a+') if fcntl is not None else None
+
+    def _reopen_if_rotated(self):
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        if self.stream is not None:
+            opened = os.fstat(self.stream.fileno())
+            if current is not None and (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino):
+                return
+            self.stream.close()
+            self.stream = None
+        self.stream = self._open()
+
+    def emit(self, record):
+        if self._lock_file is None:
+            super().emit(record)
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._reopen_if_rotated()
+            super().emit(record)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def parse_logger_levels(spec):
+    """
+    Interpreta la configuración de niveles por logger
+
+    Args:
+        spec: Cadena del estilo "urllib3=WARNING,app.services.discogs_service=INFO"
+
+    Returns:
+        dict: Nombre de logger -> nivel
+    """
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, _, level = part.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_handlers():
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers = [console]
+    if LOG_FILE:
+        log_dir = os.path.dirname(LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = SharedRotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                                 backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JSONFormatter() if LOG_JSON else logging.Formatter(TEXT_FORMAT))
+        handlers.append(file_handler)
+    return handlers
+
+
+def _restart_listener_after_fork():
+    # Los hilos no sobreviven a fork (gunicorn --preload): cada worker arranca su propio listener
+    global _listener
+    if _queue_handler is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_queue_handler.queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging():
+    """
+    Configura el logging de la aplicación: el logger raíz solo encola los registros
+    y un hilo (QueueListener) los escribe en consola y en un archivo rotativo que todos
+    los procesos comparten sin pisarse al rotar.
+    Es idempotente.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL.upper())
+
+    # Librerías muy verbosas en DEBUG; pueden sobrescribirse con LOG_LEVELS
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+    for name, level in parse_logger_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def stop_logging():
+    """Vacía la cola y detiene el hilo de escritura de logs"""
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
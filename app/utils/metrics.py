@@ -0,0 +1,177 @@
+import time
+import bisect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Límites de los buckets de latencia (en segundos)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos, al estilo Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso: histogramas, contadores y fuentes de
+    estadísticas de cachés que se consultan al exportar
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._cache_sources = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_cache(self, name, stats_fn):
+        """
+        Registra una caché cuyas estadísticas se exportan en /metrics
+
+        Args:
+            name: Nombre de la caché (se usa como etiqueta)
+            stats_fn: Función sin argumentos que devuelve un dict con al menos 'hits' y 'misses'
+        """
+        self._cache_sources[name] = stats_fn
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        """
+        Exporta todas las métricas en formato de texto de Prometheus
+
+        Returns:
+            str: Cuerpo de la respuesta de /metrics
+        """
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for cache_name, stats_fn in sorted(self._cache_sources.items()):
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            labels = (('cache', cache_name),)
+            for stat, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"cache_{stat}"
+                    header(metric, 'gauge')
+                    lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+            lookups = stats.get('hits', 0) + stats.get('misses', 0)
+            header('cache_hit_ratio', 'gauge')
+            ratio = stats.get('hit_ratio', (stats.get('hits', 0) / lookups) if lookups else 0.0)
+            lines.append(f"cache_hit_ratio{_format_labels(labels)} {_format_value(ratio)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('vinyl_stage_duration_seconds', "Duración de cada etapa del procesamiento")
+REGISTRY.describe('vinyl_request_duration_seconds', "Duración total de las peticiones HTTP por endpoint")
+REGISTRY.describe('discogs_requests_total', "Peticiones realizadas a la API de Discogs")
+REGISTRY.describe('discogs_ratelimit_wait_seconds_total', "Tiempo de espera para respetar el límite de Discogs")
+REGISTRY.describe('openai_request_duration_seconds', "Latencia de las llamadas a OpenAI")
+
+
+@contextmanager
+def timer(stage, metric='vinyl_stage_duration_seconds', **labels):
+    """
+    Mide la duración de un bloque y la agrega al histograma de la etapa
+
+    Args:
+        stage: Nombre de la etapa (etiqueta 'stage')
+        metric: Nombre del histograma
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(metric, time.perf_counter() - start, stage=stage, **labels)
+
+
+def timed(stage, metric='vinyl_stage_duration_seconds'):
+    """Decorador que mide cada llamada a la función como una etapa"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe(metric, time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
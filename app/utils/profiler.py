@@ -0,0 +1,163 @@
+import io
+import os
+import hmac
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from flask import g, request
+from app.config import (PROFILING_ENABLED, PROFILING_TOKEN, PROFILING_TRACEMALLOC,
+                        PROFILES_DIR, PROFILES_MAX_FILES)
+
+logger = logging.getLogger(__name__)
+
+# Solo se perfila una petición a la vez: cProfile y tracemalloc son globales al proceso
+_profile_lock = threading.Lock()
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_EXTENSIONS = ('.prof', '.txt')
+
+
+def is_trusted_request():
+    """
+    Indica si la petición pidió ser perfilada con el token configurado
+
+    Returns:
+        bool: True si el token de la cabecera o del parámetro coincide
+    """
+    if not PROFILING_TOKEN:
+        return False
+    supplied = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAM)
+    return bool(supplied) and hmac.compare_digest(supplied, PROFILING_TOKEN)
+
+
+def _start_profile():
+    if request.blueprint == 'profiles' or not is_trusted_request():
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
+    g.profile_memory = PROFILING_TRACEMALLOC or request.args.get('profile_memory') == '1'
+    if g.profile_memory and not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+        g.profile_owns_tracemalloc = True
+    g.profile_start = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    try:
+        profiler.disable()
+        elapsed = time.perf_counter() - g.pop('profile_start')
+        snapshot = tracemalloc.take_snapshot() if g.get('profile_memory') else None
+        if g.pop('profile_owns_tracemalloc', False):
+            tracemalloc.stop()
+        profile_id = write_profile(profiler, snapshot, elapsed)
+        response.headers['X-Profile-Id'] = profile_id
+    except Exception as e:
+        logger.error(f"Error guardando el perfil de la petición: {e}", exc_info=True)
+    finally:
+        _profile_lock.release()
+    return response
+
+
+def _abort_profile(exc=None):
+    # Si la petición falló antes de after_request, detener el perfil y liberar el candado
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    if g.pop('profile_owns_tracemalloc', False):
+        tracemalloc.stop()
+    _profile_lock.release()
+
+
+def write_profile(profiler, snapshot, elapsed):
+    """
+    Guarda el perfil de una petición en PROFILES_DIR
+
+    Args:
+        profiler: cProfile.Profile ya detenido
+        snapshot: Snapshot de tracemalloc o None
+        elapsed: Duración de la petición en segundos
+
+    Returns:
+        str: Identificador del perfil (prefijo común de los archivos)
+    """
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    endpoint = (request.endpoint or 'unknown').replace('.', '-')
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{os.getpid()}-{int(time.time() * 1000) % 100000}"
+    base_path = os.path.join(PROFILES_DIR, profile_id)
+
+    profiler.dump_stats(base_path + '.prof')
+
+    summary = io.StringIO()
+    summary.write(f"{request.method} {request.full_path}\nDuración: {elapsed:.4f}s\n\n")
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(40)
+    if snapshot is not None:
+        summary.write("\nAsignaciones de memoria (tracemalloc, top 25 por línea):\n")
+        for stat in snapshot.statistics('lineno')[:25]:
+            summary.write(f"{stat}\n")
+    with open(base_path + '.txt', 'w') as f:
+        f.write(summary.getvalue())
+
+    prune_profiles()
+    logger.info(f"Perfil de la petición guardado: {profile_id} ({elapsed:.3f}s)")
+    return profile_id
+
+
+def list_profiles():
+    """
+    Lista los archivos de perfiles guardados, del más reciente al más antiguo
+
+    Returns:
+        list: Diccionarios con nombre, tamaño y fecha de cada archivo
+    """
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    entries = []
+    for entry in os.scandir(PROFILES_DIR):
+        if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS):
+            stat = entry.stat()
+            entries.append({'name': entry.name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    entries.sort(key=lambda e: e['modified'], reverse=True)
+    return entries
+
+
+def prune_profiles():
+    """Elimina los perfiles más antiguos para no superar PROFILES_MAX_FILES perfiles"""
+    profiles = {}
+    for entry in list_profiles():
+        profile_id = os.path.splitext(entry['name'])[0]
+        profiles.setdefault(profile_id, entry['modified'])
+    for profile_id in sorted(profiles, key=profiles.get, reverse=True)[PROFILES_MAX_FILES:]:
+        for extension in PROFILE_EXTENSIONS:
+            path = os.path.join(PROFILES_DIR, profile_id + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def init_profiling(app):
+    """
+    Registra los hooks de perfilado si está habilitado en la configuración.
+    Con el perfilado deshabilitado no se agrega ningún hook.
+
+    Args:
+        app: Aplicación Flask
+    """
+    if not PROFILING_ENABLED:
+        return
+    if not PROFILING_TOKEN:
+        logger.warning("PROFILING_ENABLED está activo pero falta PROFILING_TOKEN; no se perfilarán peticiones")
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abort_profile)
+    logger.info("Perfilado bajo demanda habilitado")
@@ -0,0 +1,388 @@
+"""
+Catálogo offline de lanzamientos construido con los volcados mensuales de Discogs
+(https://data.discogs.com): release_id -> (master_id, año original, géneros, estilos).
+
+Construcción:
+    python -m app.utils.release_catalog discogs_20240101_releases.xml.gz --masters discogs_20240101_masters.xml.gz
+"""
+import os
+import sys
+import time
+import gzip
+import uuid
+import shutil
+import logging
+import argparse
+import threading
+from array import array
+from app.config import CATALOG_DIR, CATALOG_ENABLED
+from app.utils.fileio import atomic_write_json, read_json
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Cambiar si cambia el formato de los archivos
+CATALOG_FORMAT = 'v1'
+
+# Lanzamientos que se acumulan en memoria antes de volcarlos a los archivos temporales
+FLUSH_ROWS = 100000
+
+# Cada cuántos elementos se informa el avance del parseo
+PROGRESS_EVERY = 500000
+
+# Años fuera de este rango se consideran desconocidos (0)
+MIN_YEAR, MAX_YEAR = 1800, 2100
+
+# Columnas guardadas como arrays de tamaño fijo: nombre -> tipo de array.array
+_FIXED_COLUMNS = {'release_ids': 'q', 'master_ids': 'i', 'years': 'h', 'genre_counts': 'B', 'style_counts': 'B'}
+# Listas de valores por lanzamiento (códigos en el vocabulario correspondiente)
+_LIST_COLUMNS = {'genre': 'genre_counts', 'style': 'style_counts'}
+
+
+def parse_year(text):
+    """Año de un campo de fecha de Discogs ('1973', '1973-03-01', '1973-00-00') o 0 si no se reconoce"""
+    if not text or len(text) < 4 or not text[:4].isdigit():
+        return 0
+    year = int(text[:4])
+    return year if MIN_YEAR <= year <= MAX_YEAR else 0
+
+
+def as_release_id(value):
+    """Convierte un release_id del CSV (int, float, numpy o texto) a int; None si no es válido"""
+    try:
+        release_id = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return release_id if release_id > 0 else None
+
+
+def iter_dump(path, tag):
+    """
+    Recorre los elementos de primer nivel de un volcado XML de Discogs con memoria constante:
+    cada elemento se descarta del árbol en cuanto se procesa
+
+    Args:
+        path: Ruta del volcado (.xml o .xml.gz)
+        tag: Elemento a devolver ('release' o 'master')
+
+    Yields:
+        Element: Elemento completo (válido solo hasta la siguiente iteración)
+    """
+    import xml.etree.ElementTree as ET
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        # El primer evento es la raíz (<releases> o <masters>): vaciarla tras cada elemento
+        # mantiene el árbol en un solo lanzamiento. Ningún elemento interno se llama como tag.
+        _, root = next(context)
+        for event, elem in context:
+            if event == 'end' and elem.tag == tag:
+                yield elem
+                root.clear()
+
+
+def _read_masters(path):
+    """(ids, años) de los masters del volcado en arrays compactos (12 bytes por master)"""
+    ids, years = array('q'), array('h')
+    for count, elem in enumerate(iter_dump(path, 'master'), 1):
+        year = parse_year(elem.findtext('year'))
+        if year:
+            ids.append(int(elem.get('id')))
+            years.append(year)
+        if count % PROGRESS_EVERY == 0:
+            logger.info(f"Volcado de masters: {count} procesados")
+    logger.info(f"Volcado de masters: {len(ids)} con año")
+    return ids, years
+
+
+class _ReleaseWriter:
+    """Acumula los lanzamientos en arrays y los vuelca por bloques a archivos binarios temporales"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows = 0
+        self.vocabularies = {name: {} for name in _LIST_COLUMNS}
+        self._buffers = {}
+        self._files = {}
+        for name, typecode in list(_FIXED_COLUMNS.items()) + [(f'{name}_codes', 'H') for name in _LIST_COLUMNS]:
+            self._buffers[name] = array(typecode)
+            self._files[name] = open(self.raw_path(name), 'wb')
+
+    def raw_path(self, name):
+        return os.path.join(self.directory, f'{name}.raw')
+
+    def add(self, release_id, master_id, year, genres, styles):
+        buffers = self._buffers
+        buffers['release_ids'].append(release_id)
+        buffers['master_ids'].append(master_id)
+        buffers['years'].append(year)
+        for name, values in (('genre', genres), ('style', styles)):
+            vocabulary = self.vocabularies[name]
+            codes = [vocabulary.setdefault(value, len(vocabulary)) for value in values[:255]]
+            buffers[_LIST_COLUMNS[name]].append(len(codes))
+            buffers[f'{name}_codes'].extend(codes)
+        self.rows += 1
+        if self.rows % FLUSH_ROWS == 0:
+            self.flush()
+
+    def flush(self):
+        for name, buffer in self._buffers.items():
+            buffer.tofile(self._files[name])
+            del buffer[:]
+
+    def close(self):
+        self.flush()
+        for f in self._files.values():
+            f.close()
+
+
+def _csr_offsets(counts):
+    """Offsets de inicio de cada lista (longitud filas + 1) en el tipo más chico que alcanza"""
+    import numpy as np
+
+    total = int(counts.sum(dtype=np.int64))
+    offsets = np.zeros(len(counts) + 1, dtype=np.uint32 if total < 2 ** 32 else np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _reorder_lists(counts, codes, order):
+    """Reordena listas de códigos (counts + codes concatenados) según el orden de las filas"""
+    import numpy as np
+
+    starts = _csr_offsets(counts)[:-1].astype(np.int64)[order]
+    new_counts = counts[order]
+    new_starts = _csr_offsets(new_counts)[:-1].astype(np.int64)
+    gather = np.repeat(starts - new_starts, new_counts) + np.arange(len(codes), dtype=np.int64)
+    return new_counts, codes[gather]
+
+
+def build_catalog(releases_dump, masters_dump=None, catalog_dir=CATALOG_DIR):
+    """
+    Construye el catálogo a partir de los volcados de Discogs y lo publica como versión actual.
+
+    Los volcados se leen en streaming (memoria constante salvo un array compacto con el año
+    de cada master); los lanzamientos se vuelcan por bloques a disco y al final se guardan
+    ordenados por release_id como arrays .npy que los lectores abren con mmap. El año original
+    es el del master si se conoce y, si no, el de la edición.
+
+    Args:
+        releases_dump: Ruta del volcado de lanzamientos (discogs_*_releases.xml[.gz])
+        masters_dump: Ruta opcional del volcado de masters (discogs_*_masters.xml[.gz])
+        catalog_dir: Directorio del catálogo
+
+    Returns:
+        dict: Metadatos del catálogo construido
+    """
+    import numpy as np
+
+    start = time.time()
+    build = time.strftime('%Y%m%d-%H%M%S') + f'-{uuid.uuid4().hex[:8]}'
+    builds_dir = os.path.join(catalog_dir, 'builds')
+    tmp_dir = os.path.join(builds_dir, f'{build}.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        master_ids, master_years = _read_masters(masters_dump) if masters_dump else (array('q'), array('h'))
+
+        writer = _ReleaseWriter(tmp_dir)
+        try:
+            for elem in iter_dump(releases_dump, 'release'):
+                master_text = elem.findtext('master_id')
+                writer.add(
+                    int(elem.get('id')),
+                    int(master_text) if master_text and master_text.strip().isdigit() else 0,
+                    parse_year(elem.findtext('released')),
+                    [genre.text for genre in elem.iterfind('genres/genre') if genre.text],
+                    [style.text for style in elem.iterfind('styles/style') if style.text],
+                )
+                if writer.rows % PROGRESS_EVERY == 0:
+                    logger.info(f"Volcado de lanzamientos: {writer.rows} procesados")
+        finally:
+            writer.close()
+
+        def raw(name, dtype):
+            return np.fromfile(writer.raw_path(name), dtype=dtype)
+
+        release_ids = raw('release_ids', np.int64)
+        release_masters = raw('master_ids', np.int32)
+        years = raw('years', np.int16)
+        lists = {name: (raw(counts, np.uint8), raw(f'{name}_codes', np.uint16))
+                 for name, counts in _LIST_COLUMNS.items()}
+
+        # Año original: el del master si el volcado de masters lo trae
+        if len(master_ids):
+            masters = np.frombuffer(master_ids, dtype=np.int64)
+            masters_order = np.argsort(masters, kind='stable')
+            masters = masters[masters_order]
+            masters_years = np.frombuffer(master_years, dtype=np.int16)[masters_order]
+            position = np.minimum(np.searchsorted(masters, release_masters), len(masters) - 1)
+            found = (release_masters > 0) & (masters[position] == release_masters)
+            years = np.where(found, masters_years[position], years).astype(np.int16)
+            from_master = int(found.sum())
+        else:
+            from_master = 0
+
+        # Los volcados vienen ordenados por id; si no, se ordenan aquí
+        if len(release_ids) > 1 and not bool(np.all(release_ids[1:] > release_ids[:-1])):
+            order = np.argsort(release_ids, kind='stable')
+            release_ids, release_masters, years = release_ids[order], release_masters[order], years[order]
+            lists = {name: _reorder_lists(counts, codes, order) for name, (counts, codes) in lists.items()}
+
+        np.save(os.path.join(tmp_dir, 'release_ids.npy'), release_ids)
+        np.save(os.path.join(tmp_dir, 'master_ids.npy'), release_masters)
+        np.save(os.path.join(tmp_dir, 'years.npy'), years)
+        for name, (counts, codes) in lists.items():
+            np.save(os.path.join(tmp_dir, f'{name}_offsets.npy'), _csr_offsets(counts))
+            np.save(os.path.join(tmp_dir, f'{name}_codes.npy'), codes)
+        for name in list(_FIXED_COLUMNS) + [f'{name}_codes' for name in _LIST_COLUMNS]:
+            os.remove(writer.raw_path(name))
+
+        meta = {
+            'format': CATALOG_FORMAT,
+            'build': build,
+            'rows': int(len(release_ids)),
+            'with_year': int((years > 0).sum()),
+            'from_master': from_master,
+            'masters': len(master_ids),
+            'genres': list(writer.vocabularies['genre']),
+            'styles': list(writer.vocabularies['style']),
+            'sources': [os.path.basename(path) for path in (masters_dump, releases_dump) if path],
+            'built_at': time.time(),
+            'seconds': round(time.time() - start, 2),
+        }
+        atomic_write_json(os.path.join(tmp_dir, 'meta.json'), meta)
+        os.replace(tmp_dir, os.path.join(builds_dir, build))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Publicar la versión nueva; los procesos que tienen abierta la anterior la siguen leyendo
+    # desde sus mmap aunque se borren los archivos
+    atomic_write_json(os.path.join(catalog_dir, 'current.json'), {'build': build})
+    for entry in os.scandir(builds_dir):
+        if entry.name != build and not entry.name.endswith('.tmp'):
+            shutil.rmtree(entry.path, ignore_errors=True)
+    logger.info(f"Catálogo {build} construido: {meta['rows']} lanzamientos, {meta['with_year']} con año "
+                f"({from_master} del master) en {meta['seconds']}s")
+    return meta
+
+
+class ReleaseCatalog:
+    """
+    Catálogo de lanzamientos mapeado en memoria de solo lectura.
+
+    Los release_id están ordenados, así que una búsqueda es un searchsorted sobre
+    el array mapeado; géneros y estilos se guardan como listas de códigos
+    (offsets + códigos) sobre un vocabulario que está en meta.json.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self.meta = read_json(os.path.join(path, 'meta.json'))
+        if not self.meta or self.meta.get('format') != CATALOG_FORMAT:
+            raise ValueError(f"Catálogo con formato desconocido en {path}")
+        self.build = self.meta['build']
+
+        def load(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        self.release_ids = load('release_ids')
+        self.master_ids = load('master_ids')
+        self.years = load('years')
+        self._lists = {name: (load(f'{name}_offsets'), load(f'{name}_codes'), self.meta[f'{name}s'])
+                       for name in _LIST_COLUMNS}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def _position(self, release_id):
+        release_id = as_release_id(release_id)
+        if release_id is None or not len(self.release_ids):
+            return None
+        position = int(self.release_ids.searchsorted(release_id))
+        if position < len(self.release_ids) and int(self.release_ids[position]) == release_id:
+            self.stats['hits'] += 1
+            return position
+        self.stats['misses'] += 1
+        return None
+
+    def _values(self, name, position):
+        offsets, codes, vocabulary = self._lists[name]
+        return [vocabulary[code] for code in codes[int(offsets[position]):int(offsets[position + 1])].tolist()]
+
+    def lookup(self, release_id):
+        """
+        Datos de un lanzamiento
+
+        Args:
+            release_id: ID de lanzamiento de Discogs
+
+        Returns:
+            dict: release_id, master_id, original_release_year, genres y styles (None/0 si se
+                  desconocen) o None si el lanzamiento no está en el catálogo
+        """
+        position = self._position(release_id)
+        if position is None:
+            return None
+        return {
+            'release_id': int(self.release_ids[position]),
+            'master_id': int(self.master_ids[position]) or None,
+            'original_release_year': int(self.years[position]) or None,
+            'genres': self._values('genre', position),
+            'styles': self._values('style', position),
+        }
+
+    def original_year(self, release_id):
+        """Año original de un lanzamiento o None si no está en el catálogo o no tiene año"""
+        position = self._position(release_id)
+        return None if position is None else int(self.years[position]) or None
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_release_catalog(catalog_dir=CATALOG_DIR):
+    """
+    Devuelve el catálogo actual (se reabre si se construyó una versión nueva)
+
+    Returns:
+        ReleaseCatalog: Catálogo o None si está deshabilitado o no se construyó
+    """
+    global _catalog
+    if not CATALOG_ENABLED:
+        return None
+    current = read_json(os.path.join(catalog_dir, 'current.json'))
+    if not current:
+        return None
+    with _catalog_lock:
+        if _catalog is None or _catalog.build != current['build']:
+            try:
+                catalog = ReleaseCatalog(os.path.join(catalog_dir, 'builds', current['build']))
+            except (OSError, ValueError) as e:
+                logger.error(f"No se pudo abrir el catálogo {current['build']}: {e}")
+                return _catalog
+            if _catalog is None:
+                REGISTRY.register_cache('release_catalog', lambda: dict(_catalog.stats, rows=len(_catalog)))
+            _catalog = catalog
+            logger.info(f"Catálogo de lanzamientos {catalog.build} abierto: {len(catalog)} lanzamientos")
+        return _catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('releases', help="Volcado de lanzamientos (discogs_*_releases.xml[.gz])")
+    parser.add_argument('--masters', help="Volcado de masters (discogs_*_masters.xml[.gz]) para el año original")
+    parser.add_argument('--catalog-dir', default=CATALOG_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    meta = build_catalog(args.releases, args.masters, args.catalog_dir)
+    print(f"{meta['rows']} lanzamientos, {meta['with_year']} con año ({meta['from_master']} del master), "
+          f"{len(meta['genres'])} géneros, {len(meta['styles'])} estilos en {meta['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
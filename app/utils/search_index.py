@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import unicodedata
+from app.utils.shared_store import CollectionArtifactCache
+
+logger = logging.getLogger(__name__)
+
+# Campo de búsqueda -> (columna de la colección procesada, peso en la puntuación)
+SEARCH_FIELDS = {
+    'artist': ('Artist', 3.0),
+    'title': ('Title', 3.0),
+    'label': ('Label', 1.5),
+    'track': ('tracklist', 1.0),
+}
+
+# Peso relativo según cómo coincidió cada término de la consulta
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.4
+
+# Órdenes disponibles para recorrer la colección con cursor
+SORT_KEYS = ('artist', 'title', 'row')
+
+# Términos de una consulta que se tienen en cuenta
+MAX_QUERY_TERMS = 10
+
+# Índices cargados por proceso (los arrays están mapeados, solo el vocabulario vive en memoria)
+MAX_LOADED_INDEXES = 8
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+# Posición al inicio de cada pista de la tracklist resumida: "A1. Título"
+_TRACK_POSITION = re.compile(r'^\s*[\w-]+\.\s+')
+
+
+def normalize(text):
+    """Pasa a minúsculas y quita tildes para comparar texto"""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    """
+    Divide un texto en términos normalizados
+
+    Args:
+        text: Texto (los valores faltantes no generan términos)
+
+    Returns:
+        list: Términos en orden de aparición
+    """
+    if text is None or (isinstance(text, float) and text != text):
+        return []
+    return _TOKEN.findall(normalize(text))
+
+
+def tokenize_tracklist(text):
+    """Términos de los títulos de una tracklist resumida, sin posiciones ni el '... (+N más)' final"""
+    if not isinstance(text, str):
+        return []
+    tokens = []
+    for segment in text.split(';'):
+        segment = segment.strip()
+        if not segment or segment.startswith('...'):
+            continue
+        tokens.extend(tokenize(_TRACK_POSITION.sub('', segment)))
+    return tokens
+
+
+def _trigrams(term):
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    """Distancia de Levenshtein, cortando en cuanto supera el límite"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _encode_strings(strings):
+    import numpy as np
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets, blob):
+    data = bytes(blob)
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def _csr(keys, values, size):
+    """
+    Agrupa pares (clave, valor) en formato CSR: valores ordenados por clave y offsets por clave
+
+    Returns:
+        tuple: (valores int32 sin duplicados por clave, offsets int64 de tamaño size + 1)
+    """
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    if len(keys):
+        # Ordenar por (clave, valor) y quitar duplicados codificando cada par en un entero
+        width = int(values.max()) + 1
+        pairs = np.unique(keys * width + values)
+        keys, values = pairs // width, pairs % width
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(keys, minlength=size))
+    return values.astype(np.int32), offsets
+
+
+class SearchIndex:
+    """
+    Índice invertido de una versión de la colección.
+
+    Un único vocabulario ordenado de términos normalizados; por cada campo, las
+    filas de cada término como arrays enteros en formato CSR (postings +
+    offsets). Como los términos están ordenados, todos los que empiezan por un
+    prefijo son un rango contiguo y sus filas un único tramo del array. Los
+    errores de tipeo se resuelven con un índice de trigramas sobre el
+    vocabulario y una verificación por distancia de edición.
+    """
+
+    def __init__(self, version, rows, terms, arrays):
+        import numpy as np
+
+        self.version = version
+        self.rows = rows
+        self.terms = terms
+        self.arrays = arrays
+        self.trigrams = arrays.pop('trigram_keys')
+        self.term_lengths = np.fromiter((len(term) for term in terms), dtype=np.int32, count=len(terms))
+
+    @classmethod
+    def build(cls, collection, version):
+        """
+        Construye el índice a partir de la colección procesada
+
+        Args:
+            collection: Secuencia de registros (SharedCollection o lista de diccionarios)
+            version: Identificador de la versión de la colección
+
+        Returns:
+            SearchIndex: Índice en memoria
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        rows = len(collection)
+        vocabulary = {}
+        pairs = {}
+        for field, (column, _) in SEARCH_FIELDS.items():
+            values = _column_values(collection, column)
+            if values is None:
+                pairs[field] = ([], [])
+                continue
+            tokenizer = tokenize_tracklist if field == 'track' else tokenize
+            # Los valores repetidos (artistas, sellos) se tokenizan una sola vez
+            cache = {}
+            term_ids, row_ids = [], []
+            for row, value in enumerate(values):
+                key = value if isinstance(value, str) else None
+                ids = cache.get(key)
+                if ids is None:
+                    ids = [vocabulary.setdefault(term, len(vocabulary)) for term in set(tokenizer(value))]
+                    if key is not None:
+                        cache[key] = ids
+                term_ids.extend(ids)
+                row_ids.extend([row] * len(ids))
+            pairs[field] = (term_ids, row_ids)
+
+        # Renumerar los términos en orden alfabético para que los prefijos sean rangos contiguos
+        terms = sorted(vocabulary)
+        remap = np.empty(len(vocabulary), dtype=np.int64)
+        for new_id, term in enumerate(terms):
+            remap[vocabulary[term]] = new_id
+
+        arrays = {}
+        for field, (term_ids, row_ids) in pairs.items():
+            mapped = remap[np.asarray(term_ids, dtype=np.int64)] if term_ids else []
+            arrays[f'postings_{field}'], arrays[f'offsets_{field}'] = _csr(mapped, row_ids, len(terms))
+
+        trigram_keys = sorted({gram for term in terms for gram in _trigrams(term)})
+        trigram_ids = {gram: i for i, gram in enumerate(trigram_keys)}
+        gram_ids, gram_terms = [], []
+        for term_id, term in enumerate(terms):
+            for gram in _trigrams(term):
+                gram_ids.append(trigram_ids[gram])
+                gram_terms.append(term_id)
+        arrays['trigram_terms'], arrays['trigram_offsets'] = _csr(gram_ids, gram_terms, len(trigram_keys))
+        arrays['trigram_keys'] = trigram_keys
+
+        # Órdenes precalculados para recorrer la colección con cursor
+        artists = _column_values(collection, 'Artist') or [''] * rows
+        titles = _column_values(collection, 'Title') or [''] * rows
+        norm_artists = [normalize(v) if isinstance(v, str) else '' for v in artists]
+        norm_titles = [normalize(v) if isinstance(v, str) else '' for v in titles]
+        arrays['order_artist'] = np.array(sorted(range(rows), key=lambda r: (norm_artists[r], norm_titles[r])),
+                                          dtype=np.int32)
+        arrays['order_title'] = np.array(sorted(range(rows), key=lambda r: (norm_titles[r], norm_artists[r])),
+                                         dtype=np.int32)
+
+        logger.info(f"Índice de búsqueda construido: {rows} filas, {len(terms)} términos "
+                    f"en {time.perf_counter() - start:.2f}s")
+        return cls(version, rows, terms, arrays)
+
+    def save(self, directory):
+        """Guarda el índice en un directorio (un .npy por array y meta.json)"""
+        import numpy as np
+
+        term_offsets, term_blob = _encode_strings(self.terms)
+        gram_offsets, gram_blob = _encode_strings(self.trigrams)
+        files = dict(self.arrays, term_offsets=term_offsets, term_blob=term_blob,
+                     trigram_key_offsets=gram_offsets, trigram_key_blob=gram_blob)
+        for name, array in files.items():
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': self.version, 'rows': self.rows, 'arrays': sorted(self.arrays)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Carga un índice guardado, mapeando sus arrays en memoria"""
+        import numpy as np
+
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        load = lambda name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')  # noqa: E731
+        terms = _decode_strings(load('term_offsets'), load('term_blob'))
+        arrays = {name: load(name) for name in meta['arrays']}
+        arrays['trigram_keys'] = _decode_strings(load('trigram_key_offsets'), load('trigram_key_blob'))
+        return cls(meta['version'], meta['rows'], terms, arrays)
+
+    def _prefix_range(self, prefix):
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + '\uffff', lo)
+        return lo, hi
+
+    def _fuzzy_terms(self, token, max_distance):
+        """Términos del vocabulario a distancia de edición <= max_distance del token"""
+        import numpy as np
+
+        grams = _trigrams(token)
+        slices = []
+        offsets = self.arrays['trigram_offsets']
+        for gram in grams:
+            i = bisect.bisect_left(self.trigrams, gram)
+            if i < len(self.trigrams) and self.trigrams[i] == gram:
+                slices.append(self.arrays['trigram_terms'][offsets[i]:offsets[i + 1]])
+        if not slices:
+            return []
+        counts = np.bincount(np.concatenate(slices), minlength=len(self.terms))
+        # Lema de q-gramas: cada edición destruye como mucho 3 trigramas
+        threshold = max(1, len(grams) - 3 * max_distance)
+        candidates = np.nonzero((counts >= threshold) &
+                                (np.abs(self.term_lengths - len(token)) <= max_distance))[0]
+        if len(candidates) > 2000:
+            candidates = candidates[np.argsort(-counts[candidates], kind='stable')[:2000]]
+        return [int(t) for t in candidates if _edit_distance(token, self.terms[t], max_distance) <= max_distance]
+
+    def search(self, query, fields=None, limit=20, fuzzy=True):
+        """
+        Busca registros cuyos campos contengan todos los términos de la consulta
+        (por prefijo, o con errores de tipeo si fuzzy está activo)
+
+        Args:
+            query: Texto de búsqueda
+            fields: Campos donde buscar (por defecto, todos los de SEARCH_FIELDS)
+            limit: Cantidad máxima de resultados
+            fuzzy: Si es True, acepta términos con 1-2 errores de tipeo
+
+        Returns:
+            tuple: (lista de (fila, puntuación), total de coincidencias)
+        """
+        import numpy as np
+
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not tokens or not self.rows:
+            return [], 0
+        fields = [f for f in (fields or SEARCH_FIELDS) if f in SEARCH_FIELDS]
+        scores = np.zeros(self.rows, dtype=np.float64)
+        matched = np.zeros(self.rows, dtype=np.int16)
+
+        for token in tokens:
+            lo, hi = self._prefix_range(token)
+            exact = lo if lo < len(self.terms) and self.terms[lo] == token else None
+            fuzzy_ids = []
+            if fuzzy and exact is None and len(token) >= 4:
+                fuzzy_ids = self._fuzzy_terms(token, 1 if len(token) <= 5 else 2)
+
+            segments, weights = [], []
+            for field in fields:
+                weight = SEARCH_FIELDS[field][1]
+                postings = self.arrays[f'postings_{field}']
+                offsets = self.arrays[f'offsets_{field}']
+                segments.append(postings[offsets[lo]:offsets[hi]])
+                weights.append(weight * PREFIX_WEIGHT)
+                if exact is not None:
+                    segments.append(postings[offsets[exact]:offsets[exact + 1]])
+                    weights.append(weight * (EXACT_WEIGHT - PREFIX_WEIGHT))
+                for term_id in fuzzy_ids:
+                    segments.append(postings[offsets[term_id]:offsets[term_id + 1]])
+                    weights.append(weight * FUZZY_WEIGHT)
+            lengths = [len(segment) for segment in segments]
+            if not sum(lengths):
+                return [], 0
+            # bincount acumula la puntuación de todas las filas del término de una vez
+            token_scores = np.bincount(np.concatenate(segments), weights=np.repeat(weights, lengths),
+                                       minlength=self.rows)
+            scores += token_scores
+            matched += token_scores > 0
+
+        hits = np.nonzero(matched == len(tokens))[0]
+        if not len(hits):
+            return [], 0
+        # Mayor puntuación primero; a igual puntuación, orden de la colección
+        order = np.lexsort((hits, -scores[hits]))[:limit]
+        return [(int(hits[i]), round(float(scores[hits[i]]), 3)) for i in order], len(hits)
+
+    def page(self, sort='artist', position=0, limit=50):
+        """
+        Devuelve una página de filas en el orden indicado
+
+        Args:
+            sort: Orden ('artist', 'title' o 'row')
+            position: Posición inicial dentro del orden
+            limit: Tamaño de la página
+
+        Returns:
+            list: Números de fila de la página
+        """
+        end = min(position + limit, self.rows)
+        if position >= end:
+            return []
+        if sort == 'row':
+            return list(range(position, end))
+        return self.arrays[f'order_{sort}'][position:end].tolist()
+
+
+def _column_values(collection, column):
+    if hasattr(collection, 'column'):
+        return collection.column(column) if column in collection.columns else None
+    if not collection or column not in collection[0]:
+        return None
+    return [record.get(column) for record in collection]
+
+
+_indexes = CollectionArtifactCache('search_index', SearchIndex, MAX_LOADED_INDEXES)
+
+
+def get_search_index(collection, collection_path):
+    """
+    Devuelve el índice de búsqueda de una colección, construyéndolo una vez por versión.
+    Con el almacén compartido, el índice se guarda junto a la versión y lo mapean todos los workers.
+
+    Args:
+        collection: Colección procesada (resultado de load_processed_collection)
+        collection_path: Ruta del CSV de origen
+
+    Returns:
+        SearchIndex: Índice de la versión actual
+    """
+    return _indexes.get(collection, collection_path)
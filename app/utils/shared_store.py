@@ -0,0 +1,504 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from collections.abc import Sequence
+from app.config import SHARED_STORE_DIR
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Cambiar si cambia el formato de los archivos: las versiones antiguas quedan en otro directorio
+STORE_FORMAT = 'v1'
+
+# Directorios temporales abandonados (p. ej. un worker que murió escribiendo) se borran tras este tiempo
+STALE_TMP_SECONDS = 3600
+
+# Filas decodificadas por bloque al iterar una colección
+ITER_CHUNK_ROWS = 4096
+
+_MISSING = float('nan')
+
+# Evita que dos hilos del mismo proceso construyan a la vez el mismo índice derivado
+_artifact_lock = threading.Lock()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _StringColumn:
+    """Columna de texto como códigos categóricos sobre un bloque UTF-8 compartido"""
+
+    def __init__(self, codes, offsets, blob):
+        self.codes = codes
+        self.offsets = offsets
+        self.blob = blob
+        # Caché acotada de categorías decodificadas (el bloque sigue en memoria compartida)
+        self.category = functools.lru_cache(maxsize=8192)(self._decode)
+
+    def _decode(self, code):
+        return bytes(self.blob[self.offsets[code]:self.offsets[code + 1]]).decode('utf-8')
+
+    def categories(self):
+        return [self.category(code) for code in range(len(self.offsets) - 1)]
+
+    def value(self, row):
+        code = int(self.codes[row])
+        return _MISSING if code < 0 else self.category(code)
+
+    def values(self, start, stop):
+        category = self.category
+        return [_MISSING if code < 0 else category(code) for code in self.codes[start:stop].tolist()]
+
+
+class _NumericColumn:
+    """Columna numérica guardada tal cual (NaN para valores faltantes)"""
+
+    def __init__(self, values):
+        self.array = values
+
+    def value(self, row):
+        return self.array[row].item()
+
+    def values(self, start, stop):
+        return self.array[start:stop].tolist()
+
+
+class SharedCollection(Sequence):
+    """
+    Colección procesada mapeada en memoria de solo lectura.
+
+    Se comporta como una lista de diccionarios (uno por disco), pero los datos
+    viven en archivos .npy mapeados con mmap: todos los procesos que abren la
+    misma versión comparten las mismas páginas de memoria.
+    """
+
+    def __init__(self, path, meta, columns):
+        self.path = path
+        self.meta = meta
+        self.columns = [column['name'] for column in meta['columns']]
+        self._columns = columns
+        self._by_name = dict(zip(self.columns, columns))
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return {name: column.value(index) for name, column in zip(self.columns, self._columns)}
+
+    def __iter__(self):
+        for start in range(0, len(self), ITER_CHUNK_ROWS):
+            stop = min(start + ITER_CHUNK_ROWS, len(self))
+            chunk = [column.values(start, stop) for column in self._columns]
+            for values in zip(*chunk):
+                yield dict(zip(self.columns, values))
+
+    def column(self, name):
+        """
+        Devuelve todos los valores de una columna decodificados
+
+        Args:
+            name: Nombre de la columna
+
+        Returns:
+            list: Valores de la columna (NaN para los faltantes)
+        """
+        return self._by_name[name].values(0, len(self))
+
+    def array(self, name):
+        """
+        Devuelve el array mapeado de una columna numérica
+
+        Returns:
+            numpy.ndarray: Valores de la columna (NaN para los faltantes) o None si la columna es de texto
+        """
+        column = self._by_name[name]
+        return column.array if isinstance(column, _NumericColumn) else None
+
+    def codes(self, name):
+        """
+        Devuelve los códigos categóricos (array mapeado, -1 = faltante) y las categorías de una columna de texto
+
+        Returns:
+            tuple: (array de códigos, lista de categorías)
+        """
+        column = self._by_name[name]
+        return column.codes, column.categories()
+
+    def artifact_dir(self, name, build):
+        """
+        Devuelve el directorio de un índice derivado de esta versión (búsqueda, facetas...),
+        construyéndolo una sola vez. Se publica con un rename atómico, igual que la versión.
+
+        Args:
+            name: Nombre del índice
+            build: Función build(directorio) que escribe los archivos, incluido meta.json
+
+        Returns:
+            str: Ruta del directorio del índice
+        """
+        path = os.path.join(self.path, name)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            return path
+        with _artifact_lock:
+            if os.path.exists(os.path.join(path, 'meta.json')):
+                return path
+            tmp_dir = os.path.join(self.path, f".tmp-{name}-{os.getpid()}-{threading.get_ident()}")
+            os.makedirs(tmp_dir, exist_ok=True)
+            try:
+                build(tmp_dir)
+                os.rename(tmp_dir, path)
+                logger.info(f"Índice '{name}' publicado en {path}")
+            except OSError:
+                # Otro worker lo publicó primero
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not os.path.exists(os.path.join(path, 'meta.json')):
+                    raise
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        return path
+
+
+class CollectionArtifactCache:
+    """
+    Índices derivados de las colecciones (búsqueda, facetas...) cargados en el proceso, uno por
+    versión de la colección y como mucho max_loaded a la vez (se descartan los usados hace más
+    tiempo). Con el almacén compartido, cada índice se guarda junto a la versión y lo mapean
+    todos los workers; sin él, se construye en memoria.
+
+    index_class debe tener build(colección, versión), save(directorio) y load(directorio).
+    Las estadísticas se exportan en /metrics como la caché name.
+    """
+
+    def __init__(self, name, index_class, max_loaded):
+        self.name = name
+        self.index_class = index_class
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'builds': 0}
+        REGISTRY.register_cache(name, lambda: dict(self.stats, loaded=len(self._loaded)))
+
+    def get(self, collection, collection_path):
+        """
+        Devuelve el índice de una colección, construyéndolo una vez por versión
+
+        Args:
+            collection: Colección procesada (resultado de load_processed_collection)
+            collection_path: Ruta del CSV de origen
+
+        Returns:
+            object: Índice (instancia de index_class) de la versión actual
+        """
+        shared = hasattr(collection, 'artifact_dir')
+        if shared:
+            key = os.path.join(collection.path, self.name)
+            version = collection.meta['signature']
+        else:
+            stat = os.stat(collection_path)
+            key = version = f"{os.path.abspath(collection_path)}:{stat.st_mtime_ns}-{stat.st_size}"
+
+        with self._lock:
+            index = self._loaded.get(key)
+            if index is not None:
+                self._loaded.move_to_end(key)
+                self.stats['hits'] += 1
+                return index
+        self.stats['misses'] += 1
+
+        if shared:
+            def build(directory):
+                self.stats['builds'] += 1
+                self.index_class.build(collection, version).save(directory)
+            index = self.index_class.load(collection.artifact_dir(self.name, build))
+        else:
+            self.stats['builds'] += 1
+            index = self.index_class.build(collection, version)
+
+        with self._lock:
+            self._loaded[key] = index
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+
+class SharedCollectionStore:
+    """
+    Almacén en disco de colecciones procesadas, compartido entre workers.
+
+    Estructura: <dir>/<formato>/<clave de la colección>/<versión>/ donde la
+    versión depende de la fecha de modificación y el tamaño del CSV de origen.
+    Cada versión contiene meta.json y un .npy por array, y un subdirectorio
+    refs/ con un archivo por PID que la tiene abierta. Las versiones que ya no
+    son la actual se borran cuando ningún proceso vivo las referencia.
+    """
+
+    def __init__(self, root=SHARED_STORE_DIR):
+        self.root = os.path.join(root, STORE_FORMAT)
+        self._lock = threading.Lock()
+        # Ruta de origen -> (firma, SharedCollection, pid que la abrió)
+        self._open = {}
+        self.stats = {'hits': 0, 'misses': 0, 'builds': 0, 'removed_versions': 0}
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _signature(source_path):
+        stat = os.stat(source_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _collection_dir(self, source_path):
+        key = hashlib.sha256(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, key)
+
+    def get_or_build(self, source_path, build_frame):
+        """
+        Devuelve la colección procesada de un CSV, construyéndola una sola vez por versión
+
+        Args:
+            source_path: Ruta del CSV de origen
+            build_frame: Función sin argumentos que devuelve el DataFrame procesado
+
+        Returns:
+            SharedCollection: Colección mapeada en memoria
+        """
+        signature = self._signature(source_path)
+        with self._lock:
+            cached = self._open.get(source_path)
+            if cached and cached[0] == signature and cached[2] == os.getpid():
+                self.stats['hits'] += 1
+                return cached[1]
+
+        version_dir = os.path.join(self._collection_dir(source_path), signature)
+        if os.path.exists(os.path.join(version_dir, 'meta.json')):
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            self._publish(build_frame(), source_path, signature, version_dir)
+
+        collection = self._map(version_dir)
+        self._add_ref(version_dir)
+        with self._lock:
+            previous = self._open.get(source_path)
+            self._open[source_path] = (signature, collection, os.getpid())
+        if previous and previous[1].path != version_dir:
+            self._remove_ref(previous[1].path)
+            self.cleanup(source_path)
+        return collection
+
+    def _publish(self, frame, source_path, signature, version_dir):
+        """Escribe una versión en un directorio temporal y la publica con un rename atómico"""
+        import numpy as np
+        import pandas as pd
+
+        collection_dir = os.path.dirname(version_dir)
+        os.makedirs(collection_dir, exist_ok=True)
+        tmp_dir = os.path.join(collection_dir, f".tmp-{signature}-{os.getpid()}-{threading.get_ident()}")
+        os.makedirs(tmp_dir, exist_ok=True)
+        columns = []
+        try:
+            for index, name in enumerate(frame.columns):
+                series = frame[name]
+                prefix = os.path.join(tmp_dir, str(index))
+                if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                    np.save(prefix + '.values.npy', series.to_numpy())
+                    columns.append({'name': name, 'kind': 'numeric'})
+                    continue
+                codes, uniques = pd.factorize(series)
+                encoded = [str(value).encode('utf-8') for value in uniques]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+                np.save(prefix + '.codes.npy', codes.astype(np.int32))
+                np.save(prefix + '.offsets.npy', offsets)
+                np.save(prefix + '.blob.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+                columns.append({'name': name, 'kind': 'string'})
+
+            meta = {'source': os.path.abspath(source_path), 'signature': signature, 'rows': len(frame),
+                    'columns': columns, 'created_at': time.time()}
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            os.makedirs(os.path.join(tmp_dir, 'refs'), exist_ok=True)
+            os.rename(tmp_dir, version_dir)
+            self.stats['builds'] += 1
+            logger.info(f"Colección procesada publicada en el almacén compartido: {version_dir} ({len(frame)} filas)")
+        except OSError:
+            # Otro worker publicó la misma versión primero: usar la suya
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(version_dir, 'meta.json')):
+                raise
+
+    @staticmethod
+    def _map(version_dir):
+        import numpy as np
+
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        columns = []
+        for index, column in enumerate(meta['columns']):
+            prefix = os.path.join(version_dir, str(index))
+            load = functools.partial(np.load, mmap_mode='r')
+            if column['kind'] == 'numeric':
+                columns.append(_NumericColumn(load(prefix + '.values.npy')))
+            else:
+                columns.append(_StringColumn(load(prefix + '.codes.npy'), load(prefix + '.offsets.npy'),
+                                             load(prefix + '.blob.npy')))
+        return SharedCollection(version_dir, meta, columns)
+
+    @staticmethod
+    def _add_ref(version_dir):
+        refs_dir = os.path.join(version_dir, 'refs')
+        os.makedirs(refs_dir, exist_ok=True)
+        open(os.path.join(refs_dir, str(os.getpid())), 'a').close()
+
+    @staticmethod
+    def _remove_ref(version_dir):
+        try:
+            os.remove(os.path.join(version_dir, 'refs', str(os.getpid())))
+        except OSError:
+            pass
+
+    def release_all(self):
+        """Libera las referencias de este proceso (se llama al salir)"""
+        with self._lock:
+            opened = [entry for entry in self._open.values() if entry[2] == os.getpid()]
+            self._open.clear()
+        for _, collection, _ in opened:
+            self._remove_ref(collection.path)
+
+    def collection_dir(self, source_path):
+        """Directorio de las versiones de un CSV (incluye sus índices derivados)"""
+        return self._collection_dir(source_path)
+
+    def remove_source(self, source_path):
+        """
+        Borra todas las versiones de un CSV y sus índices derivados (p. ej. al borrar la
+        colección). Los procesos que las tengan mapeadas conservan los datos hasta soltarlos.
+
+        Returns:
+            bool: True si había algo que borrar
+        """
+        with self._lock:
+            opened = self._open.pop(source_path, None)
+        if opened and opened[2] == os.getpid():
+            self._remove_ref(opened[1].path)
+        collection_dir = self._collection_dir(source_path)
+        if not os.path.isdir(collection_dir):
+            return False
+        shutil.rmtree(collection_dir, ignore_errors=True)
+        self.stats['removed_versions'] += 1
+        logger.info(f"Versiones del almacén compartido eliminadas: {collection_dir}")
+        return True
+
+    def cleanup(self, source_path=None):
+        """
+        Borra las versiones que ya no corresponden al CSV de origen y que ningún
+        proceso vivo tiene abiertas, las de CSV que ya no existen (aunque estén
+        abiertas) y los temporales abandonados
+
+        Args:
+            source_path: Revisar solo las versiones de este CSV (al cambiar su versión);
+                         None recorre todo el almacén (lo hace el límite de disco en segundo plano)
+        """
+        now = time.time()
+        if source_path is not None:
+            self._cleanup_collection(self._collection_dir(source_path), now)
+            return
+        for collection_entry in os.scandir(self.root):
+            if collection_entry.is_dir():
+                self._cleanup_collection(collection_entry.path, now)
+
+    def _cleanup_collection(self, collection_dir, now):
+        try:
+            entries = list(os.scandir(collection_dir))
+        except OSError:
+            return
+        for version_entry in entries:
+            if not version_entry.is_dir():
+                continue
+            if version_entry.name.startswith('.tmp-'):
+                if now - version_entry.stat().st_mtime > STALE_TMP_SECONDS:
+                    shutil.rmtree(version_entry.path, ignore_errors=True)
+                continue
+            if self._is_current(version_entry.path):
+                continue
+            if self._source_exists(version_entry.path) and self._live_refs(version_entry.path):
+                continue
+            shutil.rmtree(version_entry.path, ignore_errors=True)
+            self.stats['removed_versions'] += 1
+            logger.info(f"Versión del almacén compartido eliminada: {version_entry.path}")
+        try:
+            os.rmdir(collection_dir)
+        except OSError:
+            pass
+
+    @classmethod
+    def _is_current(cls, version_dir):
+        try:
+            with open(os.path.join(version_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            return cls._signature(meta['source']) == meta['signature']
+        except (OSError, ValueError, KeyError):
+            return False
+
+    @staticmethod
+    def _source_exists(version_dir):
+        try:
+            with open(os.path.join(version_dir, 'meta.json')) as f:
+                return os.path.exists(json.load(f)['source'])
+        except (OSError, ValueError, KeyError):
+            return False
+
+    @staticmethod
+    def _live_refs(version_dir):
+        """Devuelve los PID vivos que referencian una versión, borrando los de procesos muertos"""
+        refs_dir = os.path.join(version_dir, 'refs')
+        live = []
+        if not os.path.isdir(refs_dir):
+            return live
+        for ref in os.scandir(refs_dir):
+            try:
+                pid = int(ref.name)
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                live.append(pid)
+            else:
+                try:
+                    os.remove(ref.path)
+                except OSError:
+                    pass
+        return live
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Devuelve el almacén compartido del proceso"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = SharedCollectionStore()
+            atexit.register(_shared_store.release_all)
+            REGISTRY.register_cache('shared_store', lambda: dict(_shared_store.stats))
+        return _shared_store
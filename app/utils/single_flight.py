@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from app.config import SINGLE_FLIGHT_DIR, SINGLE_FLIGHT_TIMEOUT_SECONDS, SINGLE_FLIGHT_RESULT_TTL_SECONDS
+from app.utils.fileio import atomic_path
+from app.utils.metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows: la coalescencia solo funciona dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre intentos de tomar el candado de otro proceso
+POLL_SECONDS = 0.05
+
+# Intervalo mínimo entre limpiezas de resultados viejos
+PRUNE_INTERVAL_SECONDS = 60.0
+
+
+class _Call:
+    """Ejecución en curso dentro del proceso, con su resultado para los que esperan"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def flight_key(operation, *args):
+    """
+    Clave de una operación con sus argumentos normalizados
+
+    Args:
+        operation: Nombre de la operación
+        *args: Argumentos que distinguen una ejecución de otra (serializables en JSON)
+
+    Returns:
+        str: Hash de la operación y sus argumentos
+    """
+    raw = json.dumps([operation, *args], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class SingleFlight:
+    """
+    Coalescencia de trabajo duplicado: las llamadas concurrentes con la misma clave
+    comparten una sola ejecución y su resultado.
+
+    Dentro del proceso, la primera llamada ejecuta y las demás esperan su resultado (o su
+    excepción). Entre procesos, la ejecución se protege con un candado flock por clave en
+    SINGLE_FLIGHT_DIR: quien lo obtiene guarda el resultado (pickle, con reemplazo atómico)
+    y los procesos que esperaban el candado lo leen en lugar de repetir el trabajo. Si el
+    resultado no se puede compartir o la espera supera SINGLE_FLIGHT_TIMEOUT_SECONDS, la
+    llamada ejecuta por su cuenta.
+    """
+
+    def __init__(self, directory=SINGLE_FLIGHT_DIR, timeout=SINGLE_FLIGHT_TIMEOUT_SECONDS,
+                 result_ttl=SINGLE_FLIGHT_RESULT_TTL_SECONDS):
+        self.directory = directory
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        # hits: llamadas que reutilizaron la ejecución de otra; misses: ejecuciones reales
+        self.stats = {'hits': 0, 'misses': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def do(self, operation, args, fn):
+        """
+        Ejecuta fn una sola vez para todas las llamadas concurrentes con la misma operación y argumentos
+
+        Args:
+            operation: Nombre de la operación (también etiqueta las métricas)
+            args: Tupla de argumentos normalizados que identifican la ejecución
+            fn: Función sin argumentos que hace el trabajo
+
+        Returns:
+            Resultado de fn (el mismo objeto para todas las llamadas del proceso)
+        """
+        key = flight_key(operation, *args)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.timeout):
+                self._count('shared_in_process', operation)
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            logger.warning(f"Tiempo de espera agotado para {operation}; se ejecuta sin coalescencia")
+            return fn()
+
+        try:
+            call.result = self._run_exclusive(operation, key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run_exclusive(self, operation, key, fn):
+        """Ejecuta fn con el candado de la clave o reutiliza el resultado de otro proceso"""
+        if fcntl is None:
+            self._count('executed', operation)
+            return fn()
+        started = time.time()
+        result_path = os.path.join(self.directory, f'{key}.result')
+        with self._file_lock(os.path.join(self.directory, f'{key}.lock')) as (acquired, waited):
+            if waited and acquired:
+                # Otro proceso hizo el mismo trabajo mientras esperábamos: usar su resultado
+                shared = self._read_result(result_path, started)
+                if shared is not None:
+                    self._count('shared_across_processes', operation)
+                    return shared[0]
+            if not acquired:
+                logger.warning(f"Tiempo de espera agotado para {operation} en otro proceso; se ejecuta igualmente")
+            self._count('executed', operation)
+            result = fn()
+            if acquired:
+                self._write_result(result_path, result)
+        self._prune()
+        return result
+
+    @contextmanager
+    def _file_lock(self, path):
+        # Se devuelve si se obtuvo el candado y si hubo que esperarlo (otro proceso lo tenía)
+        with open(path, 'a+') as f:
+            waited = False
+            deadline = time.monotonic() + self.timeout
+            acquired = False
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except OSError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(POLL_SECONDS)
+            try:
+                yield acquired, waited
+            finally:
+                if acquired:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_result(path, since):
+        """(resultado,) si path se escribió después de since, o None"""
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, 'rb') as f:
+                return (pickle.load(f),)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ImportError) as e:
+            logger.debug(f"No se pudo leer el resultado compartido {path}: {e}")
+            return None
+
+    @staticmethod
+    def _write_result(path, result):
+        try:
+            with atomic_path(path) as tmp_path:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # Un resultado que no se puede serializar solo se comparte dentro del proceso
+            logger.debug(f"No se pudo guardar el resultado compartido {path}: {e}")
+
+    def _prune(self):
+        """
+        Borra los resultados que ya nadie puede estar esperando y los candados viejos (borrar
+        uno en uso solo haría que otra llamada no se coalesca: las escrituras siguen siendo atómicas)
+        """
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    age = now - entry.stat().st_mtime
+                    if ((entry.name.endswith('.result') and age > self.result_ttl)
+                            or (entry.name.endswith('.lock') and age > self.timeout + self.result_ttl)):
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+        except OSError as e:
+            logger.warning(f"No se pudieron limpiar los resultados de {self.directory}: {e}")
+
+    def _count(self, outcome, operation):
+        with self._lock:
+            self.stats['misses' if outcome == 'executed' else 'hits'] += 1
+        REGISTRY.inc('single_flight_calls_total', operation=operation, outcome=outcome)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Devuelve la instancia de coalescencia del proceso"""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+            REGISTRY.register_cache('single_flight', lambda: dict(_single_flight.stats))
+        return _single_flight
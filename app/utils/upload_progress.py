@@ -0,0 +1,95 @@
+import os
+import re
+import time
+import logging
+from app.config import UPLOADS_DIR
+from app.utils.fileio import atomic_write_json, read_json
+
+logger = logging.getLogger(__name__)
+
+# Identificadores de subida aceptados (los genera el navegador)
+_UPLOAD_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Intervalo mínimo entre escrituras del progreso
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# Los archivos de progreso se borran pasado este tiempo
+PROGRESS_TTL_SECONDS = 3600
+
+
+def valid_upload_id(upload_id):
+    return bool(upload_id) and bool(_UPLOAD_ID.match(upload_id))
+
+
+def _progress_path(upload_id):
+    return os.path.join(UPLOADS_DIR, 'progress', f'{upload_id}.json')
+
+
+class UploadProgress:
+    """
+    Progreso de una subida guardado en un JSON pequeño por subida, para que
+    cualquier worker pueda responder a las consultas del navegador mientras
+    otro procesa el archivo.
+    """
+
+    def __init__(self, upload_id, total_bytes=None):
+        self.upload_id = upload_id if valid_upload_id(upload_id) else None
+        self.state = {'stage': 'receiving', 'bytes': 0, 'total_bytes': total_bytes, 'rows': 0,
+                      'done': False, 'error': None, 'started_at': time.time()}
+        self._last_write = 0.0
+        if self.upload_id:
+            os.makedirs(os.path.dirname(_progress_path(self.upload_id)), exist_ok=True)
+            self._write()
+
+    def update(self, force=False, **fields):
+        """
+        Actualiza el progreso (se escribe como mucho cada PROGRESS_INTERVAL_SECONDS)
+
+        Args:
+            force: Escribir aunque no haya pasado el intervalo
+            **fields: Campos a actualizar (stage, bytes, rows, ...)
+        """
+        stage_changed = 'stage' in fields and fields['stage'] != self.state['stage']
+        self.state.update(fields)
+        if force or stage_changed or time.monotonic() - self._last_write >= PROGRESS_INTERVAL_SECONDS:
+            self._write()
+
+    def finish(self, error=None, **fields):
+        """Marca la subida como terminada (con error o sin él)"""
+        self.update(force=True, done=True, error=error, stage='failed' if error else 'done', **fields)
+
+    def _write(self):
+        if not self.upload_id:
+            return
+        self._last_write = time.monotonic()
+        try:
+            atomic_write_json(_progress_path(self.upload_id), dict(self.state, updated_at=time.time()))
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el progreso de la subida {self.upload_id}: {e}")
+
+
+def read_progress(upload_id):
+    """
+    Devuelve el progreso de una subida
+
+    Returns:
+        dict: Estado de la subida o None si no existe
+    """
+    if not valid_upload_id(upload_id):
+        return None
+    return read_json(_progress_path(upload_id))
+
+
+def cleanup_progress(max_age=PROGRESS_TTL_SECONDS):
+    """Borra los archivos de progreso de subidas antiguas"""
+    directory = os.path.join(UPLOADS_DIR, 'progress')
+    if not os.path.isdir(directory):
+        return
+    limit = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            continue
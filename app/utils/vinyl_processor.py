@@ -1,217 +1,297 @@
 import logging
-import pandas as pd
 import os
-from app.config import COLLECTION_CSV_PATH, ENRICHED_COLLECTION_PATH, KNOWN_ALBUM_YEARS
+from app.config import KNOWN_ALBUM_YEARS, SHARED_STORE_ENABLED
+from app.utils.metrics import timed
+from app.utils.release_catalog import get_release_catalog
 
 logger = logging.getLogger(__name__)
 
-def load_vinyl_data(collection_path=None, use_enriched=True):
+# Columnas relevantes para el análisis musical (las únicas que se leen del CSV para procesar)
+PROCESSING_COLUMNS = [
+    'Artist', 'Title', 'Label', 'Genre', 'Style', 
+    'Released', 'Format', 'Rating', 'CollectionFolder',
+    'Collection Media Condition', 'Collection Sleeve Condition',
+    'Collection Notes', 'original_release_year', 'community_rating',
+    'community_have', 'community_want',
+    'tracklist', 'image_url', 'release_id'
+]
+
+@timed('load_vinyl_data')
+def load_vinyl_data(collection_path):
     """
-    Carga datos de vinilos desde CSV (básico o enriquecido)
+    Carga datos de vinilos desde un CSV (la ruta la resuelve el registro de colecciones).
+    Solo se leen las columnas que usa el procesamiento, con los tipos del esquema.
     
     Args:
-        collection_path: Ruta opcional al archivo CSV (si no se proporciona, usa el predeterminado)
-        use_enriched: Si es True, intenta usar la versión enriquecida si existe
+        collection_path: Ruta al archivo CSV
         
     Returns:
         DataFrame: DataFrame con los datos de vinilos o None si hay error
     """
+    from app.utils.ingest import read_collection
+    
     try:
-        # Determinar la ruta del archivo
-        input_path = collection_path if collection_path else COLLECTION_CSV_PATH
-        logger.info(f"Intentando cargar colección desde: {input_path}")
-        
-        # Verificar si el archivo existe
-        if not os.path.exists(input_path):
-            logger.error(f"El archivo especificado {input_path} no existe")
-            
-            # Si no existe y estamos usando collection_path personalizado, fallar
-            if collection_path:
-                logger.error(f"No se pudo cargar la colección personalizada: {collection_path}")
-                return None
-                
-            # Si no existe y estamos usando el predeterminado, intentar otras opciones
-            logger.warning(f"Intentando alternativas al no encontrar {COLLECTION_CSV_PATH}")
-            if os.path.exists(ENRICHED_COLLECTION_PATH):
-                logger.info(f"Cargando colección enriquecida predeterminada como alternativa")
-                input_path = ENRICHED_COLLECTION_PATH
-            else:
-                # Buscar cualquier CSV que pueda servir en la carpeta data
-                csv_files = [f for f in os.listdir('data') if f.endswith('.csv')]
-                if csv_files:
-                    input_path = os.path.join('data', csv_files[0])
-                    logger.info(f"Usando primer CSV disponible encontrado: {input_path}")
-                else:
-                    logger.error("No se encontró ningún archivo CSV en la carpeta data")
-                    return None
-        
-        # Si la ruta ya es un archivo enriquecido, usarla directamente
-        if input_path.endswith('_enriched.csv') or 'enriched' in input_path:
-            logger.info(f"Usando directamente el archivo enriquecido: {input_path}")
-            df = pd.read_csv(input_path)
-            logger.info(f"Se cargaron {len(df)} registros de vinilos enriquecidos desde {input_path}")
-            return df
-            
-        # Verificar si existe una versión enriquecida
-        if use_enriched:
-            # Intentar construir el nombre del archivo enriquecido
-            enriched_path = input_path.replace('.csv', '_enriched.csv')
-            if not enriched_path.endswith('_enriched.csv'):
-                enriched_path = input_path.replace('.csv', '') + '_enriched.csv'
-                
-            # Comprobar si existe
-            if os.path.exists(enriched_path):
-                logger.info(f"Cargando colección enriquecida desde {enriched_path}")
-                df = pd.read_csv(enriched_path)
-                logger.info(f"Se cargaron {len(df)} registros de vinilos enriquecidos")
-                return df
-        
-        # Si llegamos aquí, cargamos el archivo original
-        logger.info(f"Cargando datos desde el archivo original: {input_path}")
-        df = pd.read_csv(input_path)
-        logger.info(f"Se cargaron {len(df)} registros de vinilos desde {input_path}")
+        if not collection_path or not os.path.exists(collection_path):
+            logger.error(f"El archivo de colección {collection_path} no existe")
+            return None
+        df = read_collection(collection_path, columns=PROCESSING_COLUMNS, categoricals=True)
+        logger.info(f"Se cargaron {len(df)} registros de vinilos desde {collection_path}")
         return df
     except Exception as e:
         logger.error(f"Error cargando CSV: {e}", exc_info=True)
         return None
 
-def process_vinyl_data(vinyl_data):
+def build_processed_frame(vinyl_data):
     """
-    Procesa los datos de vinilos para obtener información relevante
+    Construye el DataFrame procesado (columnas relevantes y campos derivados)
     
     Args:
         vinyl_data: DataFrame de pandas con los datos de vinilos
         
     Returns:
-        list: Lista de diccionarios con los datos procesados
+        DataFrame: DataFrame procesado
     """
-    try:
-        # Verificar las columnas disponibles en el CSV
-        available_columns = vinyl_data.columns.tolist()
-        logger.info(f"Columnas disponibles en el CSV: {available_columns}")
-        
-        # Definir columnas relevantes para el análisis musical
-        relevant_columns = [
-            'Artist', 'Title', 'Label', 'Genre', 'Style', 
-            'Released', 'Format', 'Rating', 'CollectionFolder',
-            'Collection Media Condition', 'Collection Sleeve Condition',
-            'Collection Notes', 'original_release_year', 'community_rating',
-            'tracklist', 'image_url', 'release_id'
-        ]
-        
-        # Filtrar para usar solo las columnas disponibles
-        use_columns = [col for col in relevant_columns if col in available_columns]
-        logger.info(f"Usando columnas: {use_columns}")
-        
-        # Crear una copia con las columnas disponibles
-        if use_columns:
-            processed_data = vinyl_data[use_columns].copy()
-        else:
-            processed_data = vinyl_data.copy()
-            logger.warning("No se encontraron columnas esperadas. Usando todas las disponibles.")
-        
-        # Procesar los formatos para categorizarlos mejor
-        if 'Format' in processed_data.columns:
-            processed_data['Format_Clean'] = processed_data['Format'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
-            # Extraer si es LP, Single, etc.
-            processed_data['Format_Type'] = processed_data['Format_Clean'].apply(
-                lambda x: 'LP' if 'LP' in x else 
-                          'Single' if 'Single' in x else
-                          '12"' if '12"' in x else
-                          '7"' if '7"' in x else
-                          'Otro'
-            )
-        
-        # Procesar año de lanzamiento para mejorar recomendaciones por década
-        if 'Released' in processed_data.columns:
-            # Convertir a string y extraer el año (los primeros 4 dígitos)
-            processed_data['Year'] = processed_data['Released'].astype(str).str.extract(r'(\d{4})', expand=False)
-            # Obtener la década
-            processed_data['Decade'] = processed_data['Year'].apply(
-                lambda x: f"{x[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
-            )
-        
-        # Usar el año original de lanzamiento si está disponible
-        if 'original_release_year' in processed_data.columns:
-            # Reemplazar el año con el año original si está disponible
-            processed_data['Original_Year'] = processed_data['original_release_year']
-            # Obtener la década original
-            processed_data['Original_Decade'] = processed_data['Original_Year'].apply(
-                lambda x: f"{str(x)[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
-            )
+    import pandas as pd
+    
+    # Verificar las columnas disponibles en el CSV
+    available_columns = vinyl_data.columns.tolist()
+    logger.info(f"Columnas disponibles en el CSV: {available_columns}")
+    
+    # Filtrar para usar solo las columnas relevantes disponibles
+    use_columns = [col for col in PROCESSING_COLUMNS if col in available_columns]
+    logger.info(f"Usando columnas: {use_columns}")
+    
+    # Crear una copia con las columnas disponibles
+    if use_columns:
+        processed_data = vinyl_data[use_columns].copy()
+    else:
+        processed_data = vinyl_data.copy()
+        logger.warning("No se encontraron columnas esperadas. Usando todas las disponibles.")
+    
+    # Procesar los formatos para categorizarlos mejor
+    if 'Format' in processed_data.columns:
+        processed_data['Format_Clean'] = processed_data['Format'].apply(
+            lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
+        )
+        # Extraer si es LP, Single, etc.
+        processed_data['Format_Type'] = processed_data['Format_Clean'].apply(
+            lambda x: 'LP' if 'LP' in x else 
+                      'Single' if 'Single' in x else
+                      '12"' if '12"' in x else
+                      '7"' if '7"' in x else
+                      'Otro'
+        )
+    
+    # Procesar año de lanzamiento para mejorar recomendaciones por década
+    if 'Released' in processed_data.columns:
+        # Convertir a string y extraer el año (los primeros 4 dígitos)
+        processed_data['Year'] = processed_data['Released'].astype(str).str.extract(r'(\d{4})', expand=False)
+        # Obtener la década
+        processed_data['Decade'] = processed_data['Year'].apply(
+            lambda x: f"{x[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
+        )
+    
+    # Usar el año original de lanzamiento si está disponible
+    if 'original_release_year' in processed_data.columns:
+        # Reemplazar el año con el año original si está disponible
+        processed_data['Original_Year'] = processed_data['original_release_year']
+        # Obtener la década original
+        processed_data['Original_Decade'] = processed_data['Original_Year'].apply(
+            lambda x: f"{str(x)[0:3]}0s" if pd.notna(x) and len(str(x)) == 4 else "Desconocida"
+        )
+    
+    # Procesar géneros para mejor categorización
+    if 'Genre' in processed_data.columns:
+        processed_data['Genre_Clean'] = processed_data['Genre'].apply(
+            lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
+        )
+    
+    # Procesar estilos para mejor categorización
+    if 'Style' in processed_data.columns:
+        processed_data['Style_Clean'] = processed_data['Style'].apply(
+            lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
+        )
+    
+    # Procesar condición del vinilo
+    if 'Collection Media Condition' in processed_data.columns:
+        processed_data['Media_Condition'] = processed_data['Collection Media Condition'].apply(
+            lambda x: str(x).strip() if pd.notna(x) else "Desconocida"
+        )
+    
+    return processed_data
+
+@timed('process_vinyl_data')
+def process_vinyl_data(vinyl_data):
+    """
+    Procesa los datos de vinilos para obtener información relevante, en la colección
+    compacta por columnas (al iterar da vistas VinylRecord, no diccionarios)
+    
+    Args:
+        vinyl_data: DataFrame de pandas con los datos de vinilos
         
-        # Procesar géneros para mejor categorización
-        if 'Genre' in processed_data.columns:
-            processed_data['Genre_Clean'] = processed_data['Genre'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
+    Returns:
+        Sequence: CompactCollection con los datos procesados (lista vacía si hay error)
+    """
+    collection = compact_vinyl_data(vinyl_data)
+    return collection if collection is not None else []
+
+@timed('compact_vinyl_data')
+def compact_vinyl_data(vinyl_data):
+    """
+    Procesa los datos de vinilos y los guarda en una colección compacta por columnas
+    (valores repetidos como códigos categóricos) en lugar de una lista de diccionarios
+    
+    Args:
+        vinyl_data: DataFrame de pandas con los datos de vinilos
         
-        # Procesar estilos para mejor categorización
-        if 'Style' in processed_data.columns:
-            processed_data['Style_Clean'] = processed_data['Style'].apply(
-                lambda x: str(x).replace('"', '').strip() if pd.notna(x) else "Desconocido"
-            )
+    Returns:
+        CompactCollection: Colección procesada o None si hay error
+    """
+    from app.utils.compact_collection import CompactCollection
+    
+    try:
+        collection = CompactCollection.from_frame(build_processed_frame(vinyl_data))
+        logger.info(f"Datos de vinilos procesados en formato compacto. Total: {len(collection)} registros")
+        return collection
+    except Exception as e:
+        logger.error(f"Error procesando datos de vinilos: {e}", exc_info=True)
+        return None
+
+@timed('load_processed_collection')
+def load_processed_collection(collection_path):
+    """
+    Carga una colección ya procesada. Con el almacén compartido habilitado, cada
+    versión del CSV se procesa una sola vez y todos los workers la mapean en memoria.
+    
+    Args:
+        collection_path: Ruta al archivo CSV (la resuelve el registro de colecciones)
         
-        # Procesar condición del vinilo
-        if 'Collection Media Condition' in processed_data.columns:
-            processed_data['Media_Condition'] = processed_data['Collection Media Condition'].apply(
-                lambda x: str(x).strip() if pd.notna(x) else "Desconocida"
-            )
+    Returns:
+        Sequence: SharedCollection (almacén compartido) o CompactCollection (en memoria), o None si hay error
+    """
+    if not collection_path or not os.path.exists(collection_path):
+        logger.error(f"El archivo de colección {collection_path} no existe")
+        return None
+    
+    if SHARED_STORE_ENABLED:
+        try:
+            from app.utils.shared_store import get_shared_store
+            
+            collection = get_shared_store().get_or_build(collection_path, lambda: _read_processed_frame(collection_path))
+            logger.info(f"Colección procesada disponible en el almacén compartido: {len(collection)} registros")
+            return collection
+        except Exception as e:
+            logger.error(f"Error usando el almacén compartido, se procesa en memoria: {e}", exc_info=True)
+    
+    vinyl_data = load_vinyl_data(collection_path)
+    if vinyl_data is None:
+        return None
+    return compact_vinyl_data(vinyl_data)
+
+def _rated_rows_by_rating(vinyl_list):
+    """
+    Filas de los discos calificados, de mayor a menor calificación (a igual
+    calificación, en el orden de la colección)
+    
+    Args:
+        vinyl_list: Colección procesada (CompactCollection, SharedCollection o lista de diccionarios)
         
-        # Convertir a registros para el prompt
-        vinyl_list = processed_data.to_dict('records')
-        logger.info(f"Datos de vinilos procesados. Total: {len(vinyl_list)} registros")
+    Returns:
+        list: Números de fila
+    """
+    import numpy as np
+    import pandas as pd
+    
+    # Colecciones por columnas: la calificación se lee como array, sin recorrer registros
+    ratings = None
+    if hasattr(vinyl_list, 'array'):
+        ratings = vinyl_list.array('Rating') if 'Rating' in vinyl_list.columns else np.array([])
+    if ratings is not None:
+        ratings = np.asarray(ratings, dtype=np.float64)
+        rated = np.nonzero(~np.isnan(ratings) & (ratings != 0))[0]
+        return rated[np.argsort(-ratings[rated], kind='stable')].tolist()
+    
+    def sort_key(rating):
+        if isinstance(rating, (int, float, str)) and str(rating).replace('.', '', 1).isdigit():
+            return float(rating)
+        return 0
+    
+    rated = [(row, sort_key(v['Rating'])) for row, v in enumerate(vinyl_list)
+             if 'Rating' in v and v['Rating'] and pd.notna(v['Rating'])]
+    rated.sort(key=lambda item: item[1], reverse=True)
+    return [row for row, _ in rated]
+
+def _read_processed_frame(collection_path):
+    """Lee del CSV solo las columnas de procesamiento y las prepara para el almacén compartido"""
+    from app.utils.ingest import read_collection
+    
+    return build_processed_frame(read_collection(collection_path, columns=PROCESSING_COLUMNS, categoricals=True))
+
+def publish_processed_collection(collection_path):
+    """
+    Procesa una colección recién guardada y la publica en el almacén compartido, para que
+    las peticiones siguientes la mapeen sin volver a leer el CSV. El DataFrame solo vive
+    mientras se construye la versión; después queda el mapeo en memoria compartida.
+    
+    Args:
+        collection_path: Ruta del CSV ya guardado (define la versión en el almacén)
         
-        return vinyl_list
+    Returns:
+        SharedCollection: Colección publicada o None si el almacén está desactivado o falla
+    """
+    if not SHARED_STORE_ENABLED:
+        return None
+    try:
+        from app.utils.shared_store import get_shared_store
+        return get_shared_store().get_or_build(collection_path, lambda: _read_processed_frame(collection_path))
     except Exception as e:
-        logger.error(f"Error procesando datos de vinilos: {e}", exc_info=True)
-        return []
+        logger.warning(f"No se pudo publicar la colección en el almacén compartido: {e}")
+        return None
 
+@timed('prepare_vinyl_summary')
 def prepare_vinyl_summary(vinyl_list, max_items=150):
     """
     Prepara un resumen detallado de la colección de vinilos para el prompt de OpenAI,
     limitando la cantidad de información para evitar exceder el límite de tokens.
     
     Args:
-        vinyl_list: Lista de diccionarios con los datos de vinilos procesados
+        vinyl_list: Colección procesada (CompactCollection, SharedCollection o lista de diccionarios)
         max_items: Número máximo de vinilos a incluir en el resumen
         
     Returns:
         str: Texto con los resúmenes para cada vinilo
     """
+    import random
+    
     # Si hay más vinilos que el límite, seleccionar una muestra
     if len(vinyl_list) > max_items:
         logger.warning(f"La colección tiene {len(vinyl_list)} vinilos. Limitando a {max_items} para el prompt.")
         
-        # Dar prioridad a discos con calificación (si está disponible)
-        if any('Rating' in v and v['Rating'] and pd.notna(v['Rating']) for v in vinyl_list):
-            # Ordenar por calificación (descendente) y tomar los mejores
-            rated_vinyls = [v for v in vinyl_list if 'Rating' in v and v['Rating'] and pd.notna(v['Rating'])]
-            rated_vinyls.sort(key=lambda x: float(x['Rating']) if isinstance(x['Rating'], (int, float, str)) and str(x['Rating']).replace('.', '', 1).isdigit() else 0, reverse=True)
-            
+        # Dar prioridad a discos con calificación (si está disponible); se trabaja con
+        # números de fila para no comparar registros entre sí
+        rated_rows = _rated_rows_by_rating(vinyl_list)
+        if rated_rows:
             # Tomar el 70% de los mejores calificados
-            top_rated = rated_vinyls[:int(max_items * 0.7)]
+            top_rated = rated_rows[:int(max_items * 0.7)]
             
             # El resto tomarlos aleatoriamente de los no calificados o de menor calificación
             remaining = max_items - len(top_rated)
             if remaining > 0:
-                other_vinyls = [v for v in vinyl_list if v not in top_rated]
-                import random
-                random_selection = random.sample(other_vinyls, min(remaining, len(other_vinyls)))
-                selected_vinyls = top_rated + random_selection
+                chosen = set(top_rated)
+                other_rows = [row for row in range(len(vinyl_list)) if row not in chosen]
+                selected_rows = top_rated + random.sample(other_rows, min(remaining, len(other_rows)))
             else:
-                selected_vinyls = top_rated[:max_items]
+                selected_rows = top_rated[:max_items]
         else:
             # Si no hay calificaciones, tomar muestra aleatoria
-            import random
-            selected_vinyls = random.sample(vinyl_list, max_items)
+            selected_rows = random.sample(range(len(vinyl_list)), max_items)
+        selected_vinyls = [vinyl_list[row] for row in selected_rows]
     else:
         selected_vinyls = vinyl_list
     
     # Generar resúmenes simplificados con información esencial
     vinyl_summaries = []
+    catalog = get_release_catalog()
     
     for i, v in enumerate(selected_vinyls):
         # Información esencial: Artista, Título, Año, Género
@@ -222,6 +302,10 @@ def prepare_vinyl_summary(vinyl_list, max_items=150):
         album_key = f"{artist}|{title}"
         corrected_year = KNOWN_ALBUM_YEARS.get(album_key)
         
+        # Si no, el año original del catálogo offline de Discogs (por release_id)
+        if not corrected_year and catalog is not None:
+            corrected_year = catalog.original_year(v.get('release_id'))
+        
         # Extraer información de año, priorizando el año original
         year = v.get('Original_Year', v.get('original_release_year', v.get('Year', v.get('Released', ''))))
         
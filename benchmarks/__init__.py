@@ -0,0 +1 @@
+# Benchmarks y herramientas de medición de rendimiento (no forman parte de la aplicación)
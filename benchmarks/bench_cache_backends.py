@@ -0,0 +1,117 @@
+"""
+Benchmark de los backends de caché (memoria LRU, SQLite y almacén externo simulado).
+
+Para cada backend mide escrituras y lecturas por segundo con valores del tamaño indicado y
+la tasa de aciertos de una carga con popularidad de Zipf cuando el límite de bytes no
+alcanza para todas las claves. Verifica el vencimiento por TTL y el borrado por prefijo, y
+que una caché SQLite escrita en otro proceso se lee desde este.
+
+Uso:
+    python -m benchmarks.bench_cache_backends --keys 2000 --value-bytes 2048 --budget 0.25
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _writer(workdir, keys, value_bytes):
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    os.chdir(workdir)
+    from app.utils.cache_backends import SQLiteCache
+
+    cache = SQLiteCache('shared')
+    for n in range(keys):
+        cache.set(f'key:{n}', b'x' * value_bytes)
+
+
+def _zipf_keys(keys, lookups, seed=42):
+    """Claves de una carga donde la k-ésima más popular se pide con probabilidad proporcional a 1/k"""
+    weights = [1.0 / (rank + 1) for rank in range(keys)]
+    return random.Random(seed).choices(range(keys), weights=weights, k=lookups)
+
+
+def run_backend(cache, args):
+    value = b'x' * args.value_bytes
+    start = time.perf_counter()
+    for n in range(args.keys):
+        cache.set(f'key:{n}', value)
+    sets_per_second = args.keys / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for n in range(args.keys):
+        cache.get(f'key:{n}')
+    gets_per_second = args.keys / (time.perf_counter() - start)
+
+    # Carga de Zipf: lo que falta se vuelve a guardar (como haría quien usa la caché)
+    cache.delete_prefix('key:')
+    hits = 0
+    for n in _zipf_keys(args.keys, args.lookups):
+        if cache.get(f'key:{n}') is not None:
+            hits += 1
+        else:
+            cache.set(f'key:{n}', value)
+
+    errors = []
+    cache.set('ttl:1', 'vence', ttl=1)
+    cache.set('keep:1', 'queda')
+    time.sleep(1.1)
+    if cache.get('ttl:1') is not None:
+        errors.append('TTL')
+    if cache.delete_prefix('key:') == 0 or cache.get('keep:1') != 'queda':
+        errors.append('delete_prefix')
+    return {'sets': sets_per_second, 'gets': gets_per_second, 'hit_ratio': hits / args.lookups, 'errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=2000, help="Claves distintas")
+    parser.add_argument('--value-bytes', type=int, default=2048, help="Tamaño de cada valor")
+    parser.add_argument('--lookups', type=int, default=20000, help="Lecturas de la carga de Zipf")
+    parser.add_argument('--budget', type=float, default=0.25, help="Límite de bytes como fracción del total de claves")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cache-bench-')
+    os.chdir(workdir)
+    os.environ.update({'CACHE_EXTERNAL_URL': 'memory://', 'LOG_LEVEL': 'WARNING'})
+
+    from app.utils.cache_backends import MemoryLRUCache, SQLiteCache, ExternalCache, FakeExternalStore
+
+    # El pickle de un valor ocupa unos bytes más que el valor
+    budget = int(args.keys * (args.value_bytes + 64) * args.budget)
+    backends = {
+        'memory': MemoryLRUCache('bench-memory', max_bytes=budget),
+        'sqlite': SQLiteCache('bench-sqlite', max_bytes=budget),
+        # El almacén externo gestiona su propia memoria: sin límite, todas las claves caben
+        'external': ExternalCache('bench-external', FakeExternalStore()),
+    }
+    errors = 0
+    print(f"{args.keys} claves de {args.value_bytes} bytes, límite {budget / 1024 / 1024:.1f} MiB")
+    print(f"{'backend':<10}{'set/s':>11}{'get/s':>11}{'aciertos':>10}  verificación")
+    for name, cache in backends.items():
+        result = run_backend(cache, args)
+        errors += len(result['errors'])
+        print(f"{name:<10}{result['sets']:>11.0f}{result['gets']:>11.0f}{result['hit_ratio']:>10.1%}  "
+              f"{', '.join(result['errors']) or 'ok'}")
+
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=_writer, args=(workdir, 100, args.value_bytes))
+    process.start()
+    process.join()
+    shared = SQLiteCache('shared')
+    found = sum(1 for n in range(100) if shared.get(f'key:{n}') is not None)
+    errors += 100 - found
+    print(f"SQLite entre procesos: {found}/100 claves escritas por otro proceso leídas")
+
+    if errors:
+        print(f"ERROR: {errors} verificaciones fallidas")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
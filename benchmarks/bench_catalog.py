@@ -0,0 +1,135 @@
+"""
+Benchmark del catálogo offline construido con los volcados de Discogs.
+
+Genera volcados sintéticos (con la estructura de los mensuales de Discogs), construye
+el catálogo y mide:
+  - lanzamientos por segundo y pico de memoria de la construcción
+  - pico de memoria del parseo en streaming (no debería crecer con el volcado)
+  - latencia de búsqueda por release_id
+  - peticiones HTTP por disco al enriquecer con y sin catálogo (contra la API falsa)
+Verifica además que cada lanzamiento tenga el master, año original, géneros y estilos esperados.
+
+Uso:
+    python -m benchmarks.bench_catalog --items 100000 --enrich-items 50
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+from benchmarks.synthetic import write_discogs_dumps  # noqa: E402
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _peak(fn):
+    # tracemalloc hace el parseo varias veces más lento: se mide aparte del tiempo
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _check(catalog, releases):
+    """Lanzamientos cuyo contenido en el catálogo no es el esperado"""
+    errors = 0
+    for release in releases:
+        entry = catalog.lookup(release['id'])
+        expected_year = release['original_year'] if release['master_id'] else release['year']
+        if (entry is None or entry['original_release_year'] != expected_year
+                or entry['master_id'] != (release['master_id'] or None)
+                or entry['genres'] != release['genres'] or entry['styles'] != release['styles']):
+            errors += 1
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000, help="Lanzamientos en el volcado sintético")
+    parser.add_argument('--enrich-items', type=int, default=50, help="Discos a enriquecer contra la API falsa")
+    parser.add_argument('--lookups', type=int, default=100000, help="Búsquedas para medir la latencia")
+    args = parser.parse_args()
+
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    workdir = tempfile.mkdtemp(prefix='catalog-bench-')
+    os.chdir(workdir)
+    state = FakeDiscogsState(args.items, rate_limit=1000000)
+    server, base_url = serve_in_thread(state)
+    os.environ.update({
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'DISCOGS_REQUEST_DELAY': '0',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': '1000000',
+        'HTTP_CACHE_ENABLED': 'false',
+        'COVER_CACHE_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'werkzeug=WARNING',
+    })
+
+    from app.utils.release_catalog import build_catalog, get_release_catalog, iter_dump
+
+    releases = state.releases
+    dumps_dir = os.path.join(workdir, 'dumps')
+    releases_dump, masters_dump = write_discogs_dumps(releases, dumps_dir)
+    dump_mb = (os.path.getsize(releases_dump) + os.path.getsize(masters_dump)) / 1024 ** 2
+
+    parsed, parse_seconds = _timed(lambda: sum(1 for _ in iter_dump(releases_dump, 'release')))
+    # Pico de memoria del parseo con una parte y con todo el volcado: debería ser el mismo
+    partial_peak = _peak(lambda: sum(1 for _ in itertools.islice(iter_dump(releases_dump, 'release'), 1000)))
+    parse_peak = _peak(lambda: sum(1 for _ in iter_dump(releases_dump, 'release')))
+    meta, build_seconds = _timed(lambda: build_catalog(releases_dump, masters_dump))
+    catalog = get_release_catalog()
+    errors = _check(catalog, releases)
+
+    rng = random.Random(1)
+    ids = [rng.choice(releases)['id'] if rng.random() < 0.8 else rng.randint(1, 999999) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for release_id in ids:
+        catalog.lookup(release_id)
+    lookup_us = (time.perf_counter() - start) / len(ids) * 1e6
+
+    print(f"volcados: {len(releases)} lanzamientos, {meta['masters']} masters, {dump_mb:.1f} MB comprimidos")
+    print(f"parseo en streaming: {parsed / parse_seconds:,.0f} lanzamientos/s, pico {partial_peak / 1024:,.0f} KB "
+          f"con 1000 lanzamientos y {parse_peak / 1024:,.0f} KB con {parsed}")
+    print(f"construcción: {build_seconds:.2f}s ({meta['rows'] / build_seconds:,.0f} lanzamientos/s), "
+          f"{meta['with_year']} con año ({meta['from_master']} del master)")
+    print(f"búsqueda: {lookup_us:.1f} µs por release_id")
+
+    # Enriquecimiento: el catálogo evita la consulta del master de cada disco
+    import pandas as pd
+    from app.services.discogs_service import DiscogsConnector
+
+    sample = pd.DataFrame({'release_id': [release['id'] for release in releases[:args.enrich_items]]})
+    try:
+        for label, use_catalog in (('sin catálogo', False), ('con catálogo', True)):
+            connector = DiscogsConnector()
+            if not use_catalog:
+                connector.catalog = None
+            state.reset_counters()
+            enriched = connector.enrich_collection(sample)
+            years = int(enriched['original_release_year'].notna().sum())
+            print(f"enriquecimiento {label}: {state.total_calls() / len(sample):.2f} peticiones por disco, "
+                  f"{years} de {len(sample)} con año")
+    finally:
+        server.shutdown()
+
+    if errors:
+        print(f"ERROR: {errors} lanzamientos con datos distintos a los del volcado")
+        sys.exit(1)
+    print("Catálogo verificado: todos los lanzamientos coinciden con el volcado")
+
+
+if __name__ == '__main__':
+    main()
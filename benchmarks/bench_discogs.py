@@ -0,0 +1,116 @@
+"""
+Benchmark de importación y enriquecimiento contra la API falsa de Discogs.
+
+Mide discos por segundo y peticiones HTTP por disco para:
+  - importación con discogs_client (get_user_collection)
+  - importación con la API REST (get_user_collection_alternative)
+  - actualización de una colección sin cambios (revalidación condicional)
+  - enriquecimiento (enrich_collection)
+
+Uso:
+    python -m benchmarks.bench_discogs --items 300 --enrich-items 50 --latency-ms 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+
+def _measure(state, label, items_fn):
+    state.reset_counters()
+    start = time.perf_counter()
+    items = items_fn()
+    elapsed = time.perf_counter() - start
+    calls = state.total_calls()
+    return {
+        'stage': label,
+        'items': items,
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(items / elapsed, 2) if elapsed and items else 0.0,
+        'http_calls': calls,
+        'calls_per_item': round(calls / items, 3) if items else None,
+        'throttled_429': state.throttled,
+    }
+
+
+def run(args):
+    state = FakeDiscogsState(args.items, args.username, args.rate_limit, args.latency_ms)
+    server, base_url = serve_in_thread(state)
+
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    workdir = tempfile.mkdtemp(prefix='discogs-bench-')
+    os.chdir(workdir)
+    os.makedirs('data', exist_ok=True)
+    os.environ['DISCOGS_API_URL'] = base_url
+    os.environ['DISCOGS_TOKEN'] = 'bench-token'
+    os.environ['DISCOGS_REQUEST_DELAY'] = str(args.delay)
+    # El límite compartido sigue al del servidor falso (por defecto, sin espera práctica)
+    os.environ['DISCOGS_RATE_LIMIT_PER_MINUTE'] = str(args.rate_limit)
+    os.environ['HTTP_CACHE_ENABLED'] = 'false' if args.no_http_cache else 'true'
+
+    from app.services.discogs_service import DiscogsConnector
+
+    results = []
+    try:
+        connector = DiscogsConnector()
+
+        def import_client():
+            result = connector.get_user_collection(args.username)
+            return len(result[0]) if result else 0
+
+        def import_rest():
+            df, _ = connector.get_user_collection_alternative(args.username)
+            return len(df) if df is not None else 0
+
+        results.append(_measure(state, 'import_client', import_client))
+        results.append(_measure(state, 'import_rest', import_rest))
+        results.append(_measure(state, 'refresh_unchanged', import_rest))
+
+        collection_df, _ = connector.get_user_collection_alternative(args.username)
+        sample = collection_df.head(args.enrich_items).reset_index(drop=True)
+
+        def enrich():
+            enriched = connector.enrich_collection(sample)
+            return int(enriched['original_release_year'].notna().sum())
+
+        results.append(_measure(state, 'enrich', enrich))
+    finally:
+        server.shutdown()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de importación y enriquecimiento de Discogs (offline)")
+    parser.add_argument('--items', type=int, default=300, help="Discos en la colección sintética")
+    parser.add_argument('--enrich-items', type=int, default=50, help="Discos a enriquecer")
+    parser.add_argument('--username', default='benchuser')
+    parser.add_argument('--rate-limit', type=int, default=100000, help="Límite de peticiones por minuto del servidor falso")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latencia simulada por respuesta")
+    parser.add_argument('--delay', type=float, default=0.0, help="DISCOGS_REQUEST_DELAY usado por el conector")
+    parser.add_argument('--no-http-cache', action='store_true', help="Desactiva la caché HTTP condicional")
+    parser.add_argument('--output', help="Ruta opcional para guardar los resultados en JSON")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    results = run(args)
+
+    print(f"{'etapa':<20}{'items':>8}{'seg':>10}{'items/s':>12}{'HTTP':>8}{'HTTP/item':>12}{'429':>6}")
+    for r in results:
+        print(f"{r['stage']:<20}{r['items']:>8}{r['seconds']:>10}{r['items_per_second']:>12}"
+              f"{r['http_calls']:>8}{str(r['calls_per_item']):>12}{r['throttled_429']:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark de memoria de la colección procesada en memoria.
+
+Compara, para colecciones sintéticas de distintos tamaños, la lista de
+diccionarios (to_dict('records') del DataFrame procesado, la representación
+anterior) con la CompactCollection de compact_vinyl_data:
+  - memoria retenida por la representación (tracemalloc, sin contar el DataFrame)
+  - tiempo de construcción
+  - tiempo de prepare_vinyl_summary y de recorrer todos los registros
+
+Termina con código 1 si la colección compacta no ahorra al menos --min-ratio
+veces la memoria de la lista.
+
+Uso:
+    python -m benchmarks.bench_memory --sizes 10000 100000
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.synthetic import write_collection_csv  # noqa: E402
+
+DATA_CACHE_DIR = os.path.join(ROOT_DIR, 'benchmarks', '.data')
+DEFAULT_SIZES = [10000, 100000]
+
+
+def _retained(build):
+    """
+    Construye una representación y mide la memoria que queda asignada
+
+    Returns:
+        tuple: (resultado, MB retenidos, segundos de construcción)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = build()
+        seconds = time.perf_counter() - start
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current / (1024 * 1024), seconds
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _iterate(collection):
+    # Lo que hace el código que recorre la colección: leer algunos campos de cada disco
+    for record in collection:
+        record.get('Artist')
+        record.get('Genre')
+
+
+def bench_collection(csv_path):
+    """
+    Mide ambas representaciones para un CSV
+
+    Returns:
+        dict: {representación: {'mb': ..., 'build_s': ..., 'summary_s': ..., 'iterate_s': ...}}
+    """
+    from app.utils.vinyl_processor import load_vinyl_data, build_processed_frame, compact_vinyl_data, \
+        prepare_vinyl_summary
+
+    df = load_vinyl_data(collection_path=csv_path)
+    results = {}
+    for name, build in (('records', lambda: build_processed_frame(df).to_dict('records')), ('compact', lambda: compact_vinyl_data(df))):
+        collection, mb, build_seconds = _retained(build)
+        results[name] = {
+            'mb': mb,
+            'build_s': build_seconds,
+            'summary_s': _timed(lambda: prepare_vinyl_summary(collection, max_items=150)),
+            'iterate_s': _timed(lambda: _iterate(collection)),
+        }
+        del collection
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria de la colección procesada: lista de dicts vs compacta")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Tamaños de colección a medir")
+    parser.add_argument('--kinds', nargs='+', choices=['plain', 'enriched'], default=['enriched'])
+    parser.add_argument('--min-ratio', type=float, default=3.0,
+                        help="Ahorro mínimo de memoria exigido (memoria de la lista / memoria compacta)")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='memory-bench-'))
+    import logging
+    logging.disable(logging.WARNING)
+    import pandas  # noqa: F401
+
+    failures = []
+    print(f"{'caso':<20}{'formato':<10}{'memoria':>12}{'construir':>12}{'resumen':>12}{'recorrer':>12}")
+    for size in args.sizes:
+        for kind in args.kinds:
+            case = f"{kind}_{size}"
+            csv_path = write_collection_csv(
+                os.path.join(DATA_CACHE_DIR, f"collection_{kind}_{size}.csv"), size, enriched=(kind == 'enriched')
+            )
+            results = bench_collection(csv_path)
+            for name, metrics in results.items():
+                print(f"{case:<20}{name:<10}{metrics['mb']:>10.1f}MB{metrics['build_s']:>11.3f}s"
+                      f"{metrics['summary_s']:>11.3f}s{metrics['iterate_s']:>11.3f}s")
+            ratio = results['records']['mb'] / max(results['compact']['mb'], 1e-6)
+            print(f"{case:<20}ahorro de memoria: {ratio:.1f}x")
+            if ratio < args.min_ratio:
+                failures.append(f"{case}: {ratio:.1f}x < {args.min_ratio}x")
+
+    if failures:
+        print("La colección compacta no alcanza el ahorro mínimo:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Benchmark del pipeline colección → prompt con colecciones sintéticas.
+
+Mide por separado el tiempo y el pico de memoria de cada etapa:
+  - load_vinyl_data (disco + pandas)
+  - process_vinyl_data
+  - prepare_vinyl_summary
+  - rutas index (POST) y /api/recommend, con OpenAI reemplazado por una respuesta fija
+
+para colecciones simples y enriquecidas de 1k, 10k, 100k y 1M filas. El tiempo de
+cada etapa es el mejor de varias repeticiones (el ruido de la máquina solo suma).
+Compara los resultados con los baselines JSON guardados; si alguna etapa empeora
+más que el umbral, vuelve a medir ese caso con el doble de repeticiones y termina
+con código 1 solo si la regresión se confirma.
+
+Uso:
+    python -m benchmarks.bench_pipeline --sizes 1000 10000
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 --save-baseline
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.synthetic import write_collection_csv  # noqa: E402
+
+DATA_CACHE_DIR = os.path.join(ROOT_DIR, 'benchmarks', '.data')
+BASELINE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'baselines', 'pipeline.json')
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+FAKE_RECOMMENDATION = "## Recomendaciones\n\n### 1. Artista - Disco (1971)\n**Por qué es una buena elección:** benchmark"
+
+
+def _time_stage(fn, repeat):
+    """Ejecuta fn varias veces y devuelve el mejor tiempo en segundos y el último resultado"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        # Soltar el resultado anterior antes de medir: no debe sumar trabajo al recolector
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def _peak_memory(fn):
+    """Pico de memoria (MB) asignado durante fn, medido con tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def bench_collection(csv_path, repeat, include_routes=True):
+    """
+    Mide cada etapa del pipeline para un CSV
+
+    Returns:
+        dict: {etapa: {'seconds': ..., 'peak_mb': ...}}
+    """
+    from app import create_app
+    from app.config import SESSION_COLLECTION_KEY
+    from app.models.collection_registry import get_registry
+    from app.routes import main_routes
+    from app.utils.vinyl_processor import load_vinyl_data, process_vinyl_data, prepare_vinyl_summary
+
+    results = {}
+
+    load = lambda: load_vinyl_data(collection_path=csv_path)  # noqa: E731
+    seconds, df = _time_stage(load, repeat)
+    results['load_vinyl_data'] = {'seconds': seconds, 'peak_mb': _peak_memory(load)}
+
+    process = lambda: process_vinyl_data(df)  # noqa: E731
+    seconds, vinyl_list = _time_stage(process, repeat)
+    results['process_vinyl_data'] = {'seconds': seconds, 'peak_mb': _peak_memory(process)}
+
+    summary = lambda: prepare_vinyl_summary(vinyl_list, max_items=150)  # noqa: E731
+    seconds, _ = _time_stage(summary, repeat)
+    results['prepare_vinyl_summary'] = {'seconds': seconds, 'peak_mb': _peak_memory(summary)}
+    rows = len(df)
+    del vinyl_list, df
+
+    if include_routes:
+        # Las rutas resuelven la colección por su propietario en el registro
+        owner = f"benchmark:{os.path.basename(csv_path)}"
+        get_registry().register(owner, csv_path, rows, source='benchmark')
+        original = main_routes.generate_recommendation
+        main_routes.generate_recommendation = lambda *args, **kwargs: FAKE_RECOMMENDATION
+        try:
+            app = create_app()
+            app.config['TESTING'] = True
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session[SESSION_COLLECTION_KEY] = owner
+
+            def index():
+                response = client.post('/', data={'mood': 'relajado', 'interests': 'jazz'})
+                assert response.status_code == 200, response.status_code
+
+            def api_recommend():
+                response = client.post('/api/recommend', json={'mood': 'relajado', 'interests': 'jazz'})
+                assert response.status_code == 200, response.status_code
+
+            seconds, _ = _time_stage(index, repeat)
+            results['route_index'] = {'seconds': seconds, 'peak_mb': _peak_memory(index)}
+            seconds, _ = _time_stage(api_recommend, repeat)
+            results['route_api_recommend'] = {'seconds': seconds, 'peak_mb': _peak_memory(api_recommend)}
+        finally:
+            main_routes.generate_recommendation = original
+
+    return results
+
+
+def _print_case(case, stages):
+    for stage, metrics in stages.items():
+        print(f"{case:<18}{stage:<24}{metrics['seconds']:>10.4f}s{metrics['peak_mb']:>10.1f}MB")
+
+
+def compare(results, baseline, threshold, memory_threshold):
+    """
+    Compara resultados con el baseline
+
+    Returns:
+        list: Descripción de cada regresión encontrada
+    """
+    regressions = []
+    for case, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(case, {}).get(stage)
+            if not reference:
+                continue
+            # Tolerancia absoluta mínima para que el ruido en etapas de microsegundos no falle
+            if metrics['seconds'] > reference['seconds'] * (1 + threshold) + 0.01:
+                regressions.append(f"{case}/{stage}: {metrics['seconds']:.4f}s vs baseline {reference['seconds']:.4f}s")
+            if metrics['peak_mb'] > reference['peak_mb'] * (1 + memory_threshold) + 1.0:
+                regressions.append(f"{case}/{stage}: {metrics['peak_mb']:.1f}MB vs baseline {reference['peak_mb']:.1f}MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline colección → prompt")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Tamaños de colección a medir")
+    parser.add_argument('--kinds', nargs='+', choices=['plain', 'enriched'], default=['plain', 'enriched'])
+    parser.add_argument('--repeat', type=int, default=5, help="Repeticiones por etapa (se usa el mejor tiempo)")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Regresión de tiempo tolerada (0.25 = 25%%)")
+    parser.add_argument('--memory-threshold', type=float, default=0.20, help="Regresión de memoria tolerada")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Archivo JSON de baselines")
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda los resultados como nuevo baseline")
+    parser.add_argument('--skip-routes', action='store_true', help="No medir las rutas de Flask")
+    args = parser.parse_args()
+    args.baseline = os.path.abspath(args.baseline)
+
+    # La app escribe en DATA_DIR relativo: trabajar en un directorio temporal
+    os.chdir(tempfile.mkdtemp(prefix='pipeline-bench-'))
+    import logging
+    logging.disable(logging.WARNING)
+    # pandas se importa de forma diferida: cargarlo antes para no sumarlo a la primera etapa
+    # (el arranque se mide aparte en bench_startup)
+    import pandas  # noqa: F401
+
+    results = {}
+    cases = {}
+    for size in args.sizes:
+        for kind in args.kinds:
+            case = f"{kind}_{size}"
+            csv_path = write_collection_csv(
+                os.path.join(DATA_CACHE_DIR, f"collection_{kind}_{size}.csv"), size, enriched=(kind == 'enriched')
+            )
+            repeat = args.repeat if size <= 100000 else 1
+            cases[case] = (csv_path, repeat)
+            results[case] = bench_collection(csv_path, repeat, include_routes=not args.skip_routes)
+            _print_case(case, results[case])
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({case: {stage: {k: round(v, 5) for k, v in m.items()} for stage, m in stages.items()}
+                         for case, stages in results.items()})
+        baseline['_meta'] = {'python': platform.python_version(), 'machine': platform.machine(),
+                             'saved_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No hay baseline para comparar; usa --save-baseline para crearlo")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        # Confirmar: una máquina cargada puede frenar una medición suelta
+        print("Posibles regresiones; se vuelven a medir los casos afectados")
+        for case in sorted({regression.split('/', 1)[0] for regression in regressions}):
+            csv_path, repeat = cases[case]
+            retry = bench_collection(csv_path, repeat * 2, include_routes=not args.skip_routes)
+            for stage, metrics in retry.items():
+                best = results[case][stage]
+                results[case][stage] = {key: min(best[key], metrics[key]) for key in best}
+            _print_case(case, results[case])
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print("Regresiones detectadas:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print("Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
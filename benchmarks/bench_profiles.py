@@ -0,0 +1,83 @@
+"""
+Benchmark de los perfiles de enriquecimiento contra la API falsa de Discogs.
+
+Importa la colección por la API REST (con master_id de basic_information) y además la
+enriquece partiendo de un CSV sin master_id (como la exportación de la web de Discogs).
+Para cada perfil mide peticiones por disco, por endpoint y tiempo, y verifica los años
+originales obtenidos.
+
+Uso:
+    python -m benchmarks.bench_profiles --items 200 --latency-ms 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+# Nombre corto de cada regla del servidor falso en la salida
+ENDPOINTS = {'/releases/<int:release_id>': 'releases', '/masters/<int:master_id>': 'masters',
+             '/_images/<int:release_id>.jpg': 'images'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200, help="Discos en la colección")
+    parser.add_argument('--latency-ms', type=float, default=5.0, help="Latencia simulada por respuesta")
+    args = parser.parse_args()
+
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    workdir = tempfile.mkdtemp(prefix='profiles-bench-')
+    os.chdir(workdir)
+    state = FakeDiscogsState(args.items, rate_limit=1000000, latency_ms=args.latency_ms)
+    server, base_url = serve_in_thread(state)
+    os.environ.update({
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'DISCOGS_REQUEST_DELAY': '0',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': '1000000',
+        'HTTP_CACHE_ENABLED': 'false',
+        'CATALOG_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'werkzeug=WARNING',
+    })
+
+    from app.services.discogs_service import DiscogsConnector, ENRICHMENT_PROFILES
+    from app.utils.ingest import read_collection
+
+    expected = {r['id']: r['original_year'] if r['master_id'] else r['year'] for r in state.releases}
+    errors = 0
+    try:
+        df, path = DiscogsConnector().get_user_collection_alternative(state.username, save_path='collection.csv')
+        sources = {'con master_id': read_collection(path),
+                   'sin master_id': read_collection(path).drop(columns=['master_id'])}
+        print(f"{'perfil':<11}{'colección':<15}{'HTTP/disco':>11}{'seg':>8}{'años ok':>9}  por endpoint")
+        for profile in ENRICHMENT_PROFILES:
+            for label, source in sources.items():
+                connector = DiscogsConnector()
+                state.reset_counters()
+                start = time.perf_counter()
+                enriched = connector.enrich_collection(source, profile=profile)
+                elapsed = time.perf_counter() - start
+                calls = {ENDPOINTS.get(rule, rule): count for rule, count in sorted(state.calls.items()) if count}
+                years = 0
+                if 'original_release_year' in ENRICHMENT_PROFILES[profile]['columns']:
+                    years = sum(1 for release_id, year in zip(enriched['release_id'], enriched['original_release_year'])
+                                if year == expected[int(release_id)])
+                    errors += len(enriched) - years
+                print(f"{profile:<11}{label:<15}{state.total_calls() / len(source):>11.2f}{elapsed:>8.2f}"
+                      f"{years:>9}  {calls}")
+    finally:
+        server.shutdown()
+
+    if errors:
+        print(f"ERROR: {errors} años originales distintos a los esperados")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
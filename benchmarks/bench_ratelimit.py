@@ -0,0 +1,128 @@
+"""
+Benchmark del límite de peticiones compartido entre procesos.
+
+Lanza varios procesos (como los workers de gunicorn) que piden detalles de
+lanzamientos a la API falsa de Discogs con el mismo token: un trabajo grande y
+varios pequeños. Compara el limitador compartido (DISCOGS_RATE_LIMIT_ENABLED)
+con la pausa fija por proceso (DISCOGS_REQUEST_DELAY) y mide:
+  - peticiones por segundo frente a la cuota (aprovechamiento)
+  - respuestas 429
+  - cuándo termina cada trabajo (los pequeños no deberían esperar al grande)
+
+Uso:
+    python -m benchmarks.bench_ratelimit --rate-limit 30 --window 5 --big 60 --small 8 --small-jobs 3
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+
+def _worker(env, workdir, job, release_ids, results):
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    os.environ.update(env)
+    os.chdir(workdir)
+    from app.services.discogs_service import DiscogsConnector
+
+    connector = DiscogsConnector(job=job)
+    start = time.time()
+    found = sum(1 for release_id in release_ids if connector.get_release_details(release_id))
+    results.put({'job': job, 'requests': len(release_ids), 'found': found, 'started': start,
+                 'finished': time.time()})
+
+
+def run_mode(args, limiter):
+    state = FakeDiscogsState(args.big + args.small * args.small_jobs, rate_limit=args.rate_limit,
+                             window=args.window)
+    server, base_url = serve_in_thread(state)
+    workdir = tempfile.mkdtemp(prefix='ratelimit-bench-')
+    env = {
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'HTTP_CACHE_ENABLED': 'false',
+        'COVER_CACHE_ENABLED': 'false',
+        'DISCOGS_RATE_LIMIT_ENABLED': 'true' if limiter else 'false',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': str(args.rate_limit),
+        'DISCOGS_RATE_LIMIT_WINDOW': str(args.window),
+        # Sin limitador, cada proceso espera lo que correspondería si estuviera solo
+        'DISCOGS_REQUEST_DELAY': str(args.window / args.rate_limit),
+    }
+    ids = [release['id'] for release in state.releases]
+    jobs = [('big', ids[:args.big])]
+    for n in range(args.small_jobs):
+        offset = args.big + n * args.small
+        jobs.append((f'small-{n + 1}', ids[offset:offset + args.small]))
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(env, workdir, job, release_ids, results))
+                 for job, release_ids in jobs]
+    try:
+        start = time.time()
+        processes[0].start()
+        # Los trabajos pequeños llegan cuando el grande ya está en marcha
+        time.sleep(args.stagger)
+        for process in processes[1:]:
+            process.start()
+        finished = [results.get(timeout=args.timeout) for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = max(item['finished'] for item in finished) - start
+    finally:
+        server.shutdown()
+
+    calls = state.total_calls()
+    quota = args.rate_limit / args.window
+    return {
+        'mode': 'shared_limiter' if limiter else 'fixed_delay',
+        'seconds': round(elapsed, 2),
+        'http_calls': calls,
+        'throttled_429': state.throttled,
+        'requests_per_second': round(calls / elapsed, 2) if elapsed else 0.0,
+        'quota_per_second': round(quota, 2),
+        'jobs': {item['job']: {'requests': item['requests'], 'found': item['found'],
+                               'seconds': round(item['finished'] - item['started'], 2)}
+                 for item in sorted(finished, key=lambda item: item['job'])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate-limit', type=int, default=30, help="Peticiones por ventana y token en el servidor")
+    parser.add_argument('--window', type=float, default=5.0, help="Ventana del límite en segundos")
+    parser.add_argument('--big', type=int, default=60, help="Peticiones del trabajo grande")
+    parser.add_argument('--small', type=int, default=8, help="Peticiones de cada trabajo pequeño")
+    parser.add_argument('--small-jobs', type=int, default=3, help="Cantidad de trabajos pequeños (un proceso cada uno)")
+    parser.add_argument('--stagger', type=float, default=1.0, help="Segundos entre el trabajo grande y los pequeños")
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--skip-baseline', action='store_true', help="No medir la pausa fija por proceso")
+    parser.add_argument('--json', action='store_true', help="Salida en JSON")
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    results = [run_mode(args, limiter=True)]
+    if not args.skip_baseline:
+        results.append(run_mode(args, limiter=False))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(f"\n[{result['mode']}] {result['seconds']}s, {result['http_calls']} peticiones, "
+              f"{result['requests_per_second']}/s (cuota {result['quota_per_second']}/s), "
+              f"{result['throttled_429']} respuestas 429")
+        for job, stats in result['jobs'].items():
+            print(f"  {job:<10} {stats['requests']:>4} peticiones en {stats['seconds']:>7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark de la actualización en segundo plano de los campos volátiles contra la API falsa de Discogs.
+
+Enriquece una colección registrada y mide:
+  - peticiones por disco del enriquecimiento completo y de repetirlo con los detalles vigentes
+  - peticiones por disco de la actualización de los campos volátiles vencidos (solo /releases,
+    sin masters ni portadas) y que los valores nuevos de la comunidad lleguen al CSV
+  - cuánto tarda un trabajo normal solo y con la actualización de baja prioridad en marcha
+    (con el límite del servidor ajustado: la actualización debería ceder la cuota)
+
+Uso:
+    python -m benchmarks.bench_refresh --items 200 --rate-limit 40 --window 4 --foreground 40
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+
+def _calls(state):
+    return {rule: count for rule, count in sorted(state.calls.items()) if count}
+
+
+def _enrich(args, state, workdir):
+    """Enriquecimiento completo, repetición y actualización de los campos volátiles"""
+    import pandas as pd
+    from app.config import ENRICH_VOLATILE_TTL_SECONDS
+    from app.models.collection_registry import get_registry, ENRICHMENT_COMPLETE
+    from app.services.discogs_service import DiscogsConnector, enrich_collection_from_file, save_enriched_collection
+    from app.services.enrichment_refresher import refresh_collection
+    from app.utils.ingest import read_collection
+
+    releases = state.releases
+    source = os.path.join(workdir, 'collection.csv')
+    pd.DataFrame({'release_id': [r['id'] for r in releases], 'Artist': [r['artist'] for r in releases],
+                  'Title': [r['title'] for r in releases], 'Label': [r['label'] for r in releases],
+                  'Released': [str(r['year']) for r in releases]}).to_csv(source, index=False)
+    registry = get_registry()
+    owner = 'upload:bench'
+    record = registry.register(owner, source, len(releases), source='upload')
+    enriched_path = registry.enriched_path(owner)
+
+    for label, input_path in (('enriquecimiento completo', source), ('repetido (detalles vigentes)', None)):
+        state.reset_counters()
+        start = time.perf_counter()
+        enrich_collection_from_file(input_path or enriched_path, enriched_path)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<32}{state.total_calls() / len(releases):>6.2f} peticiones/disco {elapsed:>7.2f}s  "
+              f"{_calls(state)}")
+    registry.set_enrichment(owner, ENRICHMENT_COMPLETE, record['version'], enriched_path=enriched_path)
+
+    # La comunidad cambia en Discogs y los campos volátiles del CSV vencen
+    for release in releases:
+        release['have'] += 7
+        release['want'] += 3
+        release['community_rating'] = round(min(5.0, release['community_rating'] + 0.1), 2)
+    df = read_collection(enriched_path)
+    df['community_fetched_at'] -= ENRICH_VOLATILE_TTL_SECONDS + 1
+    save_enriched_collection(df, enriched_path)
+
+    connector = DiscogsConnector(job='refresh', background=True)
+    state.reset_counters()
+    start = time.perf_counter()
+    batches = refreshed = 0
+    while True:
+        done, remaining, _ = refresh_collection(registry.get(owner), connector, batch_size=args.batch_size)
+        batches += 1
+        refreshed += done
+        if not remaining or not done:
+            break
+    elapsed = time.perf_counter() - start
+    df = read_collection(enriched_path)
+    by_id = {r['id']: r for r in releases}
+    current = sum(1 for release_id, have, want in zip(df['release_id'], df['community_have'], df['community_want'])
+                  if by_id[int(release_id)]['have'] == have and by_id[int(release_id)]['want'] == want)
+    print(f"{'actualización de volátiles':<32}{state.total_calls() / len(releases):>6.2f} peticiones/disco "
+          f"{elapsed:>7.2f}s  {_calls(state)}")
+    print(f"  {refreshed} discos actualizados en {batches} lotes, {current} de {len(df)} con have/want al día")
+    return current == len(df)
+
+
+def _priority(args, state, workdir):
+    """Duración de un trabajo normal solo y con la actualización de baja prioridad compitiendo"""
+    from app.services.discogs_service import DiscogsConnector
+    from app.services.rate_limiter import TokenBucket
+
+    ids = [release['id'] for release in state.releases]
+    background_done = []
+
+    def limiter(name):
+        return TokenBucket(os.path.join(workdir, 'ratelimit', f'{name}.json'), limit=args.rate_limit,
+                           window=args.window, idle_seconds=args.idle_seconds)
+
+    def background(connector, stop):
+        for release_id in ids * 10:
+            if stop.is_set():
+                break
+            if connector.get_community(release_id):
+                background_done.append(time.time())
+
+    results = {}
+    for label, with_background in (('solo', False), ('con actualización', True)):
+        name = label.replace(' ', '-')
+        foreground = DiscogsConnector(job='foreground')
+        foreground.limiter = limiter(name)
+        refresher = DiscogsConnector(job='refresh', background=True)
+        refresher.limiter = foreground.limiter
+        state.reset_counters()
+        background_done.clear()
+        stop = threading.Event()
+        thread = threading.Thread(target=background, args=(refresher, stop), daemon=True)
+        if with_background:
+            thread.start()
+            # La actualización ya usa la cuota ociosa cuando llega el trabajo normal
+            time.sleep(args.window)
+        start = time.time()
+        found = sum(1 for release_id in ids[:args.foreground] if foreground.get_release_details(release_id))
+        finished = time.time()
+        stop.set()
+        if with_background:
+            thread.join()
+        during = sum(1 for at in background_done if start <= at <= finished)
+        results[label] = finished - start
+        print(f"trabajo normal {label:<20}{found:>4} discos en {finished - start:>6.2f}s, "
+              f"{len(background_done)} actualizaciones ({during} mientras corría), {state.throttled} respuestas 429")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200, help="Discos en la colección")
+    parser.add_argument('--batch-size', type=int, default=50, help="Discos por lote de actualización")
+    parser.add_argument('--rate-limit', type=int, default=40, help="Peticiones por ventana en el servidor (prueba de prioridad)")
+    parser.add_argument('--window', type=float, default=4.0, help="Ventana del límite en segundos")
+    parser.add_argument('--foreground', type=int, default=40, help="Discos del trabajo normal")
+    parser.add_argument('--idle-seconds', type=float, default=1.0,
+                        help="Segundos sin otros trabajos para que la actualización use la cuota")
+    args = parser.parse_args()
+
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    workdir = tempfile.mkdtemp(prefix='refresh-bench-')
+    os.chdir(workdir)
+    state = FakeDiscogsState(args.items, rate_limit=1000000)
+    server, base_url = serve_in_thread(state)
+    os.environ.update({
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'DISCOGS_REQUEST_DELAY': '0',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': '1000000',
+        'REFRESH_IDLE_SECONDS': '0',
+        'HTTP_CACHE_ENABLED': 'false',
+        'COVER_CACHE_ENABLED': 'false',
+        'CATALOG_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'werkzeug=WARNING',
+    })
+
+    try:
+        ok = _enrich(args, state, workdir)
+        state.rate_limit, state.window = args.rate_limit, args.window
+        durations = _priority(args, state, workdir)
+    finally:
+        server.shutdown()
+
+    slowdown = durations['con actualización'] / durations['solo'] - 1
+    print(f"retraso del trabajo normal por la actualización: {slowdown:+.0%}")
+    if not ok:
+        print("ERROR: la actualización no dejó todos los have/want al día")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark de la resolución de release_id por búsqueda contra la API falsa de Discogs.
+
+Genera una colección sin release_id a partir de los lanzamientos sintéticos (con
+variaciones de mayúsculas, artículos, puntuación, sin sello y filas repetidas) y mide:
+  - búsquedas HTTP por fila (las filas repetidas comparten búsqueda)
+  - filas resueltas y correctas, y la confianza media
+  - tiempo con una y con varias búsquedas simultáneas (con latencia simulada)
+  - una segunda resolución, que debería salir entera de la caché persistente
+
+Uso:
+    python -m benchmarks.bench_resolver --items 300 --latency-ms 30 --workers 4
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+
+def _collection_rows(releases, duplicates, seed=7):
+    """Filas de CSV sin release_id (con el lanzamiento original para verificar)"""
+    rng = random.Random(seed)
+    rows = []
+    for release in releases:
+        artist, title, label = release['artist'], release['title'], release['label']
+        variant = rng.randrange(4)
+        if variant == 1:
+            artist, title = artist.upper(), title.lower()
+        elif variant == 2:
+            artist, title = f"The {artist}", f"{title}!"
+        elif variant == 3:
+            label = ''
+        rows.append(({'Artist': artist, 'Title': title, 'Label': label, 'Released': str(release['year'])}, release))
+    rows += [rng.choice(rows) for _ in range(int(len(rows) * duplicates))]
+    return rows
+
+
+def _correct(resolved_id, release, releases_by_id):
+    # Los datos sintéticos repiten artista y título: cuenta como correcto un lanzamiento indistinguible
+    found = releases_by_id.get(resolved_id)
+    fields = ('artist', 'title', 'label', 'year')
+    return found is not None and all(found[field] == release[field] for field in fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=300, help="Lanzamientos en la colección")
+    parser.add_argument('--duplicates', type=float, default=0.2, help="Proporción de filas repetidas")
+    parser.add_argument('--latency-ms', type=float, default=30.0, help="Latencia simulada por respuesta")
+    parser.add_argument('--workers', type=int, default=4, help="Búsquedas simultáneas")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='resolver-bench-')
+    os.chdir(workdir)
+    state = FakeDiscogsState(args.items, rate_limit=1000000, latency_ms=args.latency_ms)
+    server, base_url = serve_in_thread(state)
+    os.environ.update({
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': '1000000',
+        'HTTP_CACHE_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'werkzeug=WARNING',
+    })
+
+    import pandas as pd
+    from app.services.discogs_service import DiscogsConnector
+    from app.services import release_resolver
+    from app.services.release_resolver import ResolverCache, resolve_release_ids
+
+    rows = _collection_rows(state.releases, args.duplicates)
+    connector = DiscogsConnector()
+
+    def run(label, workers, fresh_cache):
+        if fresh_cache:
+            release_resolver._cache = ResolverCache(os.path.join(workdir, f'{label}.sqlite3'))
+        df = pd.DataFrame([row for row, _ in rows])
+        state.reset_counters()
+        start = time.perf_counter()
+        stats = resolve_release_ids(df, connector, workers=workers)
+        elapsed = time.perf_counter() - start
+        correct = sum(_correct(int(value), release, state.releases_by_id)
+                      for value, (_, release) in zip(df['release_id'], rows) if not pd.isna(value))
+        print(f"{label:<22}{len(df):>6}{stats['queries']:>10}{state.total_calls():>8}"
+              f"{state.total_calls() / len(df):>10.2f}{stats['resolved']:>10}{correct:>10}"
+              f"{df['match_confidence'].mean():>12.3f}{elapsed:>9.2f}")
+
+    try:
+        print(f"{'modo':<22}{'filas':>6}{'consultas':>10}{'HTTP':>8}{'HTTP/fila':>10}{'resueltas':>10}"
+              f"{'correctas':>10}{'confianza':>12}{'seg':>9}")
+        run('secuencial', 1, True)
+        run(f'{args.workers} simultáneas', args.workers, True)
+        run('repetida (caché)', args.workers, False)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
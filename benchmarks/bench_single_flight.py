@@ -0,0 +1,154 @@
+"""
+Benchmark de la coalescencia de trabajo duplicado (single-flight).
+
+Lanza varios procesos (como los workers de gunicorn) con varios hilos cada uno que importan
+a la vez la colección del mismo usuario contra la API falsa de Discogs, con y sin
+coalescencia. Mide peticiones HTTP, tiempo total y verifica que todos obtuvieron la
+colección completa. Además compara recomendaciones idénticas simultáneas dentro de un
+proceso con una llamada a OpenAI simulada (no se contacta a OpenAI).
+
+Uso:
+    python -m benchmarks.bench_single_flight --processes 3 --threads 4 --items 300 --latency-ms 10
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_discogs import FakeDiscogsState, serve_in_thread  # noqa: E402
+
+
+def _env(base_url):
+    return {
+        'DISCOGS_API_URL': base_url,
+        'DISCOGS_TOKEN': 'bench-token',
+        'DISCOGS_REQUEST_DELAY': '0',
+        'DISCOGS_RATE_LIMIT_PER_MINUTE': '1000000',
+        'HTTP_CACHE_ENABLED': 'false',
+        'COVER_CACHE_ENABLED': 'false',
+        'CATALOG_ENABLED': 'false',
+        'REFRESH_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_LEVELS': 'werkzeug=WARNING',
+    }
+
+
+def _worker(env, workdir, username, threads, coalesce, start_at, results):
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    os.environ.update(env)
+    os.chdir(workdir)
+    from app.services import discogs_service
+
+    fetch = discogs_service.get_user_collection_helper if coalesce else discogs_service._get_user_collection
+    rows = []
+
+    def run():
+        df, _ = fetch(username, refresh=True)
+        rows.append(0 if df is None else len(df))
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    # Todos los procesos arrancan a la vez, ya con la app importada
+    time.sleep(max(0.0, start_at - time.time()))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put({'rows': rows, 'finished': time.time()})
+
+
+def run_imports(args, coalesce):
+    state = FakeDiscogsState(args.items, rate_limit=1000000, latency_ms=args.latency_ms)
+    server, base_url = serve_in_thread(state)
+    workdir = tempfile.mkdtemp(prefix='single-flight-bench-')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + args.startup_seconds
+    processes = [context.Process(target=_worker, args=(_env(base_url), workdir, state.username, args.threads,
+                                                       coalesce, start_at, results))
+                 for _ in range(args.processes)]
+    try:
+        for process in processes:
+            process.start()
+        finished = [results.get(timeout=args.timeout) for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.shutdown()
+    rows = [count for item in finished for count in item['rows']]
+    return {
+        'calls': state.total_calls(),
+        'seconds': max(item['finished'] for item in finished) - start_at,
+        'complete': sum(1 for count in rows if count == args.items),
+        'callers': len(rows),
+    }
+
+
+def run_recommendations(args):
+    os.chdir(tempfile.mkdtemp(prefix='single-flight-bench-'))
+    os.environ.update({'LOG_LEVEL': 'WARNING'})
+    from app.services import openai_service
+
+    calls = []
+
+    def fake_generate(vinyl_summary, mood, interests, api_key=None):
+        calls.append(mood)
+        time.sleep(args.openai_ms / 1000)
+        return f"Recomendación para {mood}"
+
+    openai_service._generate_recommendation = fake_generate
+    answers = []
+
+    def run(mood):
+        answers.append(openai_service.generate_recommendation('resumen', mood, 'jazz'))
+
+    # La mitad de las peticiones son idénticas; el resto tiene un mood distinto cada una
+    moods = ['tranquilo'] * args.threads + [f'mood-{n}' for n in range(args.threads)]
+    workers = [threading.Thread(target=run, args=(mood,)) for mood in moods]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for mood, answer in zip(sorted(moods), sorted(answers)) if answer == f"Recomendación para {mood}")
+    return {'requests': len(moods), 'calls': len(calls), 'seconds': elapsed, 'ok': ok}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=3, help="Procesos (workers) simultáneos")
+    parser.add_argument('--threads', type=int, default=4, help="Peticiones simultáneas por proceso")
+    parser.add_argument('--items', type=int, default=300, help="Discos en la colección")
+    parser.add_argument('--latency-ms', type=float, default=10.0, help="Latencia simulada por respuesta")
+    parser.add_argument('--openai-ms', type=float, default=300.0, help="Duración simulada de una llamada a OpenAI")
+    parser.add_argument('--startup-seconds', type=float, default=5.0, help="Margen para que los procesos importen la app")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Tiempo máximo por modo")
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    errors = 0
+    print(f"Importación del mismo usuario: {args.processes} procesos x {args.threads} hilos, {args.items} discos")
+    print(f"{'modo':<18}{'HTTP':>7}{'seg':>8}{'completas':>11}")
+    for label, coalesce in (('sin coalescencia', False), ('con coalescencia', True)):
+        result = run_imports(args, coalesce)
+        errors += result['callers'] - result['complete']
+        print(f"{label:<18}{result['calls']:>7}{result['seconds']:>8.2f}{result['complete']:>7}/{result['callers']}")
+
+    result = run_recommendations(args)
+    errors += result['requests'] - result['ok']
+    print(f"Recomendaciones simultáneas: {result['requests']} peticiones, {result['calls']} llamadas a OpenAI, "
+          f"{result['seconds']:.2f} s, {result['ok']} respuestas correctas")
+
+    if errors:
+        print(f"ERROR: {errors} llamadas con un resultado incorrecto")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark del tiempo de arranque de la aplicación.
+
+Ejecuta `from app import create_app; create_app()` en un proceso nuevo con
+`python -X importtime`, suma el tiempo de importación de los módulos de primer
+nivel y muestra los más costosos. Termina con código 1 si se supera el
+presupuesto o si al arrancar se cargó alguna dependencia pesada que debería
+importarse de forma diferida (pandas, numpy, openai, discogs_client...).
+
+Uso:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 300 --repeat 5
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencias que solo deben cargarse al usarse (ver README, "Arranque rápido")
+LAZY_MODULES = ('pandas', 'numpy', 'openai', 'discogs_client', 'requests', 'markdown', 'aiohttp')
+
+STARTUP_SNIPPET = (
+    "import sys; sys.path.insert(0, {root!r}); "
+    "from app import create_app; create_app()"
+)
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """
+    Interpreta la salida de -X importtime
+
+    Returns:
+        list: Tuplas (módulo, microsegundos acumulados, nivel de anidamiento)
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            modules.append((name, int(cumulative), len(indent) // 2))
+    return modules
+
+
+def measure_startup():
+    """
+    Arranca la app una vez en un proceso nuevo
+
+    Returns:
+        tuple: (milisegundos de importación de primer nivel, lista de módulos)
+    """
+    env = dict(os.environ, LOG_FILE='')
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SNIPPET.format(root=ROOT_DIR)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    modules = parse_importtime(result.stderr)
+    total_us = sum(cumulative for _, cumulative, level in modules if level == 0)
+    return total_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del tiempo de arranque de la app")
+    parser.add_argument('--budget-ms', type=float, default=400.0,
+                        help="Presupuesto de tiempo de importación al arrancar (mediana)")
+    parser.add_argument('--repeat', type=int, default=3, help="Arranques a medir (se usa la mediana)")
+    parser.add_argument('--top', type=int, default=10, help="Módulos más costosos a mostrar")
+    args = parser.parse_args()
+
+    # El primer arranque compila los .pyc y no es representativo
+    measure_startup()
+    timings = []
+    modules = []
+    for _ in range(args.repeat):
+        elapsed_ms, modules = measure_startup()
+        timings.append(elapsed_ms)
+    median_ms = statistics.median(timings)
+
+    print(f"Importación al arrancar: {median_ms:.1f}ms (mediana de {args.repeat}, presupuesto {args.budget_ms:.0f}ms)")
+    print(f"{'módulo':<40}{'ms':>10}")
+    top_level = sorted((m for m in modules if m[2] == 0), key=lambda m: m[1], reverse=True)
+    for name, cumulative, _ in top_level[:args.top]:
+        print(f"{name:<40}{cumulative / 1000:>10.1f}")
+
+    failures = []
+    loaded = sorted({name.split('.')[0] for name, _, _ in modules} & set(LAZY_MODULES))
+    if loaded:
+        failures.append(f"Dependencias pesadas cargadas al arrancar: {', '.join(loaded)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"Arranque de {median_ms:.1f}ms supera el presupuesto de {args.budget_ms:.0f}ms")
+
+    if failures:
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("Arranque dentro del presupuesto")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Benchmark del límite de disco de DATA_DIR.
+
+Genera un DATA_DIR sintético con colecciones registradas (con distintos últimos accesos y
+algunas con el enriquecimiento en curso), CSV sueltos anteriores al registro, resultados de
+single-flight y portadas. Aplica el límite y mide el tiempo de la revisión y lo liberado.
+Verifica que el uso quede dentro del límite, que no se borren colecciones usadas
+recientemente ni en enriquecimiento, y que lo borrado sea lo usado hace más tiempo.
+
+Uso:
+    python -m benchmarks.bench_storage --owners 5000 --cache-files 5000 --budget 0.5
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAY = 24 * 3600
+
+
+def _write(path, size, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--owners', type=int, default=5000, help="Colecciones registradas")
+    parser.add_argument('--cache-files', type=int, default=5000, help="Archivos de caché (single-flight y portadas)")
+    parser.add_argument('--budget', type=float, default=0.5, help="Límite como fracción del uso inicial")
+    parser.add_argument('--min-idle-days', type=float, default=1.0, help="Antigüedad mínima de las colecciones a borrar")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # La configuración se lee al importar: preparar el entorno antes de importar la app
+    os.chdir(tempfile.mkdtemp(prefix='storage-bench-'))
+    os.environ.update({'LOG_LEVEL': 'WARNING'})
+
+    from app.config import DATA_DIR, SINGLE_FLIGHT_DIR, COVER_CACHE_DIR
+    from app.models.collection_registry import get_registry, ENRICHMENT_RUNNING
+    from app.services import storage_manager
+
+    rng = random.Random(args.seed)
+    now = time.time()
+    min_idle = args.min_idle_days * DAY
+    registry = get_registry()
+    conn = registry._connect()
+    accessed = {}
+    running = set()
+    start = time.perf_counter()
+    for n in range(args.owners):
+        owner = f'upload:bench{n}'
+        path = registry.collection_path(owner)
+        _write(path, rng.randint(20_000, 200_000), now)
+        registry.register(owner, path, 100, source='upload')
+        accessed[owner] = now - rng.uniform(0, 30 * DAY)
+        status = ENRICHMENT_RUNNING if rng.random() < 0.02 else 'none'
+        if status == ENRICHMENT_RUNNING:
+            running.add(owner)
+        conn.execute('UPDATE collections SET accessed_at = ?, enrichment_status = ? WHERE owner = ?',
+                     (accessed[owner], status, owner))
+    conn.commit()
+    for n in range(args.cache_files):
+        mtime = now - rng.uniform(0, 30 * DAY)
+        if n % 2:
+            _write(os.path.join(SINGLE_FLIGHT_DIR, f'{n:032x}.result'), rng.randint(2_000, 20_000), mtime)
+        else:
+            name = f'{n:040x}.jpg'
+            _write(os.path.join(COVER_CACHE_DIR, name[:2], name), rng.randint(10_000, 60_000), mtime)
+    for n in range(20):
+        _write(os.path.join(DATA_DIR, f'user{n}_collection.csv'), 100_000, now - rng.uniform(0, 30 * DAY))
+    print(f"DATA_DIR sintético generado en {time.perf_counter() - start:.1f} s")
+
+    usage = sum(storage_manager.disk_usage().values())
+    budget = int(usage * args.budget)
+    cutoff_candidates = storage_manager.evictable_artifacts(min_idle=min_idle)
+
+    start = time.perf_counter()
+    summary = storage_manager.enforce_budget(budget, min_idle=min_idle)
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    survivors = {owner for owner in accessed if registry.get(owner) is not None}
+    deleted = set(accessed) - survivors
+    if summary['usage_after'] > budget or sum(storage_manager.disk_usage().values()) > budget:
+        errors.append("el uso supera el límite")
+    if any(now - accessed[owner] < min_idle for owner in deleted):
+        errors.append("se borró una colección usada recientemente")
+    if deleted & running:
+        errors.append("se borró una colección con el enriquecimiento en curso")
+    # Lo borrado debe ser lo usado hace más tiempo: nada que siga existiendo es más viejo que lo último borrado
+    def exists(kind, key):
+        return registry.get(key) is not None if kind == storage_manager.KIND_COLLECTION else os.path.exists(key)
+    states = [exists(kind, key) for _, _, kind, key in cutoff_candidates]
+    last_deleted = max((i for i, alive in enumerate(states) if not alive), default=-1)
+    if any(states[:last_deleted]):
+        errors.append("se conservó algo más viejo que lo borrado")
+
+    print(f"Uso inicial {summary['usage_before'] / 1024 / 1024:.1f} MiB, límite {budget / 1024 / 1024:.1f} MiB, "
+          f"final {summary['usage_after'] / 1024 / 1024:.1f} MiB")
+    print(f"Revisión y desalojo en {elapsed:.2f} s: {summary['freed'] / 1024 / 1024:.1f} MiB liberados, "
+          f"borrados {summary['evicted']}")
+    print(f"Colecciones: {len(deleted)} borradas, {len(survivors)} conservadas ({len(running)} en enriquecimiento)")
+    if errors:
+        print(f"ERROR: {'; '.join(errors)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""
+Servidor local que imita la API de Discogs a partir de un conjunto de datos sintético.
+
+Sirve usuarios, carpetas de colección, releases paginados, releases, masters y
+la búsqueda de la base de datos, emula las cabeceras X-Discogs-Ratelimit*,
+responde 429 al superar el límite por minuto y agrega una latencia configurable. Permite medir y probar
+DiscogsConnector sin consumir la cuota de la API real.
+
+Uso:
+    python -m benchmarks.fake_discogs --items 500 --port 5055
+"""
+import time
+import json
+import zlib
+import hashlib
+import argparse
+import threading
+from collections import defaultdict, deque
+from flask import Flask, jsonify, request, Response
+from benchmarks.synthetic import generate_releases
+
+
+class FakeDiscogsState:
+    """Datos y contadores compartidos por las rutas del servidor falso"""
+
+    def __init__(self, items=200, username='benchuser', rate_limit=60, latency_ms=0.0, seed=42, window=60.0):
+        self.username = username
+        self.rate_limit = rate_limit
+        # Ventana (en segundos) en la que se cuentan las peticiones de cada token
+        self.window = window
+        self.latency = latency_ms / 1000.0
+        self.releases = generate_releases(items, seed=seed)
+        self.releases_by_id = {r['id']: r for r in self.releases}
+        self.masters = {}
+        for release in self.releases:
+            if release['master_id'] and release['master_id'] not in self.masters:
+                self.masters[release['master_id']] = release
+        self.lock = threading.Lock()
+        self.windows = defaultdict(deque)
+        self.calls = defaultdict(int)
+        self.throttled = 0
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.windows.clear()
+            self.throttled = 0
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+def _basic_information(release, base_url):
+    return {
+        'id': release['id'],
+        'master_id': release['master_id'],
+        'title': release['title'],
+        'year': release['year'],
+        'resource_url': f"{base_url}/releases/{release['id']}",
+        'artists': [{'name': release['artist'], 'id': zlib.crc32(release['artist'].encode()) % 100000}],
+        'labels': [{'name': release['label'], 'id': zlib.crc32(release['label'].encode()) % 100000, 'catno': ''}],
+        'formats': [{'name': 'Vinyl', 'qty': '1', 'descriptions': release['format'].split(', ')[1:]}],
+        'genres': release['genres'],
+        'styles': release['styles'],
+    }
+
+
+def _solid_png(width, height, color):
+    """PNG válido de un solo color (sin depender de Pillow)"""
+    import struct
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    rgb = bytes(((color >> 16) & 255, (color >> 8) & 255, color & 255))
+    raw = b''.join(b'\x00' + rgb * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def create_fake_discogs_app(state):
+    """
+    Crea la aplicación Flask que emula la API de Discogs
+
+    Args:
+        state: FakeDiscogsState con los datos sintéticos
+
+    Returns:
+        Flask: Aplicación WSGI
+    """
+    app = Flask(__name__)
+
+    def base_url():
+        return request.host_url.rstrip('/')
+
+    @app.before_request
+    def throttle():
+        if request.path.startswith('/_'):
+            return None
+        if state.latency:
+            time.sleep(state.latency)
+        token = request.args.get('token') or request.headers.get('Authorization', 'anon')
+        now = time.time()
+        with state.lock:
+            window = state.windows[token]
+            while window and now - window[0] > state.window:
+                window.popleft()
+            if len(window) >= state.rate_limit:
+                state.throttled += 1
+                response = jsonify({'message': "You are making requests too quickly."})
+                response.status_code = 429
+                return _with_ratelimit_headers(response, len(window))
+            window.append(now)
+            state.calls[request.url_rule.rule if request.url_rule else request.path] += 1
+        return None
+
+    def _with_ratelimit_headers(response, used):
+        response.headers['X-Discogs-Ratelimit'] = str(state.rate_limit)
+        response.headers['X-Discogs-Ratelimit-Used'] = str(used)
+        response.headers['X-Discogs-Ratelimit-Remaining'] = str(max(0, state.rate_limit - used))
+        return response
+
+    @app.after_request
+    def add_headers(response):
+        if request.path.startswith('/_') or response.status_code == 429:
+            return response
+        token = request.args.get('token') or request.headers.get('Authorization', 'anon')
+        with state.lock:
+            used = len(state.windows[token])
+        _with_ratelimit_headers(response, used)
+        if response.status_code == 200:
+            etag = '"' + hashlib.md5(response.get_data()).hexdigest() + '"'
+            response.headers['ETag'] = etag
+            if request.headers.get('If-None-Match') == etag:
+                not_modified = Response(status=304)
+                not_modified.headers['ETag'] = etag
+                return _with_ratelimit_headers(not_modified, used)
+        return response
+
+    def _not_found(message='The requested resource was not found.'):
+        response = jsonify({'message': message})
+        response.status_code = 404
+        return response
+
+    @app.route('/users/<username>')
+    def user(username):
+        if username != state.username:
+            return _not_found()
+        return jsonify({
+            'id': 1,
+            'username': username,
+            'resource_url': f"{base_url()}/users/{username}",
+            'collection_folders_url': f"{base_url()}/users/{username}/collection/folders",
+            'num_collection': len(state.releases),
+        })
+
+    @app.route('/users/<username>/collection/folders')
+    def folders(username):
+        if username != state.username:
+            return _not_found()
+        return jsonify({'folders': [{
+            'id': 0,
+            'name': 'All',
+            'count': len(state.releases),
+            'resource_url': f"{base_url()}/users/{username}/collection/folders/0",
+        }]})
+
+    @app.route('/users/<username>/collection/folders/<int:folder_id>/releases')
+    def collection_releases(username, folder_id):
+        if username != state.username or folder_id != 0:
+            return _not_found()
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 100)
+        pages = max(1, -(-len(state.releases) // per_page))
+        if page > pages:
+            return _not_found('Page %d is outside of valid range.' % page)
+        chunk = state.releases[(page - 1) * per_page:page * per_page]
+        return jsonify({
+            'pagination': {'page': page, 'pages': pages, 'per_page': per_page, 'items': len(state.releases), 'urls': {}},
+            'releases': [{
+                'id': r['id'],
+                'instance_id': r['id'] * 10,
+                'folder_id': 0,
+                'rating': r['rating'],
+                'basic_information': _basic_information(r, base_url()),
+                'notes': [
+                    {'field_id': 1, 'value': r['media_condition']},
+                    {'field_id': 2, 'value': r['sleeve_condition']},
+                ],
+            } for r in chunk],
+        })
+
+    @app.route('/releases/<int:release_id>')
+    def release(release_id):
+        r = state.releases_by_id.get(release_id)
+        if r is None:
+            return _not_found('Release not found.')
+        data = _basic_information(r, base_url())
+        data.update({
+            'country': r['country'],
+            'tracklist': [dict(t, type_='track') for t in r['tracklist']],
+            'images': [{'type': 'primary', 'uri': f"{base_url()}/_images/{r['id']}.jpg", 'width': 600, 'height': 600}],
+            'community': {
+                'have': r['have'],
+                'want': r['want'],
+                'rating': {'average': r['community_rating'], 'count': r['have'] // 10},
+            },
+        })
+        if not r['master_id']:
+            data.pop('master_id')
+        return jsonify(data)
+
+    @app.route('/masters/<int:master_id>')
+    def master(master_id):
+        r = state.masters.get(master_id)
+        if r is None:
+            return _not_found('Master not found.')
+        return jsonify({
+            'id': master_id,
+            'title': r['title'],
+            'year': r['original_year'],
+            'main_release': r['id'],
+            'resource_url': f"{base_url()}/masters/{master_id}",
+            'genres': r['genres'],
+            'styles': r['styles'],
+            'artists': [{'name': r['artist'], 'id': zlib.crc32(r['artist'].encode()) % 100000}],
+        })
+
+    @app.route('/database/search')
+    def search():
+        # Subconjunto de la búsqueda de Discogs: artista y título por contenido, sello y año exactos
+        def matches(release):
+            artist = request.args.get('artist', '').lower()
+            title = request.args.get('release_title', '').lower()
+            label = request.args.get('label', '').lower()
+            year = request.args.get('year', type=int)
+            return (artist in release['artist'].lower() and title in release['title'].lower()
+                    and (not label or label == release['label'].lower())
+                    and (not year or year == release['year']))
+
+        per_page = min(request.args.get('per_page', 50, type=int), 100)
+        found = [r for r in state.releases if matches(r)]
+        return jsonify({
+            'pagination': {'page': 1, 'pages': max(1, -(-len(found) // per_page)), 'per_page': per_page,
+                           'items': len(found), 'urls': {}},
+            'results': [{
+                'id': r['id'],
+                'type': 'release',
+                'master_id': r['master_id'] or None,
+                'title': f"{r['artist']} - {r['title']}",
+                'year': str(r['year']),
+                'label': [r['label']],
+                'genre': r['genres'],
+                'style': r['styles'],
+                'country': r['country'],
+                'resource_url': f"{base_url()}/releases/{r['id']}",
+            } for r in found[:per_page]],
+        })
+
+    @app.route('/_images/<int:release_id>.jpg')
+    def image(release_id):
+        # Imagen PNG mínima de un color por release (el tipo real lo indica Content-Type)
+        if release_id not in state.releases_by_id:
+            return _not_found('Image not found.')
+        return Response(_solid_png(8, 8, zlib.crc32(str(release_id).encode())), mimetype='image/png')
+
+    @app.route('/_stats')
+    def stats():
+        return Response(json.dumps({
+            'calls': dict(state.calls),
+            'total_calls': state.total_calls(),
+            'throttled': state.throttled,
+        }), mimetype='application/json')
+
+    return app
+
+
+def serve_in_thread(state, host='127.0.0.1', port=0):
+    """
+    Arranca el servidor falso en un hilo en segundo plano
+
+    Returns:
+        tuple: (servidor werkzeug, URL base)
+    """
+    from werkzeug.serving import make_server
+    server = make_server(host, port, create_fake_discogs_app(state), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Discogs")
+    parser.add_argument('--items', type=int, default=200, help="Discos en la colección sintética")
+    parser.add_argument('--username', default='benchuser')
+    parser.add_argument('--rate-limit', type=int, default=60, help="Peticiones por ventana por token")
+    parser.add_argument('--window', type=float, default=60.0, help="Duración de la ventana de límite (segundos)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latencia agregada a cada respuesta")
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    state = FakeDiscogsState(args.items, args.username, args.rate_limit, args.latency_ms, window=args.window)
+    print(f"API falsa de Discogs en http://127.0.0.1:{args.port} (usuario: {args.username})")
+    create_fake_discogs_app(state).run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
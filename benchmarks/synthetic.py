@@ -0,0 +1,224 @@
+"""
+Datos sintéticos y deterministas con la forma de los de Discogs para benchmarks
+"""
+import random
+
+ARTISTS = [
+    'Pink Floyd', 'Led Zeppelin', 'Black Sabbath', 'Miles Davis', 'John Coltrane',
+    'Nina Simone', 'Aretha Franklin', 'Kraftwerk', 'Radiohead', 'Björk',
+    'Soda Stereo', 'Charly García', 'Spinetta', 'Los Redondos', 'Fela Kuti',
+    'Talking Heads', 'Joy Division', 'Massive Attack', 'Portishead', 'Bill Evans',
+]
+WORDS = [
+    'Moon', 'Dark', 'Side', 'Love', 'Blue', 'Night', 'City', 'Dream', 'Fire', 'River',
+    'Silver', 'Electric', 'Garden', 'Machine', 'Ocean', 'Shadow', 'Light', 'Mind',
+    'Kind', 'Supreme', 'Paranoid', 'Animals', 'Wall', 'Signal', 'Desert', 'Velvet',
+]
+LABELS = [
+    'Harvest', 'Atlantic', 'Vertigo', 'Columbia', 'Impulse!', 'Blue Note', 'Philips',
+    'EMI', 'Parlophone', 'Factory', 'Warp', 'Sire', 'CBS', 'Sony Music', 'Verve',
+]
+GENRE_STYLES = {
+    'Rock': ['Prog Rock', 'Psychedelic Rock', 'Hard Rock', 'Art Rock', 'Post-Punk'],
+    'Jazz': ['Hard Bop', 'Modal', 'Cool Jazz', 'Free Jazz', 'Soul-Jazz'],
+    'Electronic': ['Krautrock', 'Trip Hop', 'Ambient', 'Synth-pop', 'IDM'],
+    'Funk / Soul': ['Soul', 'Afrobeat', 'Funk', 'Rhythm & Blues'],
+    'Latin': ['Rock en español', 'Tango', 'Bossanova'],
+    'Pop': ['Ballad', 'Indie Pop', 'Vocal'],
+}
+FORMATS = ['Vinyl, LP, Album', 'Vinyl, LP, Album, Reissue', 'Vinyl, 12", 33 ⅓ RPM',
+           'Vinyl, 7", 45 RPM, Single', 'Vinyl, LP, Compilation', 'Vinyl, 2xLP, Album']
+CONDITIONS = ['Mint (M)', 'Near Mint (NM or M-)', 'Very Good Plus (VG+)',
+              'Very Good (VG)', 'Good Plus (G+)', 'Good (G)']
+
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def generate_releases(count, seed=42):
+    """
+    Genera lanzamientos sintéticos con su master, géneros, estilos y tracklist
+
+    Args:
+        count: Número de lanzamientos
+        seed: Semilla para que los datos sean reproducibles
+
+    Returns:
+        list: Lista de diccionarios con los datos de cada lanzamiento
+    """
+    rng = random.Random(seed)
+    releases = []
+    master_years = {}
+    for i in range(count):
+        genre = rng.choice(list(GENRE_STYLES))
+        styles = rng.sample(GENRE_STYLES[genre], k=min(len(GENRE_STYLES[genre]), rng.randint(1, 2)))
+        # Cada master agrupa dos ediciones consecutivas; una de cada diez no tiene master
+        master_id = 500000 + i // 2 if rng.random() > 0.1 else 0
+        original_year = master_years.setdefault(master_id, rng.randint(1955, 2020)) if master_id else rng.randint(1955, 2020)
+        # Aproximadamente un tercio son reediciones posteriores al año original
+        year = original_year if rng.random() > 0.33 else rng.randint(original_year, 2024)
+        releases.append({
+            'id': 1000000 + i,
+            'master_id': master_id,
+            'title': _title(rng),
+            'artist': rng.choice(ARTISTS),
+            'label': rng.choice(LABELS),
+            'format': rng.choice(FORMATS),
+            'year': year,
+            'original_year': original_year,
+            'genres': [genre],
+            'styles': styles,
+            'rating': rng.choice([0, 0, 0, 3, 4, 5]),
+            'media_condition': rng.choice(CONDITIONS),
+            'sleeve_condition': rng.choice(CONDITIONS),
+            'community_rating': round(rng.uniform(2.5, 5.0), 2),
+            'have': rng.randint(10, 50000),
+            'want': rng.randint(5, 20000),
+            'country': rng.choice(['UK', 'US', 'Argentina', 'Germany', 'Japan']),
+            'tracklist': [
+                {'position': f"{'A' if t < 4 else 'B'}{t % 4 + 1}", 'title': _title(rng), 'duration': f"{rng.randint(2, 9)}:{rng.randint(0, 59):02d}"}
+                for t in range(rng.randint(4, 10))
+            ],
+        })
+    return releases
+
+
+# Columnas de la exportación CSV de colección de Discogs (más Genre/Style, que agrega la importación por API)
+EXPORT_COLUMNS = [
+    'Catalog#', 'Artist', 'Title', 'Label', 'Format', 'Rating', 'Released', 'release_id',
+    'CollectionFolder', 'Date Added', 'Collection Media Condition', 'Collection Sleeve Condition',
+    'Collection Notes', 'Genre', 'Style',
+]
+ENRICHED_COLUMNS = ['original_release_year', 'community_rating', 'image_url', 'tracklist']
+
+
+def generate_collection_frame(rows, enriched=False, seed=42):
+    """
+    Genera una colección sintética con la forma de una exportación de Discogs
+
+    Args:
+        rows: Número de filas
+        enriched: Si es True, agrega las columnas que produce el enriquecimiento
+        seed: Semilla para que los datos sean reproducibles
+
+    Returns:
+        DataFrame: Colección sintética
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS, dtype=object)
+    genres = np.array(list(GENRE_STYLES), dtype=object)
+    genre_idx = rng.integers(0, len(genres), rows)
+    styles = np.array([', '.join(GENRE_STYLES[g][:2]) for g in genres], dtype=object)
+    original_years = rng.integers(1955, 2021, rows)
+    reissue = rng.random(rows) < 0.33
+    years = np.where(reissue, np.minimum(original_years + rng.integers(0, 40, rows), 2024), original_years)
+    titles = words[rng.integers(0, len(words), rows)] + ' ' + words[rng.integers(0, len(words), rows)]
+    ids = np.arange(1000000, 1000000 + rows)
+
+    df = pd.DataFrame({
+        'Catalog#': np.char.add('CAT-', (ids % 100000).astype(str)).astype(object),
+        'Artist': np.array(ARTISTS, dtype=object)[rng.integers(0, len(ARTISTS), rows)],
+        'Title': titles,
+        'Label': np.array(LABELS, dtype=object)[rng.integers(0, len(LABELS), rows)],
+        'Format': np.array(FORMATS, dtype=object)[rng.integers(0, len(FORMATS), rows)],
+        'Rating': np.where(rng.random(rows) < 0.4, rng.integers(1, 6, rows), 0),
+        'Released': years,
+        'release_id': ids,
+        'CollectionFolder': 'Uncategorized',
+        'Date Added': '2023-01-01 12:00:00',
+        'Collection Media Condition': np.array(CONDITIONS, dtype=object)[rng.integers(0, len(CONDITIONS), rows)],
+        'Collection Sleeve Condition': np.array(CONDITIONS, dtype=object)[rng.integers(0, len(CONDITIONS), rows)],
+        'Collection Notes': '',
+        'Genre': genres[genre_idx],
+        'Style': styles[genre_idx],
+    })
+    if enriched:
+        df['original_release_year'] = original_years
+        df['community_rating'] = np.round(rng.uniform(2.5, 5.0, rows), 2)
+        df['image_url'] = np.char.add('https://i.discogs.com/', ids.astype(str)).astype(object) + '.jpg'
+        df['tracklist'] = 'A1. ' + titles + '; A2. ' + words[rng.integers(0, len(words), rows)] + '; B1. ' + titles
+    return df
+
+
+def write_collection_csv(path, rows, enriched=False, seed=42):
+    """
+    Escribe (si no existe ya) una colección sintética en CSV
+
+    Returns:
+        str: Ruta del archivo
+    """
+    import os
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        generate_collection_frame(rows, enriched=enriched, seed=seed).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def write_discogs_dumps(releases, directory):
+    """
+    Escribe volcados XML comprimidos con la estructura de los volcados mensuales de Discogs
+    (discogs_<fecha>_releases.xml.gz y discogs_<fecha>_masters.xml.gz)
+
+    Args:
+        releases: Lanzamientos de generate_releases
+        directory: Directorio de destino
+
+    Returns:
+        tuple: (ruta del volcado de lanzamientos, ruta del volcado de masters)
+    """
+    import os
+    import gzip
+    from xml.sax.saxutils import escape, quoteattr
+
+    os.makedirs(directory, exist_ok=True)
+    releases_path = os.path.join(directory, 'discogs_20240101_releases.xml.gz')
+    masters_path = os.path.join(directory, 'discogs_20240101_masters.xml.gz')
+
+    def artist_xml(release):
+        return f"<artists><artist><id>{ARTISTS.index(release['artist']) + 1}</id><name>{escape(release['artist'])}</name><anv/><join/><role/><tracks/></artist></artists>"
+
+    def genres_xml(release):
+        return ('<genres>' + ''.join(f'<genre>{escape(g)}</genre>' for g in release['genres']) + '</genres>'
+                '<styles>' + ''.join(f'<style>{escape(s)}</style>' for s in release['styles']) + '</styles>')
+
+    with gzip.open(releases_path, 'wt', encoding='utf-8') as f:
+        f.write('<releases>')
+        for release in releases:
+            released = str(release['year']) if release['id'] % 3 else f"{release['year']}-03-00"
+            master = (f'<master_id is_main_release="{str(release["year"] == release["original_year"]).lower()}">'
+                      f'{release["master_id"]}</master_id>') if release['master_id'] else ''
+            tracks = ''.join(f"<track><position>{t['position']}</position><title>{escape(t['title'])}</title>"
+                             f"<duration>{t['duration']}</duration></track>" for t in release['tracklist'])
+            f.write(
+                f'<release id="{release["id"]}" status="Accepted">'
+                f'<images><image type="primary" uri="" uri150="" width="600" height="600"/></images>'
+                f'{artist_xml(release)}<title>{escape(release["title"])}</title>'
+                f'<labels><label name={quoteattr(release["label"])} catno="CAT-{release["id"] % 1000}" id="1"/></labels>'
+                f'<extraartists/><formats><format name="Vinyl" qty="1" text=""><descriptions>'
+                f'<description>LP</description></descriptions></format></formats>'
+                f'{genres_xml(release)}<country>{escape(release["country"])}</country>'
+                f'<released>{released}</released><notes>Sin notas</notes><data_quality>Correct</data_quality>'
+                f'{master}<tracklist>{tracks}</tracklist><identifiers/><videos/><companies/></release>\n'
+            )
+        f.write('</releases>')
+
+    with gzip.open(masters_path, 'wt', encoding='utf-8') as f:
+        f.write('<masters>')
+        written = set()
+        for release in releases:
+            if not release['master_id'] or release['master_id'] in written:
+                continue
+            written.add(release['master_id'])
+            f.write(
+                f'<master id="{release["master_id"]}"><main_release>{release["id"]}</main_release>'
+                f'<images/>{artist_xml(release)}{genres_xml(release)}<year>{release["original_year"]}</year>'
+                f'<title>{escape(release["title"])}</title><data_quality>Correct</data_quality><videos/></master>\n'
+            )
+        f.write('</masters>')
+    return releases_path, masters_path